@@ -1,15 +1,42 @@
 import requests
 import json
 import os
+import queue
+import random
+import threading
 import time
 import argparse
-import subprocess
+import itertools
+import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+
+from jsonl_to_csv import DEFAULT_CSV_FILE, ConversionError, iter_items, update_jsonl_to_csv
+from photo_store import process_photos
+from place_refresh import VOLATILE_FIELDS, changed_fields, field_hashes, plan_refresh, popularity, updates_path
+from places_cache import ResponseCache
+from scrape_checkpoint import CheckpointStore
 
 # --- CONFIGURATION ---
 API_KEY = os.environ.get("GOOGLE_PLACES_API_KEY")
 
-if not API_KEY:
-    raise ValueError("API key not found. Please set the 'GOOGLE_PLACES_API_KEY' environment variable.")
+# Point this at a local mock server (see mock_places_server.py) to test the pipeline offline.
+PLACES_API_BASE_URL = os.environ.get("PLACES_API_BASE_URL", "https://maps.googleapis.com/maps/api/place")
+TEXT_SEARCH_URL = f"{PLACES_API_BASE_URL}/textsearch/json"
+DETAILS_URL = f"{PLACES_API_BASE_URL}/details/json"
+PHOTO_URL = f"{PLACES_API_BASE_URL}/photo"
+
+# Queries paginated at once, concurrent place-details requests, and concurrent photo downloads.
+SEARCH_WORKERS = int(os.environ.get("SCRAPER_SEARCH_WORKERS", "4"))
+DETAIL_WORKERS = int(os.environ.get("SCRAPER_DETAIL_WORKERS", "8"))
+PHOTO_WORKERS = int(os.environ.get("SCRAPER_PHOTO_WORKERS", "16"))
+# Steady request rate across all endpoints, and how many requests may burst above it.
+REQUESTS_PER_SECOND = float(os.environ.get("SCRAPER_REQUESTS_PER_SECOND", "10"))
+REQUEST_BURST = int(os.environ.get("SCRAPER_REQUEST_BURST", "20"))
+# Retries for quota errors, 5xx responses and dropped connections, with exponential backoff.
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT = 30
 
 # Define the search queries for different categories
 SEARCH_QUERIES = {
@@ -32,21 +59,319 @@ SEARCH_QUERIES = {
     ]
 }
 
-# Define a grid of search locations to cover all of Singapore
-GRID_LOCATIONS = {
-    "central": {"lat": 1.290270, "lng": 103.851959},
-    "north": {"lat": 1.43, "lng": 103.78},
-    "south": {"lat": 1.26, "lng": 103.82},
-    "east": {"lat": 1.35, "lng": 103.95},
-    "west": {"lat": 1.34, "lng": 103.70},
-}
+# Every query starts as one search over this box (south, west, north, east)
+# covering all of Singapore. A search that hits the API's result cap while
+# still finding enough new places is split into four quadrant searches, down
+# to MAX_CELL_DEPTH levels, so dense areas get small cells and sparse ones
+# stay cheap.
+SEARCH_BOUNDS = (1.15, 103.59, 1.48, 104.10)
+MAX_RESULTS_PER_SEARCH = 60
+RESULTS_PER_PAGE = 20
+MIN_NEW_PLACES = int(os.environ.get("SCRAPER_MIN_NEW_PLACES", "10"))
+MAX_CELL_DEPTH = int(os.environ.get("SCRAPER_MAX_CELL_DEPTH", "7"))
+
+# Place Details fields requested for a new place. Fields are explicitly requested to control costs.
+DETAIL_FIELDS = ("name,formatted_address,geometry,photos,reviews,rating,user_ratings_total,types,website,url,"
+                 "international_phone_number,vicinity,price_level,opening_hours")
+# Place Details calls a --refresh run may spend on re-fetching already collected places.
+REFRESH_BUDGET = int(os.environ.get("SCRAPER_REFRESH_BUDGET", "1000"))
 
 # Define the output file and folder paths
 DATA_DIR = "data"
 IMAGES_DIR = os.path.join(DATA_DIR, "images")
+# Deduplicated, resized copies of the downloaded images (see photo_store.py)
+PHOTOS_DIR = os.path.join(DATA_DIR, "photos")
+PHOTO_PROCESS_WORKERS = int(os.environ.get("SCRAPER_PHOTO_PROCESS_WORKERS", str(os.cpu_count() or 1)))
 JSONL_OUTPUT_FILE = os.path.join(DATA_DIR, "singapore_data.jsonl")
+# Volatile fields of already collected places, appended by --refresh runs (see place_refresh.py)
+UPDATES_OUTPUT_FILE = updates_path(JSONL_OUTPUT_FILE)
 PROCESSED_QUERIES_FILE = os.path.join(DATA_DIR, 'processed_queries.txt')
 PROCESSED_IDS_FILE = os.path.join(DATA_DIR, 'processed_ids.txt')
+# Progress is checkpointed here; the two text files above are only read once,
+# to seed the checkpoint store of a data directory from before it existed.
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "checkpoint.sqlite3")
+
+# Raw API responses are cached here, so a re-run or --offline replay does not
+# spend quota. Search results go stale quickly, details and photos much less so.
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+CACHE_MAX_BYTES = int(os.environ.get("SCRAPER_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_TTLS = {
+    "textsearch": int(os.environ.get("SCRAPER_CACHE_SEARCH_TTL", str(24 * 3600))),
+    "details": int(os.environ.get("SCRAPER_CACHE_DETAILS_TTL", str(30 * 24 * 3600))),
+    "photo": int(os.environ.get("SCRAPER_CACHE_PHOTO_TTL", str(365 * 24 * 3600))),
+}
+
+# --- HTTP CLIENT ---
+class QuotaError(Exception):
+    """Raised when the API keeps rejecting requests for quota or rate reasons."""
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker thread.
+
+    Tokens refill at `rate` per second up to `burst`; each request takes one,
+    waiting if none is left.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def create_session(pool_size):
+    """Creates a keep-alive session with enough pooled connections for every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = create_session(SEARCH_WORKERS + DETAIL_WORKERS + PHOTO_WORKERS)
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST)
+
+# Places API statuses (in a 200 response) that mean "slow down and try again".
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+def api_get(url, params, stream=False, retry_invalid=False):
+    """
+    Sends a rate-limited GET on the shared session, retrying with jittered
+    exponential backoff on 429/5xx responses, connection errors and quota
+    statuses. A page token is briefly invalid after it is issued, so
+    `retry_invalid` also retries INVALID_REQUEST.
+
+    Returns the response; raises requests.RequestException or QuotaError once
+    retries are exhausted.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        RATE_LIMITER.acquire()
+        retry_reason = None
+        try:
+            response = SESSION.get(url, params=params, stream=stream, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_reason = f"HTTP {response.status_code}"
+            else:
+                response.raise_for_status()
+                if stream:
+                    return response
+                status = response.json().get("status")
+                if status in RETRY_STATUSES or (retry_invalid and status == "INVALID_REQUEST"):
+                    retry_reason = status
+                else:
+                    return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            retry_reason = type(e).__name__
+            if attempt == MAX_RETRIES:
+                raise
+        if attempt == MAX_RETRIES:
+            raise QuotaError(f"Giving up after {MAX_RETRIES} retries ({retry_reason}).")
+        time.sleep(BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random()))
+
+
+class JsonlSink:
+    """
+    Appends records to a JSONL file from a single writer thread, so lines from
+    concurrent workers are never interleaved.
+
+    Every record carries the sequence number its place was claimed with. In
+    `ordered` mode records are written in sequence order (a None record just
+    fills its slot), so a replay writes the same file as the run it replays.
+    After each flush the written (and failed) place_ids are recorded in the
+    checkpoint store, so a place counts as collected only once its line is
+    in the file, along with when it was fetched for later refreshes. The
+    file's length is recorded in the same transaction, and lines past it (a
+    crash struck between writing them and recording their places) are cut
+    off on the next start, since those places are fetched again.
+
+    `release`, if given, is called with the place_ids whose details could
+    not be fetched once their claims are dropped from the checkpoint, so a
+    later search can claim them again.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, path, checkpoint, ordered=False, release=None):
+        self._path = os.path.abspath(path)
+        length = checkpoint.output_length(self._path)
+        if length is not None and os.path.exists(path) and os.path.getsize(path) > length:
+            print(f"Removing {os.path.getsize(path) - length} bytes of {path} whose places were never "
+                  "recorded; they are fetched again.")
+            with open(path, 'r+b') as f:
+                f.truncate(length)
+        self._file = open(path, 'ab')
+        self._queue = queue.Queue()
+        self._checkpoint = checkpoint
+        self._ordered = ordered
+        self._release = release
+        # place_ids put but not yet recorded in the checkpoint
+        self._unflushed = set()
+        self._lock = threading.Lock()
+        self._written_ids = []
+        self._dropped_ids = []
+        self._fetched = []
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="jsonl-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, sequence, place_id, record):
+        with self._lock:
+            self._unflushed.add(place_id)
+        self._queue.put((sequence, place_id, record))
+
+    def flushed(self, place_ids):
+        """True if none of `place_ids` has a record that was put but is not yet written and checkpointed."""
+        with self._lock:
+            return self._unflushed.isdisjoint(place_ids)
+
+    def _done(self, place_ids):
+        with self._lock:
+            self._unflushed.difference_update(place_ids)
+
+    def _write(self, place_id, record):
+        if record is None:
+            self._dropped_ids.append(place_id)
+            return
+        self._file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._written_ids.append(place_id)
+        self._fetched.append((place_id, time.time(), popularity(record), json.dumps(field_hashes(record))))
+        self.written += 1
+
+    def _flush(self):
+        self._file.flush()
+        if self._written_ids:
+            # On disk before the checkpoint says so, or a power loss could lose lines recorded as written
+            os.fsync(self._file.fileno())
+        if self._written_ids or self._dropped_ids:
+            self._checkpoint.finish_places(self._written_ids, self._dropped_ids, self._fetched,
+                                           (self._path, self._file.tell()))
+            if self._release is not None and self._dropped_ids:
+                self._release(self._dropped_ids)
+            self._done(self._written_ids + self._dropped_ids)
+            self._written_ids, self._dropped_ids, self._fetched = [], [], []
+
+    def _run(self):
+        waiting = {}
+        next_sequence = 0
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                break
+            sequence, place_id, record = item
+            if not self._ordered:
+                self._write(place_id, record)
+            else:
+                waiting[sequence] = (place_id, record)
+                while next_sequence in waiting:
+                    self._write(*waiting.pop(next_sequence))
+                    next_sequence += 1
+            # Flush once the backlog is drained, so a crash loses at most the lines in flight
+            if self._queue.empty():
+                self._flush()
+        # Records after a gap left by an interrupted run are still kept
+        for sequence in sorted(waiting):
+            self._write(*waiting[sequence])
+        self._flush()
+
+    def close(self):
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+        self._file.close()
+
+
+class UpdateSink(JsonlSink):
+    """
+    A JsonlSink for refreshes. Records are (check, update) pairs: the update
+    (a changed place's volatile fields, or None) goes to the updates file, and
+    each flush records the checks in the checkpoint store once their updates
+    are on disk, along with the file's length.
+    """
+
+    def __init__(self, path, checkpoint):
+        self._checks = []
+        self._taken = []
+        self._appended = False
+        self.changed = 0
+        super().__init__(path, checkpoint)
+
+    def _write(self, place_id, record):
+        self._taken.append(place_id)
+        if record is None:
+            return
+        check, update = record
+        if update is not None:
+            self._file.write((json.dumps(update, ensure_ascii=False) + '\n').encode('utf-8'))
+            self._appended = True
+            self.changed += 1
+        self._checks.append(check)
+        self.written += 1
+
+    def _flush(self):
+        self._file.flush()
+        if self._appended:
+            # The new field hashes must not be recorded without the update that carries them
+            os.fsync(self._file.fileno())
+            self._appended = False
+        if self._checks:
+            self._checkpoint.record_checks(self._checks, (self._path, self._file.tell()))
+            self._checks = []
+        self._done(self._taken)
+        self._taken = []
+
+
+# --- RESPONSE CACHE ---
+class CacheMiss(Exception):
+    """Raised in offline mode when a request is not in the response cache."""
+
+
+# Set up by main(): the on-disk response cache (None disables it), and whether
+# to serve only from it.
+RESPONSE_CACHE = None
+OFFLINE = False
+# next_page_token -> page number it leads to. Tokens change on every live run,
+# so search pages are cached by page number instead.
+PAGE_TOKENS = {}
+
+# Requests actually sent to the API per endpoint, excluding cache hits and retries.
+API_CALLS = {"textsearch": 0, "details": 0, "photo": 0}
+API_CALLS_LOCK = threading.Lock()
+
+def fetch(endpoint, url, params, cache_params=None, retry_invalid=False):
+    """
+    Returns the body of a Places API response, from the response cache when
+    it holds a fresh copy. Responses are cached under `cache_params` (if
+    given); error statuses are never cached.
+    """
+    if RESPONSE_CACHE is not None and cache_params is not None:
+        body = RESPONSE_CACHE.get(endpoint, cache_params, ignore_ttl=OFFLINE)
+        if body is not None:
+            return body
+    if OFFLINE:
+        raise CacheMiss(f"{endpoint} request is not in the response cache.")
+
+    with API_CALLS_LOCK:
+        API_CALLS[endpoint] += 1
+    response = api_get(url, params, stream=endpoint == "photo", retry_invalid=retry_invalid)
+    with response:
+        body = response.content
+    if RESPONSE_CACHE is not None and cache_params is not None:
+        if endpoint == "photo" or json.loads(body).get("status") in ("OK", "ZERO_RESULTS"):
+            RESPONSE_CACHE.put(endpoint, cache_params, body)
+    return body
 
 # --- HELPER FUNCTIONS ---
 def load_processed_queries():
@@ -57,11 +382,6 @@ def load_processed_queries():
     except FileNotFoundError:
         return set()
 
-def save_processed_query(query):
-    """Appends a new query to the log file to mark it as complete."""
-    with open(PROCESSED_QUERIES_FILE, 'a') as f:
-        f.write(f"{query}\n")
-
 def load_processed_ids_from_jsonl():
     """Loads all place_ids from the main JSONL file for de-duplication."""
     processed_place_ids = set()
@@ -78,13 +398,6 @@ def load_processed_ids_from_jsonl():
                     continue
     return processed_place_ids
 
-def save_processed_ids_to_txt(ids_set):
-    """Saves the set of processed place_ids to a new text file for verification."""
-    with open(PROCESSED_IDS_FILE, 'w') as f:
-        for place_id in ids_set:
-            f.write(f"{place_id}\n")
-    print(f"Verification file created: {PROCESSED_IDS_FILE}")
-
 def load_processed_ids_from_txt():
     """Loads place_ids from the verification text file for faster checking."""
     try:
@@ -93,68 +406,315 @@ def load_processed_ids_from_txt():
     except FileNotFoundError:
         return set()
 
-def perform_text_search(query, location, next_page_token=None):
+def cell_key(query, cell_id):
+    """Checkpoint key of one query over one search cell."""
+    return f"{query} in Singapore [{cell_id}]"
+
+def cell_center(bounds):
+    south, west, north, east = bounds
+    return {"lat": round((south + north) / 2, 6), "lng": round((west + east) / 2, 6)}
+
+def cell_radius(bounds):
+    """Radius in metres of the circle through the cell's corners, so one search covers the whole cell."""
+    south, west, north, east = bounds
+    width = math.radians(east - west) * math.cos(math.radians((south + north) / 2))
+    height = math.radians(north - south)
+    return math.ceil(math.hypot(width, height) / 2 * 6371008.8)
+
+def split_cell(cell_id, bounds):
+    """Returns the four quadrants of a cell as (cell_id, bounds): south-west, south-east, north-west, north-east."""
+    south, west, north, east = bounds
+    lat, lng = (south + north) / 2, (west + east) / 2
+    quadrants = [(south, west, lat, lng), (south, lng, lat, east), (lat, west, north, lng), (lat, lng, north, east)]
+    return [(f"{cell_id}{i}", quadrant) for i, quadrant in enumerate(quadrants)]
+
+def perform_text_search(query, location, radius, next_page_token=None):
     """
     Performs a text search with specific location bias and handles pagination.
-    Includes a short sleep to allow the next page token to become valid.
+    A next page token that is not valid yet is retried with backoff.
     """
     params = {
         "query": query,
         "key": API_KEY,
         "language": "en",
         "location": f"{location['lat']},{location['lng']}",
-        "radius": 15000
+        "radius": radius
     }
+    cache_params = dict(params, page=0)
     if next_page_token:
         params["pagetoken"] = next_page_token
-        time.sleep(0.1)
+        page = PAGE_TOKENS.get(next_page_token)
+        cache_params = dict(cache_params, page=page) if page is not None else None
     try:
-        response = requests.get(TEXT_SEARCH_URL, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        body = fetch("textsearch", TEXT_SEARCH_URL, params, cache_params, retry_invalid=bool(next_page_token))
+        results = json.loads(body)
+        if results.get("next_page_token") and cache_params is not None:
+            PAGE_TOKENS[results["next_page_token"]] = cache_params["page"] + 1
+        return results
+    except (requests.exceptions.RequestException, QuotaError, CacheMiss) as e:
         print(f"Error during search for '{query}': {e}")
         return None
 
-def get_place_details(place_id):
+def get_place_details(place_id, fields=DETAIL_FIELDS, cached=True):
     """
-    Fetches full details for a given place_id using the Place Details API.
-    Fields are explicitly requested to control costs.
+    Fetches details for a given place_id using the Place Details API.
+    Only `fields` are requested, to control costs; with `cached` False the
+    response cache is neither read nor written, so the result is current.
     """
     params = {
         "place_id": place_id,
         "key": API_KEY,
-        "fields": "name,formatted_address,geometry,photos,reviews,rating,user_ratings_total,types,website,url,international_phone_number,vicinity,price_level,opening_hours"
+        "fields": fields
     }
     try:
-        response = requests.get(DETAILS_URL, params=params)
-        response.raise_for_status()
-        return response.json().get("result")
-    except requests.exceptions.RequestException as e:
+        return json.loads(fetch("details", DETAILS_URL, params, params if cached else None)).get("result")
+    except (requests.exceptions.RequestException, QuotaError, CacheMiss) as e:
         print(f"Error fetching details for {place_id}: {e}")
         return None
 
 def download_photo(photo_reference, place_id, photo_index):
-    """Downloads a photo and returns its local path."""
+    """Downloads a photo and returns its local path. A photo already on disk is not downloaded again."""
     params = {
         "photo_reference": photo_reference,
         "maxwidth": 1600,
         "key": API_KEY
     }
+    filename = f"{place_id}_{photo_index}.jpg"
+    file_path = os.path.join(IMAGES_DIR, filename)
+    if os.path.exists(file_path):
+        return file_path
     try:
-        response = requests.get(PHOTO_URL, params=params, stream=True)
-        response.raise_for_status()
-        filename = f"{place_id}_{photo_index}.jpg"
-        file_path = os.path.join(IMAGES_DIR, filename)
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        body = fetch("photo", PHOTO_URL, params, params)
+        # Write under a temporary name so an interrupted download is never mistaken for a complete one
+        partial_path = file_path + ".part"
+        with open(partial_path, 'wb') as f:
+            f.write(body)
+        os.replace(partial_path, file_path)
         return file_path
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, QuotaError, CacheMiss) as e:
         print(f"Error downloading photo for {place_id}: {e}")
         return None
 
+def collect_place(place_id, name, sequence, photo_pool, sink, progress):
+    """
+    Fetches one place's details, downloads its photos on the photo pool and
+    queues the record for the JSONL sink. Runs on the details pool.
+    """
+    details = None
+    try:
+        print(f"  > Fetching details for '{name}'...")
+        details = get_place_details(place_id)
+        if not details:
+            return False
+
+        details['place_id'] = place_id
+        photo_futures = []
+        for i, photo_data in enumerate(details.get("photos", [])):
+            photo_ref = photo_data.get("photo_reference")
+            if photo_ref:
+                photo_futures.append(photo_pool.submit(download_photo, photo_ref, place_id, i))
+        details["local_image_paths"] = [path for path in (f.result() for f in photo_futures) if path]
+        print(f"  > Progress: {next(progress)} unique places collected.")
+        return True
+    finally:
+        # Always fill this place's slot, so an ordered sink never waits on it
+        sink.put(sequence, place_id, details)
+
+class PlaceClaims:
+    """
+    Thread-safe claims on place_ids: a place is new if neither this run nor
+    the checkpoint store has seen it.
+    """
+
+    def __init__(self, checkpoint):
+        self._checkpoint = checkpoint
+        self._place_ids = set()
+        self._lock = threading.Lock()
+        self._next_sequence = 0
+
+    def release(self, place_ids):
+        """Gives up the claims on places whose details could not be fetched, so they can be claimed again."""
+        with self._lock:
+            self._place_ids.difference_update(place_ids)
+
+    def claim(self, place_id, resumed=False):
+        """
+        Returns a sequence number if `place_id` is new, marking it as taken,
+        else None. `resumed` claims a place an interrupted run left pending.
+        """
+        with self._lock:
+            if place_id in self._place_ids or (not resumed and self._checkpoint.seen(place_id)):
+                return None
+            self._place_ids.add(place_id)
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            return sequence
+
+def search_query(key, query, bounds, resume, claims, checkpoint, detail_pool, photo_pool, sink, progress):
+    """
+    Pages through one text search over one cell, handing every new place to
+    the details pool. Runs on the search pool and returns the details
+    futures, the place_ids they fetch, the number of results and the number
+    of new places.
+
+    Each page is checkpointed under `key` together with the places it
+    claimed, so an interrupted search resumes from `resume`, its saved
+    (next_page_token, page). If that token has expired the search starts
+    over; the places it already found are skipped as seen.
+    """
+    full_query = f"{query} in Singapore"
+    location, radius = cell_center(bounds), cell_radius(bounds)
+    next_page_token, page = resume or (None, 0)
+    # Pages before a saved token were full; count their places as new, since
+    # which of them were new is not recorded
+    results = new = page * RESULTS_PER_PAGE
+    if next_page_token:
+        print(f"\nResuming '{key}' at page {page + 1}...")
+        PAGE_TOKENS[next_page_token] = page
+    else:
+        print(f"\nSearching for '{key}' within {radius} m...")
+    futures = []
+    place_ids = []
+
+    while True:
+        search_results = perform_text_search(full_query, location, radius, next_page_token)
+        if not search_results or "results" not in search_results:
+            if resume and page == resume[1]:
+                print(f"  > Saved page token for '{key}' no longer works. Restarting the search...")
+                next_page_token, page, resume = None, 0, None
+                results = new = 0
+                continue
+            break
+
+        results += len(search_results["results"])
+        claimed = []
+        for place in search_results["results"]:
+            place_id = place.get("place_id")
+
+            sequence = claims.claim(place_id) if place_id else None
+            if sequence is None:
+                print(f"  > Skipping place '{place.get('name')}' as it was already processed.")
+                continue
+            claimed.append((sequence, place_id, place.get('name')))
+
+        new += len(claimed)
+        next_page_token = search_results.get("next_page_token")
+        page += 1
+        # Checkpoint the page before its places can be written and cleared from pending
+        checkpoint.save_page(key, [(place_id, name) for _, place_id, name in claimed], next_page_token, page)
+        for sequence, place_id, name in claimed:
+            futures.append(detail_pool.submit(
+                collect_place, place_id, name, sequence, photo_pool, sink, progress
+            ))
+            place_ids.append(place_id)
+        if not next_page_token:
+            break
+    return futures, place_ids, results, new
+
+def should_split(cell_id, results, new):
+    """A cell is split when its search hit the result cap and still turned up enough new places."""
+    return results >= MAX_RESULTS_PER_SEARCH and new >= MIN_NEW_PLACES and len(cell_id) <= MAX_CELL_DEPTH
+
+def save_completed_queries(pending_queries, checkpoint, sink):
+    """
+    Marks (key, split, futures, place_ids) searches complete once all of
+    their places are fetched and recorded by the sink; returns the others.
+    """
+    still_running = []
+    completed = []
+    for key, split, futures, place_ids in pending_queries:
+        if all(future.done() for future in futures) and sink.flushed(place_ids):
+            completed.append((key, split))
+        else:
+            still_running.append((key, split, futures, place_ids))
+    if completed:
+        checkpoint.complete_queries(completed)
+    return still_running
+
+def refresh_place(place_id, previous_hashes, sequence, sink):
+    """
+    Re-fetches the volatile fields of one collected place and queues the
+    check, with the fields if any of them changed, for the update sink.
+    Runs on the details pool and returns the changed fields (None on failure).
+
+    A failed fetch (a place gone NOT_FOUND, or an error) is recorded as a
+    check without new hashes, so the place is not planned again at the top
+    of every run.
+    """
+    record = None
+    try:
+        details = get_place_details(place_id, fields=",".join(VOLATILE_FIELDS), cached=False)
+        checked_at = time.time()
+        if details is None:
+            record = ((place_id, checked_at, None, None, []), None)
+            return None
+        hashes = field_hashes(details)
+        changed = changed_fields(previous_hashes, hashes)
+        update = None
+        if changed:
+            update = {"place_id": place_id, "refreshed_at": checked_at}
+            update.update((field, details.get(field)) for field in VOLATILE_FIELDS)
+        record = ((place_id, checked_at, popularity(details), json.dumps(hashes), changed), update)
+        return changed
+    finally:
+        # Always fill this place's slot, so an ordered sink never waits on it
+        sink.put(sequence, place_id, record)
+
+def refresh_places(checkpoint, budget):
+    """
+    Re-fetches the volatile fields of up to `budget` collected places, the
+    ones most likely to have changed and most popular first (see
+    place_refresh.py), and appends the changes to UPDATES_OUTPUT_FILE.
+    """
+    if checkpoint.count_unscheduled() and os.path.exists(JSONL_OUTPUT_FILE):
+        # Places collected before fetch times were recorded: their hashes come from the JSONL
+        print("Recording the current state of places collected before freshness was tracked...")
+        checkpoint.seed_freshness([
+            (item['place_id'], popularity(item), json.dumps(field_hashes(item)))
+            for item in iter_items(JSONL_OUTPUT_FILE) if item.get('place_id')
+        ])
+
+    places = checkpoint.freshness()
+    plan = plan_refresh(places, budget, time.time())
+    print(f"Refreshing {len(plan)} of {len(places)} collected places (budget: {budget} details calls)...")
+    sink = UpdateSink(UPDATES_OUTPUT_FILE, checkpoint)
+    field_changes = {field: 0 for field in VOLATILE_FIELDS}
+    failed = 0
+    detail_pool = ThreadPoolExecutor(max_workers=DETAIL_WORKERS, thread_name_prefix="details")
+    try:
+        futures = [detail_pool.submit(refresh_place, place_id, hashes, sequence, sink)
+                   for sequence, (_, place_id, hashes) in enumerate(plan)]
+        for future in futures:
+            changed = future.result()
+            if changed is None:
+                failed += 1
+                continue
+            for field in changed:
+                field_changes[field] += 1
+    except KeyboardInterrupt:
+        print("\nInterrupted. Finishing the places already being refreshed...")
+        detail_pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        detail_pool.shutdown(wait=True)
+        sink.close()
+
+    print(f"Refreshed {sink.written} places with {API_CALLS['details']} details calls: {sink.changed} had changed "
+          f"and were appended to {UPDATES_OUTPUT_FILE}; {failed} could not be fetched.")
+    print("Changes by field: " + ", ".join(f"{field} {count}" for field, count in field_changes.items()))
+    print(f"Load them with: python load_places.py {JSONL_OUTPUT_FILE}")
+
+def convert_to_csv():
+    """
+    Appends the places collected since the last conversion to the CSV, with
+    refreshed fields applied; places refreshed since rewrite it in full (see
+    jsonl_to_csv.py).
+    """
+    print("\n--- Converting new places from JSONL to CSV... ---")
+    if update_jsonl_to_csv(JSONL_OUTPUT_FILE, DEFAULT_CSV_FILE, updates_file=UPDATES_OUTPUT_FILE) is not None:
+        print("CSV conversion completed successfully.")
+
 def main(args):
+    global RESPONSE_CACHE, OFFLINE
     # Create directories if they don't exist
     os.makedirs(IMAGES_DIR, exist_ok=True)
     os.makedirs(DATA_DIR, exist_ok=True)
@@ -167,117 +727,177 @@ def main(args):
             print("Please ensure you have a JSONL file to convert before running this test.")
             return
 
-        print("\n--- Starting JSONL to CSV conversion using external script... ---")
-        try:
-            subprocess.run(["python", "jsonl_to_csv.py"], check=True)
-            print("CSV conversion completed successfully.")
-        except FileNotFoundError:
-            print("Error: The script 'jsonl_to_csv.py' was not found. Please ensure it is in the correct directory.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error: The external script 'jsonl_to_csv.py' failed with exit code {e.returncode}.")
+        convert_to_csv()
         return
 
     # --- De-duplication and Verification Logic (Step 1) ---
-    processed_place_ids = load_processed_ids_from_txt()
-    if not processed_place_ids:
-        processed_place_ids = load_processed_ids_from_jsonl()
+    checkpoint = CheckpointStore(CHECKPOINT_FILE)
+    if checkpoint.is_empty():
+        processed_place_ids = load_processed_ids_from_txt() or load_processed_ids_from_jsonl()
+        legacy_queries = load_processed_queries()
+        if processed_place_ids or legacy_queries:
+            checkpoint.import_legacy(processed_place_ids, legacy_queries)
+            print(f"Imported {len(processed_place_ids)} places and {len(legacy_queries)} queries "
+                  f"into {CHECKPOINT_FILE}.")
+
+    if args.refresh:
+        try:
+            refresh_places(checkpoint, args.refresh_budget)
+        finally:
+            checkpoint.close()
+        convert_to_csv()
+        return
 
-    print(f"Found {len(processed_place_ids)} places from previous runs. Resuming...")
+    collected = checkpoint.count_places()
+    print(f"Found {collected} places from previous runs. Resuming...")
 
-    if len(processed_place_ids) > 0:
-        response = input("Verification completed. Do you want to proceed with data collection? (y/n): ").strip().lower()
+    if collected > 0:
+        response = 'y' if args.yes else input("Verification completed. Do you want to proceed with data collection? (y/n): ").strip().lower()
         if response != 'y':
             print("Operation canceled by user. Exiting.")
+            checkpoint.close()
             return
-        else:
-            save_processed_ids_to_txt(processed_place_ids)
-    
-    processed_queries = load_processed_queries()
 
-    with open(JSONL_OUTPUT_FILE, 'a', encoding='utf-8') as outfile:
+    processed_queries = checkpoint.completed_queries()
+    page_states = checkpoint.page_states()
+
+    OFFLINE = args.offline
+    if not args.no_cache:
+        RESPONSE_CACHE = ResponseCache(args.cache_dir, CACHE_MAX_BYTES, CACHE_TTLS)
+    if OFFLINE:
+        print(f"Offline: replaying responses from {args.cache_dir}, nothing is sent to the API.")
+
+    # Queries, details and photos each run on a bounded pool, and every record
+    # goes through one writer so JSONL lines stay whole.
+    claims = PlaceClaims(checkpoint)
+    # A replay claims places in query order and writes them in claim order,
+    # so it reproduces the same JSONL every time. A failed fetch's place can
+    # be claimed again by a later search, except in a replay, where it would
+    # fail again.
+    sink = JsonlSink(JSONL_OUTPUT_FILE, checkpoint, ordered=OFFLINE,
+                     release=None if OFFLINE else claims.release)
+    progress = itertools.count(1)
+    search_pool = ThreadPoolExecutor(max_workers=1 if OFFLINE else SEARCH_WORKERS, thread_name_prefix="search")
+    detail_pool = ThreadPoolExecutor(max_workers=DETAIL_WORKERS, thread_name_prefix="details")
+    photo_pool = ThreadPoolExecutor(max_workers=PHOTO_WORKERS, thread_name_prefix="photos")
+    pending_queries = []
+    crawl_stats = {"cells": 0, "splits": 0, "new": 0}
+    try:
         print(f"\nStarting new data collection for Singapore...")
-        places_processed_count = 0
-
-        for location_name, location_coords in GRID_LOCATIONS.items():
-            print(f"\n--- Searching for places in {location_name.upper()} Singapore ---")
-            
-            for category, queries in SEARCH_QUERIES.items():
-                for query in queries:
-                    full_query = f"{query} in {location_name}"
-                    
-                    if full_query in processed_queries:
-                        print(f"--- Skipping '{full_query}' as it was already processed. ---")
-                        continue
-
-                    print(f"\nSearching for '{full_query}'...")
-                    next_page_token = None
-                    
-                    while True:
-                        search_results = perform_text_search(full_query, location_coords, next_page_token)
-                        if not search_results or "results" not in search_results:
-                            break
-
-                        for place in search_results["results"]:
-                            place_id = place.get("place_id")
-                            
-                            if not place_id or place_id in processed_place_ids:
-                                print(f"  > Skipping place '{place.get('name')}' as it was already processed.")
-                                continue
-
-                            print(f"  > Fetching details for '{place.get('name')}'...")
-                            details = get_place_details(place_id)
-                            if not details:
-                                continue
-                            
-                            details['place_id'] = place_id
-                            processed_place_ids.add(place_id)
-                            
-                            local_image_paths = []
-                            if "photos" in details:
-                                for i, photo_data in enumerate(details["photos"]):
-                                    photo_ref = photo_data.get("photo_reference")
-                                    if photo_ref:
-                                        path = download_photo(photo_ref, place_id, i)
-                                        if path:
-                                            local_image_paths.append(path)
-
-                            details["local_image_paths"] = local_image_paths
-                            
-                            outfile.write(json.dumps(details, ensure_ascii=False) + '\n')
-                            places_processed_count += 1
-                            print(f"  > Progress: {places_processed_count} unique places collected.")
-                            
-                            time.sleep(0.01)
-
-                        next_page_token = search_results.get("next_page_token")
-                        if not next_page_token:
-                            break
-
-                    save_processed_query(full_query)
-    
-    print(f"\nData collection completed. Total unique places found: {len(processed_place_ids)}")
+
+        # Places an interrupted run found but never wrote go first
+        resumed = checkpoint.pending_places()
+        if resumed:
+            print(f"Resuming {len(resumed)} places left pending by the previous run...")
+        for place_id, name in resumed:
+            sequence = claims.claim(place_id, resumed=True)
+            if sequence is not None:
+                detail_pool.submit(collect_place, place_id, name, sequence, photo_pool, sink, progress)
+
+        # Search cells in submission order: (query, cell_id, bounds) per running search
+        searches = {}
+
+        def plan(query, cell_id, bounds):
+            key = cell_key(query, cell_id)
+            if key in processed_queries:
+                if not processed_queries[key]:
+                    print(f"--- Skipping '{key}' as it was already processed. ---")
+                    return
+                # Already split by an earlier run: its quadrants may still be left
+                for child in split_cell(cell_id, bounds):
+                    plan(query, *child)
+                return
+            searches[search_pool.submit(
+                search_query, key, query, bounds, page_states.get(key), claims, checkpoint,
+                detail_pool, photo_pool, sink, progress
+            )] = (query, cell_id, bounds)
+
+        for category, queries in SEARCH_QUERIES.items():
+            for query in queries:
+                plan(query, "0", SEARCH_BOUNDS)
+
+        # A search is recorded as processed once all of its places have been written
+        while searches:
+            done, _ = wait(searches, return_when=FIRST_COMPLETED)
+            for search_future in [future for future in searches if future in done]:
+                query, cell_id, bounds = searches.pop(search_future)
+                futures, place_ids, results, new = search_future.result()
+                split = should_split(cell_id, results, new)
+                crawl_stats["cells"] += 1
+                crawl_stats["splits"] += split
+                crawl_stats["new"] += new
+                if split:
+                    print(f"  > '{cell_key(query, cell_id)}' is saturated ({results} results, {new} new). "
+                          f"Splitting into quadrants...")
+                    # Saved now rather than on completion: a resumed search of this cell would find
+                    # nothing new, decide not to split and lose the quadrants
+                    checkpoint.mark_split(cell_key(query, cell_id))
+                pending_queries = save_completed_queries(
+                    pending_queries + [(cell_key(query, cell_id), split, futures, place_ids)], checkpoint, sink
+                )
+                if split:
+                    for child in split_cell(cell_id, bounds):
+                        plan(query, *child)
+    except KeyboardInterrupt:
+        print("\nInterrupted. Finishing the places already being fetched...")
+        search_pool.shutdown(wait=True, cancel_futures=True)
+        detail_pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        search_pool.shutdown(wait=True)
+        detail_pool.shutdown(wait=True)
+        photo_pool.shutdown(wait=True)
+        sink.close()
+        # Every record is written now, so the searches whose places were all fetched are complete
+        save_completed_queries(pending_queries, checkpoint, sink)
+        collected = checkpoint.count_places()
+        checkpoint.close()
+
+    print(f"\nData collection completed. Total unique places found: {collected}")
     print(f"Results are stored in {JSONL_OUTPUT_FILE} and images in the {IMAGES_DIR} folder.")
-    
-    print("\n--- Starting JSONL to CSV conversion using external script... ---")
+    calls = sum(API_CALLS.values())
+    print(f"Searched {crawl_stats['cells']} cells ({crawl_stats['splits']} split) and found "
+          f"{crawl_stats['new']} new places with {calls} API calls "
+          f"({API_CALLS['textsearch']} searches, {API_CALLS['details']} details, {API_CALLS['photo']} photos).")
+    if crawl_stats["new"]:
+        print(f"API calls per new place: {calls / crawl_stats['new']:.2f} "
+              f"({API_CALLS['textsearch'] / crawl_stats['new']:.2f} of them searches).")
+    if RESPONSE_CACHE is not None:
+        stats = RESPONSE_CACHE.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries_bytes'] / 1024 / 1024:.1f} MB on disk.")
+
+    print("\n--- Deduplicating and resizing photos... ---")
     try:
-        subprocess.run(["python", "jsonl_to_csv.py"], check=True)
-        print("CSV conversion completed successfully.")
-    except FileNotFoundError:
-        print("Error: The script 'jsonl_to_csv.py' was not found. Please ensure it is in the correct directory.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error: The external script 'jsonl_to_csv.py' failed with exit code {e.returncode}.")
+        photo_summary = process_photos(JSONL_OUTPUT_FILE, PHOTOS_DIR, workers=PHOTO_PROCESS_WORKERS)
+        print(f"{photo_summary['references']} photos are {photo_summary['unique']} unique images; "
+              f"resized {photo_summary['rendered']} new ones into {PHOTOS_DIR} "
+              f"({photo_summary['failed']} could not be decoded).")
+    except ConversionError as e:
+        print(f"Error: Photo processing failed: {e}")
+
+    convert_to_csv()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Google Places Data Collector and Converter.")
     parser.add_argument("--jsonl-to-csv", action="store_true",
                         help="Only tests the JSONL to CSV conversion, skipping data collection.")
+    parser.add_argument("--yes", action="store_true",
+                        help="Resume without asking for confirmation when previous results exist.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Serve every request from the response cache; requests it does not hold are skipped.")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the response cache.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Directory of the response cache.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-fetch the changing fields of collected places instead of searching for new ones.")
+    parser.add_argument("--refresh-budget", type=int, default=REFRESH_BUDGET,
+                        help="Most Place Details calls a --refresh run may make.")
     args = parser.parse_args()
 
-    TEXT_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
-    PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
-
-    if not API_KEY:
+    if args.offline and args.no_cache:
+        print("Error: --offline needs the response cache; drop --no-cache.")
+    elif args.offline and args.refresh:
+        print("Error: --refresh needs current responses and cannot run --offline.")
+    elif not API_KEY and not args.offline:
         print("Error: Please set the 'GOOGLE_PLACES_API_KEY' environment variable.")
     else:
         main(args)
\ No newline at end of file
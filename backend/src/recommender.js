@@ -0,0 +1,92 @@
+import { spawn } from "child_process";
+import path from "path";
+import readline from "readline";
+import { fileURLToPath } from "url";
+
+// Long-lived prediction.py workers speaking newline-delimited JSON over stdin/stdout.
+// Each worker loads the model once, so requests skip interpreter start-up and model rebuilds.
+const __dirname = path.dirname(fileURLToPath(import.meta.url));
+const PYTHON = process.env.RECOMMENDER_PYTHON || "python";
+const SCRIPT = process.env.RECOMMENDER_SCRIPT || path.resolve(__dirname, "../../prediction.py");
+const POOL_SIZE = Math.max(1, Number(process.env.RECOMMENDER_POOL_SIZE || 1));
+const REQUEST_TIMEOUT_MS = Number(process.env.RECOMMENDER_TIMEOUT_MS || 10000);
+
+class RecommenderWorker {
+  constructor() {
+    this.child = null;
+    this.nextId = 1;
+    this.pending = new Map();
+  }
+
+  start() {
+    // DB_HOST, DB_PORT, DB_USER, DB_PASSWORD and DB_NAME are passed through the environment
+    const child = spawn(PYTHON, [SCRIPT, "worker"], { env: process.env, stdio: ["pipe", "pipe", "inherit"] });
+    readline.createInterface({ input: child.stdout }).on("line", line => this.onLine(line));
+    // Spawn failures (e.g. python missing) and broken pipes to a dead worker must not crash the server;
+    // the next call starts a new worker
+    child.on("error", err => {
+      if (this.child === child) this.child = null;
+      this.failAll(err);
+    });
+    child.stdin.on("error", err => {
+      if (this.child === child) this.child = null;
+      child.kill();
+      this.failAll(err);
+    });
+    child.on("exit", (code, signal) => {
+      if (this.child === child) this.child = null;
+      this.failAll(new Error(`Recommender worker exited (code ${code}, signal ${signal})`));
+    });
+    this.child = child;
+  }
+
+  onLine(line) {
+    let response;
+    try {
+      response = JSON.parse(line);
+    } catch (e) {
+      console.error("Recommender worker sent invalid JSON:", line);
+      return;
+    }
+    const entry = this.pending.get(response.id);
+    if (!entry) return;
+    this.pending.delete(response.id);
+    clearTimeout(entry.timer);
+    if (response.error) entry.reject(new Error(response.error));
+    else entry.resolve(response.result);
+  }
+
+  failAll(err) {
+    for (const entry of this.pending.values()) {
+      clearTimeout(entry.timer);
+      entry.reject(err);
+    }
+    this.pending.clear();
+  }
+
+  call(method, params) {
+    if (!this.child) this.start();
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Recommender request timed out after ${REQUEST_TIMEOUT_MS} ms`));
+      }, REQUEST_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+      this.child.stdin.write(JSON.stringify({ id, method, params }) + "\n");
+    });
+  }
+}
+
+const workers = Array.from({ length: POOL_SIZE }, () => new RecommenderWorker());
+
+/**
+ * Sends a request to the least busy recommender worker, starting it on first use.
+ * @param {string} method e.g. "recommend", "recommend_batch", "similar_places"
+ * @param {object} params
+ * @returns {Promise<any>}
+ */
+export function callRecommender(method, params = {}) {
+  const worker = workers.reduce((best, w) => (w.pending.size < best.pending.size ? w : best));
+  return worker.call(method, params);
+}
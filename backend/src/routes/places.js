@@ -1,20 +1,29 @@
 
 import express from "express";
 import { pool } from "../mysql.js";
-import { exec } from "child_process";
+import { callRecommender } from "../recommender.js";
 
 const router = express.Router();
 
 /**
- * Safely parses the opening_hours JSON string from the database.
- * The data is stored as a Python dict repr, so it needs cleaning.
- * @param {string | null | undefined} hoursString
+ * Safely parses the opening_hours value from the database.
+ * Rows loaded from the converter's Parquet/Arrow output hold real JSON; older
+ * rows imported from the CSV hold a Python dict repr, which needs cleaning.
+ * @param {string | object | null | undefined} hoursString
  * @returns {object | null}
  */
 function parseOpeningHours(hoursString) {
+  if (hoursString && typeof hoursString === "object") {
+    return hoursString; // Already decoded (JSON column)
+  }
   if (!hoursString || typeof hoursString !== "string") {
     return null;
   }
+  try {
+    return JSON.parse(hoursString);
+  } catch (e) {
+    // Not JSON: fall back to the legacy Python repr format
+  }
   try {
     // Convert Python-style dict string to valid JSON
     const jsonString = hoursString.replace(/'/g, '"').replace(/True/g, "true").replace(/False/g, "false").replace(/None/g, "null");
@@ -58,6 +67,48 @@ router.get("/", async (_req, res) => {
   }
 });
 
+router.get("/recommendations", async (req, res) => {
+  // Serve precomputed recommendations (written by `python prediction.py precompute`) when available
+  const userId = req.session.user?.account_id;
+  if (userId) {
+    try {
+      const [rows] = await pool.query(
+        "SELECT place_id FROM user_recommendations WHERE user_id = ? ORDER BY position",
+        [userId]
+      );
+      if (rows.length) return res.json(rows.map(row => row.place_id));
+    } catch (e) {
+      console.error("/api/places/recommendations lookup error:", {
+        message: e.message, code: e.code, errno: e.errno, sqlState: e.sqlState
+      });
+    }
+  }
+
+  try {
+    const result = await callRecommender("recommend", { user_id: userId ?? null, top_n: 5 });
+    res.json(result);
+  } catch (e) {
+    console.error("Prediction error:", e.message);
+    res.status(500).json({ error: "Failed to generate recommendations" });
+  }
+});
+
+router.get("/open", async (req, res) => {
+  // Answered from the recommender's precompiled opening-hours index rather than parsing opening_hours here
+  const ids = req.query.place_ids;
+  const params = {
+    place_ids: ids == null ? null : String(ids).split(",").filter(Boolean),
+    at: req.query.at || null,
+    include_unknown: req.query.include_unknown === "true",
+  };
+  try {
+    res.json(await callRecommender("open_places", params));
+  } catch (e) {
+    console.error("/api/places/open error:", e.message);
+    res.status(500).json({ error: "Failed to check opening hours" });
+  }
+});
+
 router.get("/:placeId", async (req, res) => {
   try {
     const placeId = req.params.placeId;
@@ -107,34 +158,4 @@ router.get("/:placeId", async (req, res) => {
   }
 });
 
-router.get("/recommendations", async (_req, res) => {
-  // Dynamically build the python command using environment variables
-  // This is more secure and portable than hardcoding credentials.
-  const command = [
-    "python",
-    "../prediction.py",
-    `--mysql-host ${process.env.DB_HOST}`,
-    `--mysql-port ${process.env.DB_PORT}`,
-    `--mysql-user ${process.env.DB_USER}`,
-    `--mysql-password ${process.env.DB_PASSWORD}`,
-    `--mysql-db ${process.env.DB_NAME}`,
-    "--mysql-table clicks --mode top --topk 5 --min-reviews 10 --pretty",
-  ].join(" ");
-  exec(
-    command,
-    (error, stdout, stderr) => {
-      if (error) {
-        console.error("Prediction error:", error, stderr);
-        return res.status(500).json({ error: "Failed to generate recommendations" });
-      }
-      try {
-        const result = JSON.parse(stdout);
-        res.json(result);
-      } catch (e) {
-        res.status(500).json({ error: "Failed to parse recommendations" });
-      }
-    }
-  );
-});
-
 export default router;
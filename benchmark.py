@@ -0,0 +1,551 @@
+"""
+Benchmarks and load tests for the recommendation service (prediction.py).
+
+    python benchmark.py micro --scale 10k --scale 100k --output micro.json
+    python benchmark.py load --scale 100k --concurrency 16 --duration 30 --output load.json
+    python benchmark.py compare old.json new.json
+
+Both benchmarks run against synthetic interactions with power-law user activity
+and place popularity, loaded into a local SQLite file that stands in for MySQL,
+so they need no database server. `load --backend mysql` instead runs the app
+against the database configured through the DB_* environment variables.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import prediction
+from opening_hours import compile_periods, daily_periods
+from sqlite_standin import SQLiteConnection
+
+# --- Benchmark Configuration ---
+# Named scales: (interactions, users, places).
+SCALES = {
+    "10k": (10_000, 2_000, 500),
+    "100k": (100_000, 20_000, 5_000),
+    "1m": (1_000_000, 100_000, 20_000),
+}
+# Zipf exponents for user activity and place popularity.
+USER_ALPHA = 1.1
+PLACE_ALPHA = 1.0
+# Bounding box the synthetic places are scattered over (Singapore).
+LAT_RANGE = (1.24, 1.46)
+LNG_RANGE = (103.62, 104.00)
+CATEGORIES = ["food", "attraction", "shopping", "nature", "museum", "nightlife"]
+# Words the synthetic reviews are drawn from, and reviews written per place.
+REVIEW_WORDS = ["great", "crowded", "view", "queue", "cheap", "pricey", "friendly", "clean", "night", "family"]
+REVIEWS_PER_PLACE = 2
+
+# Weighted request mix for the load test: name -> weight.
+LOAD_MIX = {
+    "recommendations": 50,
+    "recommendations_item": 15,
+    "recommendations_nearby": 10,
+    "recommendations_batch": 5,
+    "similar_places": 10,
+    "nearby": 10,
+}
+BATCH_SIZE = 50
+
+
+# --- Synthetic Data ---
+
+def zipf_weights(n: int, alpha: float) -> np.ndarray:
+    """Returns normalised power-law weights 1 / rank^alpha for ranks 1..n."""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** alpha
+    return weights / weights.sum()
+
+def generate_interactions(n_interactions: int, n_users: int, n_places: int,
+                          user_alpha: float = USER_ALPHA, place_alpha: float = PLACE_ALPHA,
+                          seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draws synthetic (user_id, place_id) interaction rows.
+
+    Both the number of interactions per user and the popularity of each place
+    follow a power law, so a few heavy users and popular places dominate as
+    they do in real check-in data. Ranks are shuffled across IDs so that
+    popularity does not line up with ID order.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: user_ids and place_ids, one entry per interaction.
+    """
+    rng = np.random.default_rng(seed)
+    user_ranks = rng.choice(n_users, size=n_interactions, p=zipf_weights(n_users, user_alpha))
+    place_ranks = rng.choice(n_places, size=n_interactions, p=zipf_weights(n_places, place_alpha))
+    user_ids = rng.permutation(n_users)[user_ranks] + 1
+    place_ids = rng.permutation(n_places)[place_ranks] + 1
+    return user_ids, place_ids
+
+def generate_places(n_places: int, seed: int = 0) -> Dict[str, list]:
+    """Draws a synthetic place catalogue in the same shape as `prediction.DUMMY_PLACES`."""
+    rng = np.random.default_rng(seed + 1)
+    # Daily hours opening 06:00-11:00 and closing 17:00-23:00; about one place in ten has unknown hours
+    opens, closes = rng.integers(6, 12, n_places), rng.integers(17, 24, n_places)
+    known = rng.random(n_places) >= 0.1
+    return {
+        'place_id': list(range(1, n_places + 1)),
+        'place_name': [f"Place {i}" for i in range(1, n_places + 1)],
+        'latitude': rng.uniform(*LAT_RANGE, n_places).tolist(),
+        'longitude': rng.uniform(*LNG_RANGE, n_places).tolist(),
+        'category': rng.choice(CATEGORIES, n_places).tolist(),
+        'rating': np.round(rng.uniform(3.0, 5.0, n_places), 1).tolist(),
+        # 0 stands for an unknown price level
+        'price_level': [int(level) or None for level in rng.integers(0, 5, n_places)],
+        'open_intervals': [
+            compile_periods({"periods": daily_periods(f"{o:02d}00", f"{c:02d}00")}) if k else None
+            for o, c, k in zip(opens, closes, known)
+        ],
+    }
+
+
+def generate_reviews(places: Dict[str, list], seed: int = 0) -> Dict[str, list]:
+    """Draws a few short reviews per place, in the same shape as `prediction.DUMMY_REVIEWS`."""
+    rng = np.random.default_rng(seed + 2)
+    place_ids = [place_id for place_id in places['place_id'] for _ in range(REVIEWS_PER_PLACE)]
+    categories = [category for category in places['category'] for _ in range(REVIEWS_PER_PLACE)]
+    return {
+        'place_id': place_ids,
+        'review_text': [f"{category} {' '.join(rng.choice(REVIEW_WORDS, 5))}" for category in categories],
+    }
+
+
+# --- SQLite Stand-in ---
+
+def create_sqlite_database(path: str, user_ids: np.ndarray, place_ids: np.ndarray,
+                           places: Dict[str, list]) -> None:
+    """Writes the interaction, catalogue and review tables prediction.py reads into a SQLite file."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {prediction.DB_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {prediction.CATALOGUE_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {prediction.REVIEW_TABLE}")
+        conn.execute(
+            f"CREATE TABLE {prediction.DB_TABLE} "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, place_id INTEGER)"
+        )
+        conn.execute(
+            f"CREATE TABLE {prediction.CATALOGUE_TABLE} (place_id INTEGER, place_name TEXT, "
+            "latitude REAL, longitude REAL, category TEXT, rating REAL, price_level REAL, open_intervals TEXT)"
+        )
+        conn.execute(
+            f"CREATE TABLE {prediction.REVIEW_TABLE} "
+            f"({prediction.REVIEW_WATERMARK_COLUMN} INTEGER PRIMARY KEY, place_id TEXT, review_text TEXT)"
+        )
+        conn.executemany(
+            f"INSERT INTO {prediction.DB_TABLE} (user_id, place_id) VALUES (?, ?)",
+            zip(user_ids.tolist(), place_ids.tolist()),
+        )
+        columns = ['place_id', 'place_name', 'latitude', 'longitude', 'category', 'rating', 'price_level',
+                   'open_intervals']
+        conn.executemany(
+            f"INSERT INTO {prediction.CATALOGUE_TABLE} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?'] * len(columns))})",
+            zip(*(places[column] for column in columns)),
+        )
+        reviews = generate_reviews(places)
+        conn.executemany(
+            f"INSERT INTO {prediction.REVIEW_TABLE} (place_id, review_text) VALUES (?, ?)",
+            zip(reviews['place_id'], reviews['review_text']),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def use_sqlite(path: str) -> None:
+    """Points prediction.py's connections (pooled and one-off) at a SQLite file."""
+    prediction.get_connection = lambda **kwargs: SQLiteConnection(path)
+
+
+# --- Measurement ---
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    """Summarises latency samples (seconds) as count, mean and percentiles in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def measure(func: Callable[[int], Any], repeat: int) -> Dict[str, float]:
+    """
+    Times `func(i)` for i in range(repeat), then runs it once more under
+    tracemalloc to record its peak Python/numpy allocation separately, so the
+    tracing overhead does not distort the latencies.
+    """
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func(repeat)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = summarise(samples)
+    result["peak_memory_mb"] = round(peak / 2**20, 3)
+    return result
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process so far, in megabytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+def environment() -> Dict[str, Any]:
+    """Describes the machine and code version, so reports from different runs can be compared."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def sample_users(user_ids: np.ndarray, n: int, seed: int) -> np.ndarray:
+    """Samples request user IDs in proportion to their activity, like real traffic."""
+    rng = np.random.default_rng(seed + 2)
+    return user_ids[rng.integers(0, len(user_ids), n)]
+
+
+# --- Microbenchmarks ---
+
+def run_micro(scale: str, repeat: int, seed: int, workdir: str) -> Dict[str, Any]:
+    """
+    Benchmarks the model load and per-request scoring paths at one scale.
+
+    Returns:
+        Dict[str, Any]: Dataset shape and one latency/memory summary per operation.
+    """
+    n_interactions, n_users, n_places = SCALES[scale]
+    user_ids, place_ids = generate_interactions(n_interactions, n_users, n_places, seed=seed)
+    path = os.path.join(workdir, f"micro-{scale}.db")
+    create_sqlite_database(path, user_ids, place_ids, generate_places(n_places, seed))
+    use_sqlite(path)
+
+    store = prediction.interaction_store
+    requests = sample_users(user_ids, repeat + 1, seed)
+    # The full reload and index build are the slow paths; cap their repetitions
+    slow_repeat = max(1, min(repeat, 5))
+
+    results = {
+        "get_user_item_matrix_cold": measure(lambda i: store.refresh(full=True), slow_repeat),
+        "get_user_item_matrix_warm": measure(lambda i: prediction.get_user_item_matrix(), repeat),
+    }
+    matrix = prediction.get_user_item_matrix()
+    results.update({
+        "build_user_item_matrix": measure(
+            lambda i: prediction.build_user_item_matrix(user_ids, place_ids), slow_repeat
+        ),
+        "build_item_neighbour_index": measure(
+            lambda i: prediction.build_item_neighbour_index(matrix, k=prediction.ITEM_NEIGHBOURS_K), slow_repeat
+        ),
+    })
+    # Item mode reads the store's index; build it once outside the timings
+    prediction.item_index_store.refresh()
+    results.update({
+        "recommend_for_user_user": measure(
+            lambda i: prediction.recommend_for_user(int(requests[i]), top_n=10, mode="user"), repeat
+        ),
+        "recommend_for_user_item": measure(
+            lambda i: prediction.recommend_for_user(int(requests[i]), top_n=10, mode="item"), repeat
+        ),
+    })
+    return {
+        "scale": scale,
+        "interactions": n_interactions,
+        "users": int(matrix.shape[0]),
+        "places": int(matrix.shape[1]),
+        "nnz": int(matrix.matrix.nnz),
+        "results": results,
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+# --- Load Test ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int):
+    """Runs the FastAPI app under uvicorn on a background thread and waits until it is serving."""
+    import uvicorn
+
+    config = uvicorn.Config(prediction.create_app(), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="benchmark-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The benchmark server failed to start.")
+        time.sleep(0.05)
+    return server, thread
+
+def build_request(name: str, rng: random.Random, user_ids: np.ndarray,
+                  place_ids: np.ndarray) -> Tuple[str, str, Optional[bytes]]:
+    """Returns (method, path, body) for one request of the given kind."""
+    user_id = int(user_ids[rng.randrange(len(user_ids))])
+    lat, lng = rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+    if name == "recommendations":
+        return "GET", f"/recommendations?user_id={user_id}&top_n=10", None
+    if name == "recommendations_item":
+        return "GET", f"/recommendations?user_id={user_id}&top_n=10&mode=item", None
+    if name == "recommendations_nearby":
+        return "GET", f"/recommendations?user_id={user_id}&top_n=10&lat={lat:.5f}&lng={lng:.5f}", None
+    if name == "recommendations_batch":
+        batch = [int(user_ids[rng.randrange(len(user_ids))]) for _ in range(BATCH_SIZE)]
+        return "POST", "/recommendations/batch", json.dumps({"user_ids": batch, "top_n": 10}).encode()
+    if name == "similar_places":
+        place_id = urllib.parse.quote(str(place_ids[rng.randrange(len(place_ids))]))
+        return "GET", f"/similar-places?place_id={place_id}", None
+    if name == "nearby":
+        return "GET", f"/nearby?lat={lat:.5f}&lng={lng:.5f}&k=10", None
+    raise ValueError(f"Unknown request kind: {name}")
+
+def run_client(host: str, port: int, deadline: float, max_requests: int, counter: List[int],
+               lock: threading.Lock, seed: int, user_ids: np.ndarray,
+               place_ids: np.ndarray) -> Dict[str, Dict[str, list]]:
+    """One closed-loop client: sends requests over a keep-alive connection until done."""
+    rng = random.Random(seed)
+    names, weights = zip(*LOAD_MIX.items())
+    results: Dict[str, Dict[str, list]] = {name: {"latencies": [], "errors": []} for name in names}
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        while time.perf_counter() < deadline:
+            with lock:
+                if counter[0] >= max_requests:
+                    break
+                counter[0] += 1
+            name = rng.choices(names, weights)[0]
+            method, path, body = build_request(name, rng, user_ids, place_ids)
+            headers = {"Content-Type": "application/json"} if body else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if status == 200:
+                results[name]["latencies"].append(elapsed)
+            else:
+                results[name]["errors"].append(str(status))
+    finally:
+        conn.close()
+    return results
+
+def run_load(scale: str, backend: str, concurrency: int, duration: float, max_requests: int,
+             warmup: int, seed: int, workdir: str) -> Dict[str, Any]:
+    """
+    Drives the FastAPI app over HTTP with a weighted request mix.
+
+    Returns:
+        Dict[str, Any]: Throughput, per-request-kind latency summaries and error counts.
+    """
+    n_interactions, n_users, n_places = SCALES[scale]
+    user_ids, place_ids = generate_interactions(n_interactions, n_users, n_places, seed=seed)
+    if backend == "sqlite":
+        path = os.path.join(workdir, f"load-{scale}.db")
+        create_sqlite_database(path, user_ids, place_ids, generate_places(n_places, seed))
+        use_sqlite(path)
+
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        if backend == "mysql":
+            # Query the users and places that are actually in the configured database
+            matrix = prediction.get_user_item_matrix()
+            user_ids, place_ids = matrix.user_ids, matrix.place_ids
+        requests = sample_users(user_ids, 100_000, seed)
+
+        if warmup:
+            run_client("127.0.0.1", port, float("inf"), warmup, [0], threading.Lock(),
+                       seed - 1, requests, place_ids)
+
+        counter, lock = [0], threading.Lock()
+        started = time.perf_counter()
+        deadline = started + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_client, "127.0.0.1", port, deadline, max_requests, counter, lock,
+                                seed + i, requests, place_ids)
+                for i in range(concurrency)
+            ]
+            client_results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    endpoints = {}
+    total = 0
+    for name in LOAD_MIX:
+        latencies = [t for result in client_results for t in result[name]["latencies"]]
+        errors = [e for result in client_results for e in result[name]["errors"]]
+        summary = summarise(latencies)
+        summary["errors"] = len(errors)
+        if errors:
+            summary["error_kinds"] = {kind: errors.count(kind) for kind in set(errors)}
+        endpoints[name] = summary
+        total += len(latencies) + len(errors)
+    all_latencies = [t for result in client_results for r in result.values() for t in r["latencies"]]
+    return {
+        "scale": scale,
+        "backend": backend,
+        "concurrency": concurrency,
+        "duration_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "overall": summarise(all_latencies),
+        "endpoints": endpoints,
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+# --- Reports ---
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        print(f"Report written to {output}")
+    else:
+        print(text)
+
+def flatten(report: Dict[str, Any]) -> Dict[str, float]:
+    """Maps 'run/operation/metric' -> value for every latency figure in a report."""
+    values = {}
+    for run in report.get("runs", []):
+        operations = run.get("results") or run.get("endpoints") or {}
+        for operation, summary in operations.items():
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_memory_mb"):
+                if metric in summary:
+                    values[f"{run['scale']}/{operation}/{metric}"] = summary[metric]
+        if "throughput_rps" in run:
+            values[f"{run['scale']}/throughput_rps"] = run["throughput_rps"]
+    return values
+
+def compare_reports(baseline_path: str, candidate_path: str) -> None:
+    """Prints the relative change of every shared figure between two reports."""
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f))
+    with open(candidate_path) as f:
+        candidate = flatten(json.load(f))
+    print(f"{'metric':<60} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{key:<60} {old:>12.3f} {new:>12.3f} {change:>9}")
+
+def print_summary(run: Dict[str, Any]) -> None:
+    operations = run.get("results") or run.get("endpoints")
+    print(f"\n== {run['scale']} ==")
+    if "throughput_rps" in run:
+        print(f"{run['requests']} requests in {run['duration_seconds']}s ({run['throughput_rps']} req/s)")
+    last = "peak MB" if "results" in run else "errors"
+    print(f"{'operation':<30} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {last:>9}")
+    for operation, s in operations.items():
+        extra = s.get("peak_memory_mb", s.get("errors", 0))
+        print(f"{operation:<30} {s['count']:>7} {s.get('p50_ms', 0):>9.3f} {s.get('p95_ms', 0):>9.3f} "
+              f"{s.get('p99_ms', 0):>9.3f} {extra:>9g}")
+
+
+# --- Command Line ---
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks for the recommendation service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    micro_parser = subparsers.add_parser("micro", help="Time model loading and scoring in-process.")
+    micro_parser.add_argument("--repeat", type=int, default=200, help="Timed calls per fast operation.")
+
+    load_parser = subparsers.add_parser("load", help="Load-test the FastAPI app over HTTP.")
+    load_parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite",
+                             help="Serve synthetic data from SQLite, or use the configured MySQL database.")
+    load_parser.add_argument("--concurrency", type=int, default=8, help="Concurrent closed-loop clients.")
+    load_parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run each scale for.")
+    load_parser.add_argument("--max-requests", type=int, default=10**9, help="Stop after this many requests.")
+    load_parser.add_argument("--warmup", type=int, default=100, help="Untimed requests sent first.")
+
+    for subparser in (micro_parser, load_parser):
+        subparser.add_argument("--scale", action="append", choices=sorted(SCALES),
+                               help="Dataset scale; repeat to run several (default: 10k).")
+        subparser.add_argument("--seed", type=int, default=0)
+        subparser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two JSON reports.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare_reports(args.baseline, args.candidate)
+        return
+
+    # Keep background refreshes out of the measurements
+    prediction.interaction_store.refresh_interval = 0
+    prediction.item_index_store.refresh_interval = 0
+    prediction.catalogue_store.refresh_interval = 0
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="recommender-bench-") as workdir:
+        for scale in args.scale or ["10k"]:
+            # The service logs to stdout; keep it apart from the report
+            with redirect_stdout(sys.stderr):
+                if args.command == "micro":
+                    run = run_micro(scale, args.repeat, args.seed, workdir)
+                else:
+                    run = run_load(scale, args.backend, args.concurrency, args.duration,
+                                   args.max_requests, args.warmup, args.seed, workdir)
+                print_summary(run)
+            runs.append(run)
+
+    report = {
+        "benchmark": args.command,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "runs": runs,
+    }
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import zlib
+import numpy as np
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+from search_index import tokenize
+
+# Review text is TF-IDF weighted and hashed into this many buckets, so the
+# vector width does not grow with the vocabulary.
+REVIEW_DIMS = 256
+
+# Relative weight of each feature block in the cosine similarity.
+CATEGORY_WEIGHT = 1.0
+PRICE_WEIGHT = 0.5
+RATING_WEIGHT = 0.5
+REVIEW_WEIGHT = 1.5
+
+# Google price levels run from 0 (free) to 4 (very expensive); ratings are
+# bucketed into half stars from 1 to 5.
+PRICE_LEVELS = 5
+RATING_BUCKETS = 9
+
+# The index partitions places into about sqrt(n) clusters and a query scans
+# the places of the IVF_PROBES clusters nearest to it.
+IVF_PROBES = 12
+# k-means is trained on a sample of at most this many places.
+IVF_TRAINING_SAMPLE = 50000
+IVF_TRAINING_ITERATIONS = 10
+
+
+def hash_term(term: str, dims: int = REVIEW_DIMS) -> int:
+    """Bucket of a review term. crc32 rather than hash(), so vectors built in different processes agree."""
+    return zlib.crc32(term.encode("utf-8")) % dims
+
+def soft_one_hot(values: np.ndarray, size: int) -> np.ndarray:
+    """
+    One-hot encodes integer levels, with half weight on the neighbouring
+    levels so that adjacent prices or ratings are similar but not identical.
+    Missing values (NaN) encode as zeros.
+    """
+    encoded = np.zeros((len(values), size), dtype=np.float32)
+    present = np.flatnonzero(~np.isnan(values))
+    levels = np.clip(np.rint(values[present]), 0, size - 1).astype(np.int64)
+    encoded[present, levels] = 1.0
+    encoded[present[levels > 0], levels[levels > 0] - 1] = 0.5
+    encoded[present[levels < size - 1], levels[levels < size - 1] + 1] = 0.5
+    return encoded
+
+def review_tfidf(n_docs: int, reviews: Iterable[Tuple[int, Optional[str]]], dims: int = REVIEW_DIMS) -> np.ndarray:
+    """
+    Hashed TF-IDF of each place's review text.
+
+    Args:
+        reviews: (place position, review text) pairs.
+
+    Returns:
+        np.ndarray: An (n_docs, dims) float32 matrix; places without reviews are all zeros.
+    """
+    docs, buckets = [], []
+    for doc, text in reviews:
+        terms = tokenize(text)
+        docs.extend([doc] * len(terms))
+        buckets.extend(hash_term(t, dims) for t in terms)
+    counts = np.bincount(np.array(docs, dtype=np.int64) * dims + np.array(buckets, dtype=np.int64),
+                         minlength=n_docs * dims).reshape(n_docs, dims).astype(np.float32)
+    df = np.count_nonzero(counts, axis=0)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    return np.log1p(counts) * idf.astype(np.float32)
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def build_place_vectors(categories: Sequence[Any], price_levels: Sequence[Optional[float]],
+                        ratings: Sequence[Optional[float]],
+                        reviews: Iterable[Tuple[int, Optional[str]]]) -> np.ndarray:
+    """
+    Builds one unit-length float32 content vector per place.
+
+    The vector concatenates a one-hot category, soft one-hot price level and
+    rating, and hashed review TF-IDF. Each block is normalised on its own and
+    scaled by its weight, so a place missing a feature (no reviews, no price)
+    is compared on the features it has.
+    """
+    categories = np.asarray(categories, dtype=object)
+    labels, category_codes = np.unique(categories.astype(str), return_inverse=True)
+    n_docs = len(categories)
+    category = np.zeros((n_docs, len(labels)), dtype=np.float32)
+    category[np.arange(n_docs), category_codes.ravel()] = 1.0
+
+    prices = np.array([np.nan if p is None else p for p in price_levels], dtype=np.float64)
+    rating_values = np.array([np.nan if r is None else r for r in ratings], dtype=np.float64)
+    blocks = [
+        (category, CATEGORY_WEIGHT),
+        (soft_one_hot(prices, PRICE_LEVELS), PRICE_WEIGHT),
+        (soft_one_hot((rating_values - 1.0) * 2.0, RATING_BUCKETS), RATING_WEIGHT),
+        (review_tfidf(n_docs, reviews), REVIEW_WEIGHT),
+    ]
+    vectors = np.hstack([normalize_rows(block) * np.float32(weight) for block, weight in blocks])
+    return normalize_rows(vectors).astype(np.float32)
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over a sample of the (unit-length) vectors; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(IVF_TRAINING_SAMPLE, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(IVF_TRAINING_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        # Clusters that lost all their members keep their previous centroid
+        filled = np.bincount(assignment, minlength=n_lists) > 0
+        centroids[filled] = normalize_rows(sums[filled])
+    return centroids
+
+
+class ContentIndex:
+    """
+    Approximate cosine nearest-neighbour index over place content vectors.
+
+    An inverted-file index: places are partitioned among about sqrt(n)
+    k-means centroids, stored CSR-style as positions sorted by cluster plus
+    offsets. A query scores the centroids, then scores exactly only the
+    places in the `IVF_PROBES` nearest clusters, so a lookup touches
+    O(sqrt(n)) places instead of the whole catalogue.
+    """
+
+    def __init__(self, place_ids: np.ndarray, vectors: np.ndarray, centroids: np.ndarray):
+        self.place_ids = place_ids
+        self.place_index: Dict[Any, int] = {place_id: i for i, place_id in enumerate(place_ids.tolist())}
+        self.vectors = vectors
+        self.centroids = centroids
+        assignment = self._assign(vectors)
+        self.order = np.argsort(assignment, kind="stable").astype(np.int32)
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def build(cls, place_ids: Sequence[Any], vectors: np.ndarray, seed: int = 0) -> "ContentIndex":
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        return cls(np.asarray(place_ids), vectors, train_centroids(vectors, n_lists, seed))
+
+    def _assign(self, vectors: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Returns the nearest centroid of each vector."""
+        return np.concatenate([
+            np.argmax(vectors[start:start + block_size] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), block_size)
+        ] or [np.array([], dtype=np.int64)])
+
+    def candidates(self, vector: np.ndarray, probes: int = IVF_PROBES) -> np.ndarray:
+        """Positions of the places in the `probes` clusters nearest to `vector`."""
+        scores = self.centroids @ vector
+        if len(scores) > probes:
+            lists = np.argpartition(-scores, probes - 1)[:probes]
+        else:
+            lists = np.arange(len(scores))
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists.tolist()])
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude: Optional[int] = None,
+              allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the places most similar to `vector`.
+
+        Args:
+            exclude: A position to leave out (the query place itself).
+            allowed: Boolean mask over positions; other places are never returned.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Positions best first, and their cosine similarities.
+        """
+        candidates = self.candidates(vector)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if len(candidates) < k:
+            # Rare without a restrictive filter: scan every allowed place so results are never short
+            candidates = np.arange(len(self.place_ids)) if allowed is None else np.flatnonzero(allowed)
+            if exclude is not None:
+                candidates = candidates[candidates != exclude]
+        scores = self.vectors[candidates] @ vector
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
+
+    def similar(self, place_id: Any, k: int = 10,
+                allowed: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Places most similar to a catalogued place, or None if the place is unknown."""
+        position = self.place_index.get(place_id)
+        if position is None:
+            return None
+        positions, scores = self.query(self.vectors[position], k, exclude=position, allowed=allowed)
+        return self.place_ids[positions], scores
+
+    def save(self, path: str) -> None:
+        """Writes the index to a .npz file; the cluster lists are recomputed on load."""
+        np.savez(path, place_ids=self.place_ids, vectors=self.vectors, centroids=self.centroids)
+
+    @classmethod
+    def load(cls, path: str) -> "ContentIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["place_ids"], data["vectors"], data["centroids"])
@@ -1,6 +1,22 @@
-import json
+import argparse
 import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import Pool
+
+from opening_hours import compile_periods
+
+# orjson is optional; when installed it is used to parse lines several times faster.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def get_unique_types(jsonl_file):
     """
@@ -22,6 +38,29 @@ def get_unique_types(jsonl_file):
     
     return sorted(list(unique_types))
 
+# Keyword sets checked in priority order by categorize_types
+CATEGORY_KEYWORDS = [
+    # Priority 1: Food and Beverage
+    ('Food and Beverage', frozenset(['bakery', 'bar', 'cafe', 'food', 'liquor_store', 'meal_delivery', 'meal_takeaway',
+                                     'night_club', 'restaurant'])),
+    # Priority 2: Place of Worship
+    ('Place of Worship', frozenset(['cemetery', 'church', 'hindu_temple', 'mosque', 'place_of_worship'])),
+    # Priority 3: Stays and Accommodations
+    ('Stays & Accommodations', frozenset(['lodging', 'hotel', 'motel', 'hostel', 'resort', 'accommodation',
+                                          'campground', 'rv_park'])),
+    # Priority 4: Attractions, Activities
+    ('Attractions & Activities', frozenset(['amusement_park', 'aquarium', 'art_gallery', 'library', 'movie_theater',
+                                            'museum', 'natural_feature', 'park', 'tourist_attraction', 'zoo',
+                                            'landmark'])),
+    # Priority 5: Shopping
+    ('Shopping', frozenset(['bicycle_store', 'book_store', 'clothing_store', 'convenience_store', 'department_store',
+                            'electronics_store', 'florist', 'furniture_store', 'grocery_or_supermarket',
+                            'home_goods_store', 'jewelry_store', 'shoe_store', 'shopping_mall', 'store',
+                            'supermarket'])),
+    # Priority 6: Sports & Wellness
+    ('Sports & Wellness', frozenset(['beauty_salon', 'spa', 'gym', 'health', 'bowling_alley', 'stadium'])),
+]
+
 def categorize_types(types_list):
     """
     Categorizes a list of types into a single, broader category
@@ -30,93 +69,131 @@ def categorize_types(types_list):
     if not isinstance(types_list, list):
         return 'Others'
 
-    types_list_lower = [t.lower() for t in types_list]
+    types_list_lower = {t.lower() for t in types_list}
+    for category, keywords in CATEGORY_KEYWORDS:
+        if not keywords.isdisjoint(types_list_lower):
+            return category
 
-    # Priority 1: Food and Beverage
-    food_keywords = ['bakery', 'bar', 'cafe', 'food', 'liquor_store', 'meal_delivery', 'meal_takeaway', 'night_club', 'restaurant']
-    if any(keyword in types_list_lower for keyword in food_keywords):
-        return 'Food and Beverage'
-    
-    # Priority 2: Place of Worship
-    worship_keywords = ['cemetery', 'church', 'hindu_temple', 'mosque', 'place_of_worship']
-    if any(keyword in types_list_lower for keyword in worship_keywords):
-        return 'Place of Worship'
+    # Default category
+    return 'Others'
 
-    # Priority 3: Stays and Accommodations
-    stays_keywords = ['lodging', 'hotel', 'motel', 'hostel', 'resort', 'accommodation', 'campground', 'rv_park']
-    if any(keyword in types_list_lower for keyword in stays_keywords):
-        return 'Stays & Accommodations'
+# Filter out entries based on formatted_address and international_phone_number
+EXCLUDED_COUNTRIES = (', Indonesia', ', Malaysia', ', Australia', ', India', ', Philippines', ', Vietnam', ', New Zealand', ', Thailand')
 
-    # Priority 4: Attractions, Activities
-    attractions_keywords = ['amusement_park', 'aquarium', 'art_gallery', 'library', 'movie_theater', 'museum',
-                            'natural_feature', 'park', 'tourist_attraction', 'zoo', 'landmark']
-    if any(keyword in types_list_lower for keyword in attractions_keywords):
-        return 'Attractions & Activities'
-    
-    # Priority 5: Shopping
-    shopping_keywords = ['bicycle_store', 'book_store', 'clothing_store', 'convenience_store', 'department_store',
-                         'electronics_store', 'florist', 'furniture_store', 'grocery_or_supermarket', 'home_goods_store',
-                         'jewelry_store', 'shoe_store', 'shopping_mall', 'store', 'supermarket']
-    if any(keyword in types_list_lower for keyword in shopping_keywords):
-        return 'Shopping'
-    
-    # Priority 6: Sports & Wellness
-    sports_wellness_keywords = ['beauty_salon', 'spa', 'gym', 'health', 'bowling_alley', 'stadium']
-    if any(keyword in types_list_lower for keyword in sports_wellness_keywords):
-        return 'Sports & Wellness'
+# Number of photo columns written per place
+MAX_PHOTOS = 10
 
-    # Default category
-    return 'Others'
+# Input bytes handed to a worker at a time in parallel mode
+CHUNK_BYTES = 8 * 1024 * 1024
+
+DEFAULT_JSONL_FILE = 'static/data/singapore_data.jsonl'
+DEFAULT_CSV_FILE = 'singapore_data_with_category.csv'
+
+class ConversionError(ValueError):
+    """Raised when a line of the input cannot be decoded."""
 
-def convert_jsonl_to_csv(jsonl_file, csv_file):
+def is_singapore_place(item):
     """
-    Converts a JSONL file to a CSV file, adds a 'Category' column, and filters for Singapore locations.
+    Returns True if a scraped place looks like it is in Singapore, judging by
+    its address and phone number.
     """
-    try:
-        with open(jsonl_file, 'r', encoding='utf-8') as infile:
-            data = [json.loads(line) for line in infile]
-    except FileNotFoundError:
-        print(f"Error: The file '{jsonl_file}' was not found.")
-        return
-    except json.JSONDecodeError:
-        print(f"Error: There was an issue decoding the JSON in '{jsonl_file}'.")
-        return
+    # Check if address contains an excluded country
+    address_is_ok = not item.get('formatted_address', '').endswith(EXCLUDED_COUNTRIES)
 
-    # Filter out entries based on formatted_address and international_phone_number
-    excluded_countries = [', Indonesia', ', Malaysia', ', Australia', ', India', ', Philippines', ', Vietnam', ', New Zealand', ', Thailand']
-    
-    filtered_data = []
-    for item in data:
-        # Check if address contains an excluded country
-        address_is_ok = not any(item.get('formatted_address', '').endswith(country) for country in excluded_countries)
-        
-        # Check if phone number is a Singapore number or is empty/null
-        phone_is_ok = item.get('international_phone_number') is None or \
-                      item.get('international_phone_number') == '' or \
-                      item.get('international_phone_number', '').startswith('+65')
-        
-        if address_is_ok and phone_is_ok:
-            filtered_data.append(item)
-    
-    print(f"Original data entries: {len(data)}")
-    print(f"Filtered data entries: {len(filtered_data)}")
+    # Check if phone number is a Singapore number or is empty/null
+    phone = item.get('international_phone_number')
+    phone_is_ok = phone is None or phone == '' or phone.startswith('+65')
 
-    # Add the new 'Category' field to each item in the filtered data
-    for item in filtered_data:
-        item['category'] = categorize_types(item.get('types', []))
+    return address_is_ok and phone_is_ok
+
+def parse_line(line):
+    """Parses one JSONL line, with orjson if it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # Fall through: the standard parser also accepts NaN/Infinity literals
+            pass
+    return json.loads(line)
+
+def iter_lines(jsonl_file, start=0, end=None):
+    """
+    Yields (byte_offset, line) for every non-blank line that lies wholly
+    within [start, end) of the file. `start` must be the beginning of a line;
+    a line still being appended past `end` is left for a later read.
+    """
+    with open(jsonl_file, 'rb') as infile:
+        infile.seek(start)
+        offset = start
+        for line in infile:
+            if end is not None and offset + len(line) > end:
+                break
+            if line.strip():
+                yield offset, line
+            offset += len(line)
+
+def iter_items(jsonl_file, start=0, end=None):
+    """Yields the parsed places in [start, end) of the file, raising ConversionError on bad JSON."""
+    for offset, line in iter_lines(jsonl_file, start, end):
+        try:
+            yield parse_line(line)
+        except json.JSONDecodeError:
+            raise ConversionError(
+                f"There was an issue decoding the JSON in '{jsonl_file}' at byte {offset}."
+            ) from None
 
-    # Determine all headers for the CSV file
+def iter_refreshed_items(jsonl_file, start=0, end=None, updates_file=None):
+    """
+    Like `iter_items`, with the latest fields re-fetched by `Maps_scraper.py
+    --refresh` applied over each place from `updates_file`, if given (see
+    place_refresh.py).
+    """
+    items = iter_items(jsonl_file, start, end)
+    if updates_file is None:
+        return items
+    # place_refresh imports this module, so it is imported here rather than at the top
+    from place_refresh import apply_updates
+    return apply_updates(items, updates_file)
+
+def find_chunks(jsonl_file, chunk_bytes=CHUNK_BYTES, start=0, end=None):
+    """
+    Splits a file (or the byte range [start, end) of it) into (start, end)
+    ranges of about `chunk_bytes` each, with every boundary moved forward to
+    the start of the next line. `start` must be the beginning of a line.
+    """
+    size = os.path.getsize(jsonl_file) if end is None else end
+    chunks = []
+    with open(jsonl_file, 'rb') as infile:
+        while start < size:
+            infile.seek(min(start + chunk_bytes, size))
+            infile.readline()
+            end = min(infile.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+def count_max_reviews(jsonl_file, start=0, end=None, updates_file=None):
+    """
+    Pre-scans a JSONL file (or a byte range of it) for the largest number of
+    reviews on any one Singapore place, holding only one line in memory at a
+    time. Places the conversion filters out do not widen the CSV. Refreshed
+    reviews from `updates_file` count in place of the scraped ones.
+    """
     max_reviews = 0
-    max_photos = 10
-    
-    for item in filtered_data:
-        if 'reviews' in item and isinstance(item['reviews'], list):
-            max_reviews = max(max_reviews, len(item['reviews']))
+    for item in iter_refreshed_items(jsonl_file, start, end, updates_file):
+        if not is_singapore_place(item):
+            continue
+        reviews = item.get('reviews')
+        if isinstance(reviews, list):
+            max_reviews = max(max_reviews, len(reviews))
+    return max_reviews
 
+def build_headers(max_reviews, max_photos=MAX_PHOTOS):
+    """Returns the ordered CSV header list for the given number of review and photo columns."""
     # Manually build the ordered header list
     ordered_headers = [
         'formatted_address', 'international_phone_number', 'latitude', 'longitude', 'name', 
-        'opening_hours', 'place_id', 'price_level', 'rating', 'types', 'category', 'url', 
+        'opening_hours', 'open_intervals', 'place_id', 'price_level', 'rating', 'types', 'category', 'url', 
         'user_ratings_total', 'vicinity', 'viewport_northeast_lat', 'viewport_northeast_lng', 
         'viewport_southwest_lat', 'viewport_southwest_lng', 'website'
     ]
@@ -131,67 +208,704 @@ def convert_jsonl_to_csv(jsonl_file, csv_file):
     # Add photo headers dynamically
     for i in range(max_photos):
         ordered_headers.append(f'photo_{i+1}_local_path')
-    
-    with open(csv_file, 'w', newline='', encoding='utf-8') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=ordered_headers)
-        writer.writeheader()
-        
-        for item in filtered_data:
-            row = {}
-            # Populate row with data from item based on the ordered_headers
-            for key in ordered_headers:
-                # Handle top-level keys
-                if key in item:
-                    row[key] = item[key]
-                # Handle nested 'geometry' keys
-                elif key == 'latitude' and 'geometry' in item and 'location' in item['geometry']:
-                    row[key] = item['geometry']['location'].get('lat')
-                elif key == 'longitude' and 'geometry' in item and 'location' in item['geometry']:
-                    row[key] = item['geometry']['location'].get('lng')
-                elif key == 'viewport_northeast_lat' and 'geometry' in item and 'viewport' in item['geometry']:
-                    row[key] = item['geometry']['viewport'].get('northeast', {}).get('lat')
-                elif key == 'viewport_northeast_lng' and 'geometry' in item and 'viewport' in item['geometry']:
-                    row[key] = item['geometry']['viewport'].get('northeast', {}).get('lng')
-                elif key == 'viewport_southwest_lat' and 'geometry' in item and 'viewport' in item['geometry']:
-                    row[key] = item['geometry']['viewport'].get('southwest', {}).get('lat')
-                elif key == 'viewport_southwest_lng' and 'geometry' in item and 'viewport' in item['geometry']:
-                    row[key] = item['geometry']['viewport'].get('southwest', {}).get('lng')
-                # Handle nested 'reviews' keys
-                elif key.startswith('review_') and 'reviews' in item and isinstance(item['reviews'], list):
-                    review_index = int(key.split('_')[1]) - 1
-                    if review_index < len(item['reviews']):
-                        review = item['reviews'][review_index]
-                        sub_key = key.split('_', 2)[-1]
-                        if sub_key == 'exact_date' and 'time' in review:
-                            row[key] = datetime.fromtimestamp(review['time']).strftime('%Y-%m-%d %H:%M:%S')
-                        elif sub_key == 'relative_time':
-                            row[key] = review.get('relative_time_description')
-                        else:
-                            row[key] = review.get(sub_key)
-                # Handle nested 'local_image_paths' keys
-                elif key.startswith('photo_') and 'local_image_paths' in item and isinstance(item['local_image_paths'], list):
-                    photo_index = int(key.split('_')[1]) - 1
-                    if photo_index < len(item['local_image_paths']):
-                        row[key] = item['local_image_paths'][photo_index]
-            
-            writer.writerow(row)
 
+    return ordered_headers
+
+def format_review_time(review):
+    """Formats a review's 'time' (epoch seconds) as a local date, as the CSV's exact_date column."""
+    if 'time' in review:
+        return datetime.fromtimestamp(review['time']).strftime('%Y-%m-%d %H:%M:%S')
+    return review.get('exact_date')
+
+@lru_cache(maxsize=None)
+def compile_row_extractor(max_reviews, max_photos=MAX_PHOTOS):
+    """
+    Builds a function that flattens one place into a CSV row (a list in
+    `build_headers(max_reviews, max_photos)` order).
+
+    The header layout is resolved once here, so each place is handled with
+    direct lookups instead of matching every header name against the item.
+    A value stored on the item under a header's own name always wins over
+    the nested field that header is normally derived from.
+    """
+    headers = build_headers(max_reviews, max_photos)
+    base_headers = headers[:headers.index('website') + 1]
+    geometry_headers = {
+        'latitude': ('location', None, 'lat'),
+        'longitude': ('location', None, 'lng'),
+        'viewport_northeast_lat': ('viewport', 'northeast', 'lat'),
+        'viewport_northeast_lng': ('viewport', 'northeast', 'lng'),
+        'viewport_southwest_lat': ('viewport', 'southwest', 'lat'),
+        'viewport_southwest_lng': ('viewport', 'southwest', 'lng'),
+    }
+    top_level = [(i, key) for i, key in enumerate(base_headers) if key not in geometry_headers]
+    geometry = [(i, key) + geometry_headers[key] for i, key in enumerate(base_headers) if key in geometry_headers]
+    derived = {key: i for i, key in enumerate(headers) if key in geometry_headers or i >= len(base_headers)}
+    derived_keys = frozenset(derived)
+    review_start = len(base_headers)
+    photo_start = review_start + 5 * max_reviews
+    width = len(headers)
+
+    def extract(item):
+        row = [None] * width
+        for i, key in top_level:
+            row[i] = item.get(key)
+
+        geo = item.get('geometry')
+        if geo is not None:
+            for i, key, section, corner, field in geometry:
+                if section in geo:
+                    value = geo[section]
+                    if corner is not None:
+                        value = value.get(corner, {})
+                    row[i] = value.get(field)
+
+        reviews = item.get('reviews')
+        if isinstance(reviews, list):
+            i = review_start
+            for review in reviews[:max_reviews]:
+                row[i] = review.get('author_name')
+                row[i + 1] = review.get('rating')
+                row[i + 2] = format_review_time(review)
+                row[i + 3] = review.get('relative_time_description')
+                row[i + 4] = review.get('text')
+                i += 5
+
+        photos = item.get('local_image_paths')
+        if isinstance(photos, list):
+            for i, path in enumerate(photos[:max_photos], start=photo_start):
+                row[i] = path
+
+        if not derived_keys.isdisjoint(item):
+            for key in derived_keys.intersection(item):
+                row[derived[key]] = item[key]
+        return row
+
+    return extract
+
+@lru_cache(maxsize=None)
+def load_photo_variants(manifest_file, variant):
+    """Returns place_id -> list of `variant` image paths from a photo_store.py manifest."""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ConversionError(f"Could not read the photo manifest '{manifest_file}': {e}") from None
+    photos = manifest['photos']
+    return {place_id: [photos[digest][variant] for digest in digests if digest in photos]
+            for place_id, digests in manifest['places'].items()}
+
+def select_places(items, unique_types, counts, photos=None):
+    """
+    Yields the Singapore places from `items`, each with its 'category' set
+    and its opening hours compiled into 'open_intervals' (see opening_hours.py).
+
+    The types seen are added to `unique_types`, and `counts` (a two-item
+    list) is advanced by the number of places read and kept. `photos`, a
+    (manifest file, variant) pair, swaps each place's downloaded photo paths
+    for that variant from the photo store, where the manifest lists the place.
+    """
+    photo_paths = load_photo_variants(*photos) if photos is not None else None
+    for item in items:
+        counts[0] += 1
+        if isinstance(item.get('types'), list):
+            unique_types.update(item['types'])
+
+        if not is_singapore_place(item):
+            continue
+        counts[1] += 1
+
+        # Add the new 'Category' field to the item
+        item['category'] = categorize_types(item.get('types', []))
+        item['open_intervals'] = compile_periods(item.get('opening_hours'))
+        if photo_paths is not None and item.get('place_id') in photo_paths:
+            item['local_image_paths'] = photo_paths[item['place_id']]
+        yield item
+
+def convert_items(items, writer, max_reviews, unique_types, photos=None):
+    """
+    Filters, categorizes and writes places to a csv.writer.
+
+    Returns:
+        tuple: (number of places read, number written). The types seen are added to `unique_types`.
+    """
+    extract = compile_row_extractor(max_reviews)
+    counts = [0, 0]
+    for item in select_places(items, unique_types, counts, photos):
+        writer.writerow(extract(item))
+    return tuple(counts)
+
+def convert_chunk(task):
+    """Pool worker: converts one byte range and returns its CSV text and counts."""
+    jsonl_file, start, end, max_reviews, photos, updates_file = task
+    buffer = io.StringIO()
+    unique_types = set()
+    counts = convert_items(iter_refreshed_items(jsonl_file, start, end, updates_file), csv.writer(buffer),
+                           max_reviews, unique_types, photos)
+    return buffer.getvalue(), counts, unique_types
+
+def scan_chunk(task):
+    """Pool worker: returns the largest review count in one byte range."""
+    jsonl_file, start, end, updates_file = task
+    return count_max_reviews(jsonl_file, start, end, updates_file)
+
+def scan_range(jsonl_file, start, end, pool=None, updates_file=None):
+    """Returns the largest review count in [start, end) of the file, scanning chunks in `pool` if given."""
+    if pool is None:
+        return count_max_reviews(jsonl_file, start, end, updates_file)
+    chunks = find_chunks(jsonl_file, start=start, end=end)
+    return max(pool.imap(scan_chunk, [(jsonl_file, chunk_start, chunk_end, updates_file)
+                                      for chunk_start, chunk_end in chunks]),
+               default=0)
+
+def convert_range(outfile, jsonl_file, start, end, max_reviews, unique_types, photos=None, pool=None,
+                  updates_file=None):
+    """
+    Writes the CSV rows of the places in [start, end) of the file to
+    `outfile`, in input order, converting chunks in `pool` if given.
+    Refreshed fields from `updates_file`, if given, are applied first.
+
+    Returns:
+        tuple: (number of places read, number written). The types seen are added to `unique_types`.
+    """
+    if pool is None:
+        return convert_items(iter_refreshed_items(jsonl_file, start, end, updates_file), csv.writer(outfile),
+                             max_reviews, unique_types, photos)
+    original_count = 0
+    filtered_count = 0
+    tasks = [(jsonl_file, chunk_start, chunk_end, max_reviews, photos, updates_file)
+             for chunk_start, chunk_end in find_chunks(jsonl_file, start=start, end=end)]
+    for text, (chunk_original, chunk_filtered), chunk_types in pool.imap(convert_chunk, tasks):
+        outfile.write(text)
+        original_count += chunk_original
+        filtered_count += chunk_filtered
+        unique_types.update(chunk_types)
+    return original_count, filtered_count
+
+def convert_jsonl_to_csv(jsonl_file, csv_file, max_reviews=None, workers=1, photos=None, updates_file=None):
+    """
+    Converts a JSONL file to a CSV file, adds a 'Category' column, and filters for Singapore locations.
+
+    The file is streamed: each line is parsed, filtered, categorized and
+    written before the next is read, so memory use does not grow with the
+    input. The number of review columns is `max_reviews` if given (reviews
+    beyond it are left out), otherwise it is found by a pre-scan. Output goes
+    to a temporary file that replaces `csv_file` only once the whole input
+    has converted cleanly.
+
+    With `workers` > 1 the input is split into newline-aligned byte ranges
+    that are converted by a process pool and written back in input order, so
+    the output is identical to a single-process run.
+
+    `photos`, a (manifest file, variant) pair, fills the photo columns with
+    that variant from the photo store (see photo_store.py). `updates_file`,
+    the refresh updates written by `Maps_scraper.py --refresh`, has the
+    latest re-fetched fields of each place applied over its scraped record.
+
+    Only the input present when the conversion starts is converted, and how
+    far that was is recorded next to the output (see `update_jsonl_to_csv`).
+
+    Returns a summary dict with the entry counts and the sorted unique types
+    seen in the input, or None if the conversion failed.
+    """
+    if not os.path.exists(jsonl_file):
+        print(f"Error: The file '{jsonl_file}' was not found.")
+        return None
+
+    unique_types = set()
+    partial_file = csv_file + '.part'
+    end = os.path.getsize(jsonl_file)
+    # Taken before converting, so updates appended meanwhile are applied again by the next update
+    updates_end = updates_length(updates_file)
+    fixed_reviews = max_reviews is not None
+    pool = Pool(workers) if workers > 1 else None
+
+    try:
+        if max_reviews is None:
+            max_reviews = scan_range(jsonl_file, 0, end, pool, updates_file)
+
+        with open(partial_file, 'w', newline='', encoding='utf-8') as outfile:
+            csv.writer(outfile).writerow(build_headers(max_reviews))
+            original_count, filtered_count = convert_range(outfile, jsonl_file, 0, end, max_reviews, unique_types,
+                                                           photos, pool, updates_file)
+        os.replace(partial_file, csv_file)
+    except ConversionError as e:
+        print(f"Error: {e}")
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        return None
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    summary = {
+        'original_entries': original_count,
+        'filtered_entries': filtered_count,
+        'unique_types': sorted(unique_types),
+    }
+    save_conversion_state(csv_file, jsonl_file, end, max_reviews, fixed_reviews, photos, summary,
+                          (updates_file, updates_end))
+    print(f"Original data entries: {original_count}")
+    print(f"Filtered data entries: {filtered_count}")
     print(f"Conversion complete! Data with all original columns has been saved to '{csv_file}'.")
+    return summary
+
+# --- Incremental Conversion ---
+
+# Bump whenever the fixed CSV columns, or how the review columns are counted, change, so outputs in the
+# old layout are rebuilt rather than appended to.
+CSV_SCHEMA_VERSION = 3
+
+# Leading input bytes whose hash is recorded, to tell a replaced input from an appended one
+FINGERPRINT_BYTES = 64 * 1024
+
+def state_path(csv_file):
+    """Returns the path of the conversion state recorded next to `csv_file`."""
+    return csv_file + '.state.json'
+
+def input_fingerprint(jsonl_file, length):
+    """Hashes the first `length` bytes of the input."""
+    with open(jsonl_file, 'rb') as infile:
+        return hashlib.sha1(infile.read(length)).hexdigest()
+
+def complete_length(jsonl_file, start=0):
+    """
+    Returns the offset just past the last newline in the file, or `start` if
+    there is none after it, so a line still being written is not converted.
+    """
+    end = os.path.getsize(jsonl_file)
+    with open(jsonl_file, 'rb') as infile:
+        while end > start:
+            block_start = max(start, end - CHUNK_BYTES)
+            infile.seek(block_start)
+            newline = infile.read(end - block_start).rfind(b'\n')
+            if newline >= 0:
+                return block_start + newline + 1
+            end = block_start
+    return start
+
+def updates_length(updates_file):
+    """The length of the complete lines in a refresh updates file; 0 if there is none."""
+    if updates_file is None or not os.path.exists(updates_file):
+        return 0
+    return complete_length(updates_file)
+
+def load_conversion_state(csv_file):
+    """Returns the state recorded by the last conversion to `csv_file`, or None if there is none."""
+    try:
+        with open(state_path(csv_file), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def save_conversion_state(csv_file, jsonl_file, offset, max_reviews, fixed_reviews, photos, summary,
+                          updates=(None, 0)):
+    """
+    Records how far into `jsonl_file` and into the refresh updates file (an
+    (updates file, offset) pair) the output `csv_file` goes and the layout it
+    was written with, replacing the state file atomically.
+    """
+    updates_file, updates_offset = updates
+    state = {
+        'schema_version': CSV_SCHEMA_VERSION,
+        'max_photos': MAX_PHOTOS,
+        'input_file': os.path.abspath(jsonl_file),
+        'offset': offset,
+        'fingerprint': input_fingerprint(jsonl_file, min(offset, FINGERPRINT_BYTES)),
+        'max_reviews': max_reviews,
+        'fixed_max_reviews': fixed_reviews,
+        'photos': list(photos) if photos is not None else None,
+        'updates_file': os.path.abspath(updates_file) if updates_file is not None else None,
+        'updates_offset': updates_offset,
+        'output_size': os.path.getsize(csv_file),
+        'original_entries': summary['original_entries'],
+        'filtered_entries': summary['filtered_entries'],
+        'unique_types': summary['unique_types'],
+    }
+    partial_file = state_path(csv_file) + '.part'
+    with open(partial_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(partial_file, state_path(csv_file))
+
+def rebuild_reason(state, jsonl_file, csv_file, max_reviews, photos, updates_file=None):
+    """Returns why `csv_file` cannot be appended to, or None if it can."""
+    if state is None:
+        return "there is no record of a previous conversion"
+    if state.get('schema_version') != CSV_SCHEMA_VERSION or state.get('max_photos') != MAX_PHOTOS:
+        return "the CSV columns have changed since it was written"
+    if state.get('photos') != (list(photos) if photos is not None else None):
+        return "the photo settings have changed"
+    if state.get('input_file') != os.path.abspath(jsonl_file):
+        return "it was converted from a different input file"
+    if not os.path.exists(csv_file) or os.path.getsize(csv_file) < state['output_size']:
+        return "it is missing or shorter than when it was written"
+    offset = state['offset']
+    if (os.path.getsize(jsonl_file) < offset
+            or input_fingerprint(jsonl_file, min(offset, FINGERPRINT_BYTES)) != state['fingerprint']):
+        return "the input was replaced or truncated rather than appended to"
+    if max_reviews is not None and max_reviews < state['max_reviews']:
+        return "fewer review columns were asked for"
+    if max_reviews is None and state['fixed_max_reviews']:
+        return "its review columns were capped with --max-reviews"
+    if state.get('updates_file') != (os.path.abspath(updates_file) if updates_file is not None else None):
+        return "it was converted with different refresh updates"
+    # Refreshed places already in the CSV have to be rewritten, which appending cannot do
+    if updates_length(updates_file) != state.get('updates_offset', 0):
+        return "places were refreshed since it was written"
+    return None
+
+def widen_csv(csv_file, outfile, old_reviews, new_reviews):
+    """
+    Copies `csv_file` to `outfile` under the header for `new_reviews` review
+    columns, inserting empty review cells into every row. Rows are copied as
+    text, without going back to the JSONL input.
+    """
+    insert_at = len(build_headers(old_reviews)) - MAX_PHOTOS
+    padding = [''] * (5 * (new_reviews - old_reviews))
+    writer = csv.writer(outfile)
+    writer.writerow(build_headers(new_reviews))
+    with open(csv_file, 'r', newline='', encoding='utf-8') as infile:
+        reader = csv.reader(infile)
+        next(reader, None)
+        for row in reader:
+            writer.writerow(row[:insert_at] + padding + row[insert_at:])
+
+def update_jsonl_to_csv(jsonl_file, csv_file, max_reviews=None, workers=1, photos=None, updates_file=None):
+    """
+    Brings a CSV written by `convert_jsonl_to_csv` up to date with its
+    append-only JSONL input, converting only the lines added since.
+
+    The previous run's byte offset into the input is read from the state
+    file next to the CSV, and complete lines past it are converted and
+    appended. The CSV is only rewritten when the new places have more reviews
+    than there are review columns: existing rows are then copied under the
+    wider header with empty review cells, which is much cheaper than
+    re-converting them. Rows left by an interrupted append are truncated
+    away. If the output cannot safely be appended to (no state, a changed
+    layout or input, or places refreshed into `updates_file` since, see
+    `rebuild_reason`), this falls back to a full `convert_jsonl_to_csv`.
+
+    Arguments are as for `convert_jsonl_to_csv`. Returns a summary dict like
+    it, with counts and types covering the whole input, or None if the
+    conversion failed.
+    """
+    if not os.path.exists(jsonl_file):
+        print(f"Error: The file '{jsonl_file}' was not found.")
+        return None
+
+    state = load_conversion_state(csv_file)
+    reason = rebuild_reason(state, jsonl_file, csv_file, max_reviews, photos, updates_file)
+    if reason is not None:
+        print(f"Converting '{jsonl_file}' in full: {reason}.")
+        return convert_jsonl_to_csv(jsonl_file, csv_file, max_reviews=max_reviews, workers=workers, photos=photos,
+                                    updates_file=updates_file)
+
+    output_size = state['output_size']
+    if os.path.getsize(csv_file) > output_size:
+        # Rows written by an append that did not finish; their input lines are converted again below
+        os.truncate(csv_file, output_size)
+
+    start = state['offset']
+    end = complete_length(jsonl_file, start)
+    unique_types = set(state['unique_types'])
+    if end == start:
+        print(f"No new places since the last conversion; '{csv_file}' is up to date.")
+        return {key: state[key] for key in ('original_entries', 'filtered_entries', 'unique_types')}
+
+    old_reviews = state['max_reviews']
+    partial_file = csv_file + '.part'
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        if max_reviews is not None:
+            new_reviews = max_reviews
+        else:
+            new_reviews = max(old_reviews, scan_range(jsonl_file, start, end, pool, updates_file))
+        if new_reviews > old_reviews:
+            with open(partial_file, 'w', newline='', encoding='utf-8') as outfile:
+                widen_csv(csv_file, outfile, old_reviews, new_reviews)
+                original_count, filtered_count = convert_range(outfile, jsonl_file, start, end, new_reviews,
+                                                               unique_types, photos, pool, updates_file)
+            os.replace(partial_file, csv_file)
+            print(f"Widened '{csv_file}' from {old_reviews} to {new_reviews} review columns.")
+        else:
+            with open(csv_file, 'a', newline='', encoding='utf-8') as outfile:
+                original_count, filtered_count = convert_range(outfile, jsonl_file, start, end, old_reviews,
+                                                               unique_types, photos, pool, updates_file)
+    except ConversionError as e:
+        print(f"Error: {e}")
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        os.truncate(csv_file, output_size)
+        return None
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    summary = {
+        'original_entries': state['original_entries'] + original_count,
+        'filtered_entries': state['filtered_entries'] + filtered_count,
+        'unique_types': sorted(unique_types),
+    }
+    save_conversion_state(csv_file, jsonl_file, end, new_reviews, max_reviews is not None, photos, summary,
+                          (updates_file, state.get('updates_offset', 0)))
+    print(f"New data entries: {original_count}")
+    print(f"Appended entries: {filtered_count} (of {summary['filtered_entries']} in total)")
+    print(f"Conversion complete! '{csv_file}' is up to date.")
+    return summary
+
+# --- Columnar Output ---
+
+# Places written per record batch / row group in single-process columnar mode
+COLUMNAR_BATCH_ROWS = 10000
+
+COLUMNAR_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def columnar_schemas():
+    """
+    Returns the (places, reviews) Arrow schemas.
+
+    Coordinates, ratings and counts are numeric, `types` and photo paths are
+    string lists, and `opening_hours` is stored as JSON text since its shape
+    varies between places. Reviews get their own table keyed by place_id and
+    position, instead of review_N_* columns.
+    """
+    import pyarrow as pa
+
+    places = pa.schema([
+        ('place_id', pa.string()),
+        ('name', pa.string()),
+        ('formatted_address', pa.string()),
+        ('international_phone_number', pa.string()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('opening_hours', pa.string()),
+        ('open_intervals', pa.string()),
+        ('price_level', pa.float64()),
+        ('rating', pa.float64()),
+        ('types', pa.list_(pa.string())),
+        ('category', pa.string()),
+        ('url', pa.string()),
+        ('user_ratings_total', pa.int64()),
+        ('vicinity', pa.string()),
+        ('viewport_northeast_lat', pa.float64()),
+        ('viewport_northeast_lng', pa.float64()),
+        ('viewport_southwest_lat', pa.float64()),
+        ('viewport_southwest_lng', pa.float64()),
+        ('website', pa.string()),
+        ('photo_paths', pa.list_(pa.string())),
+    ])
+    reviews = pa.schema([
+        ('place_id', pa.string()),
+        ('position', pa.int16()),
+        ('author_name', pa.string()),
+        ('rating', pa.float64()),
+        ('publish_time', pa.timestamp('s', tz='UTC')),
+        ('relative_time', pa.string()),
+        ('text', pa.string()),
+    ])
+    return places, reviews
+
+def to_json(value):
+    """Serializes a nested field as JSON text, leaving missing values as null."""
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+def build_tables(places):
+    """Builds a (places, reviews) pair of Arrow tables from a batch of categorized places."""
+    import pyarrow as pa
+
+    places_schema, reviews_schema = columnar_schemas()
+    extract = compile_row_extractor(0, 0)
+    headers = build_headers(0, 0)
+    columns = {name: [] for name in places_schema.names}
+    reviews = {name: [] for name in reviews_schema.names}
+
+    for item in places:
+        row = dict(zip(headers, extract(item)))
+        for name in places_schema.names:
+            if name not in ('opening_hours', 'types', 'photo_paths'):
+                columns[name].append(row.get(name))
+        columns['opening_hours'].append(to_json(item.get('opening_hours')))
+        types = item.get('types')
+        columns['types'].append(types if isinstance(types, list) else None)
+        photos = item.get('local_image_paths')
+        columns['photo_paths'].append(photos if isinstance(photos, list) else None)
+
+        item_reviews = item.get('reviews')
+        if isinstance(item_reviews, list):
+            for position, review in enumerate(item_reviews, start=1):
+                reviews['place_id'].append(item.get('place_id'))
+                reviews['position'].append(position)
+                reviews['author_name'].append(review.get('author_name'))
+                reviews['rating'].append(review.get('rating'))
+                reviews['publish_time'].append(review.get('time'))
+                reviews['relative_time'].append(review.get('relative_time_description'))
+                reviews['text'].append(review.get('text'))
+
+    return (pa.Table.from_pydict(columns, schema=places_schema),
+            pa.Table.from_pydict(reviews, schema=reviews_schema))
+
+def convert_chunk_columnar(task):
+    """Pool worker: converts one byte range into (places, reviews) Arrow tables and counts."""
+    jsonl_file, start, end, photos, updates_file = task
+    unique_types = set()
+    counts = [0, 0]
+    places, reviews = build_tables(select_places(iter_refreshed_items(jsonl_file, start, end, updates_file),
+                                                 unique_types, counts, photos))
+    return places, reviews, tuple(counts), unique_types
+
+def reviews_path(output_file):
+    """Returns the path of the reviews table written alongside `output_file`."""
+    stem, extension = os.path.splitext(output_file)
+    return f"{stem}_reviews{extension}"
+
+class TableWriter:
+    """Streams record batches into one Parquet or Arrow IPC file."""
+
+    def __init__(self, path, schema, fmt):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(path, schema)
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema)
+        self._fmt = fmt
+
+    def write(self, table):
+        if table.num_rows:
+            self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+        if self._fmt != 'parquet':
+            self._sink.close()
+
+def convert_jsonl_to_columnar(jsonl_file, output_file, fmt='parquet', workers=1, photos=None, updates_file=None):
+    """
+    Converts a JSONL file to typed columnar files, filtering for Singapore locations.
+
+    Places go to `output_file` and their reviews to a second file next to it
+    (see `reviews_path`), both as Parquet or Arrow IPC (`fmt`). Input is
+    streamed in batches, or converted chunk by chunk in a process pool when
+    `workers` > 1, with batches written in input order either way. `photos`
+    and `updates_file` are as for `convert_jsonl_to_csv`. Requires pyarrow.
+
+    Returns a summary dict like `convert_jsonl_to_csv`, or None if the conversion failed.
+    """
+    if importlib.util.find_spec('pyarrow') is None:
+        print("Error: Parquet/Arrow output needs pyarrow (pip install pyarrow).")
+        return None
+    if not os.path.exists(jsonl_file):
+        print(f"Error: The file '{jsonl_file}' was not found.")
+        return None
+
+    places_schema, reviews_schema = columnar_schemas()
+    review_file = reviews_path(output_file)
+    partial_files = [output_file + '.part', review_file + '.part']
+    unique_types = set()
+    counts = [0, 0]
+    review_count = 0
+    pool = Pool(workers) if workers > 1 else None
+    places_writer = TableWriter(partial_files[0], places_schema, fmt)
+    reviews_writer = TableWriter(partial_files[1], reviews_schema, fmt)
+
+    try:
+        if pool is not None:
+            tasks = [(jsonl_file, start, end, photos, updates_file) for start, end in find_chunks(jsonl_file)]
+            for places, reviews, (chunk_original, chunk_filtered), chunk_types in pool.imap(
+                    convert_chunk_columnar, tasks):
+                places_writer.write(places)
+                reviews_writer.write(reviews)
+                review_count += reviews.num_rows
+                counts[0] += chunk_original
+                counts[1] += chunk_filtered
+                unique_types.update(chunk_types)
+        else:
+            selected = select_places(iter_refreshed_items(jsonl_file, updates_file=updates_file), unique_types,
+                                     counts, photos)
+            while True:
+                batch = list(islice(selected, COLUMNAR_BATCH_ROWS))
+                if not batch:
+                    break
+                places, reviews = build_tables(batch)
+                places_writer.write(places)
+                reviews_writer.write(reviews)
+                review_count += reviews.num_rows
+        places_writer.close()
+        reviews_writer.close()
+        os.replace(partial_files[0], output_file)
+        os.replace(partial_files[1], review_file)
+    except ConversionError as e:
+        print(f"Error: {e}")
+        places_writer.close()
+        reviews_writer.close()
+        for path in partial_files:
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"Original data entries: {counts[0]}")
+    print(f"Filtered data entries: {counts[1]}")
+    print(f"Conversion complete! Places saved to '{output_file}' and {review_count} reviews to '{review_file}'.")
+    return {
+        'original_entries': counts[0],
+        'filtered_entries': counts[1],
+        'reviews': review_count,
+        'reviews_file': review_file,
+        'unique_types': sorted(unique_types),
+    }
 
 if __name__ == "__main__":
-    jsonl_file_path = 'static/data/singapore_data.jsonl'
-    output_csv_path = 'singapore_data_with_category.csv'
-
-    # Step 1: Find and list all unique types
-    print("Finding all unique categories in the raw data...")
-    all_unique_types = get_unique_types(jsonl_file_path)
-    print(f"Total unique categories found: {len(all_unique_types)}")
-    print("---")
-    print("List of Unique Categories:")
-    for i, t in enumerate(all_unique_types):
-        print(f"  {i+1}. {t}")
-    print("---")
-
-    # Step 2: Convert and categorize
-    print("Starting CSV conversion and categorization...")
-    convert_jsonl_to_csv(jsonl_file_path, output_csv_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert the scraped JSONL places into a categorized CSV.")
+    parser.add_argument('jsonl_file', nargs='?', default=DEFAULT_JSONL_FILE)
+    parser.add_argument('output_file', nargs='?', default=None,
+                        help="Defaults to singapore_data_with_category.csv, or singapore_data.parquet/.arrow.")
+    parser.add_argument('--format', choices=['csv'] + list(COLUMNAR_FORMATS), default='csv',
+                        help="Write a CSV, or typed Parquet/Arrow files with reviews in a separate table.")
+    parser.add_argument('--max-reviews', type=int, default=None,
+                        help="Fix the number of review columns instead of pre-scanning the input for it.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes to convert with; 0 uses every CPU core.")
+    parser.add_argument('--full', action='store_true',
+                        help="Convert the whole input again instead of appending what was added since the last run.")
+    parser.add_argument('--photo-manifest', default=None,
+                        help="Photo store manifest from photo_store.py; photo paths then point at resized variants.")
+    parser.add_argument('--photo-variant', choices=['thumb', 'card', 'full'], default='card',
+                        help="Which variant the photo paths point at with --photo-manifest.")
+    parser.add_argument('--updates', metavar='PATH', default=None,
+                        help="Refreshed fields to apply (default: <jsonl_file stem>_updates.jsonl, if it exists).")
+    args = parser.parse_args()
+
+    # Convert and categorize in one pass, collecting the unique types as we go
+    workers = args.workers or os.cpu_count() or 1
+    photos = (args.photo_manifest, args.photo_variant) if args.photo_manifest else None
+    from place_refresh import updates_path
+    updates_file = args.updates or updates_path(args.jsonl_file)
+    if args.updates and not os.path.exists(updates_file):
+        raise SystemExit(f"Error: The file '{updates_file}' was not found.")
+    if args.format == 'csv':
+        print("Starting CSV conversion and categorization...")
+        output_file = args.output_file or DEFAULT_CSV_FILE
+        convert = convert_jsonl_to_csv if args.full else update_jsonl_to_csv
+        summary = convert(args.jsonl_file, output_file, max_reviews=args.max_reviews, workers=workers, photos=photos,
+                          updates_file=updates_file)
+    else:
+        print(f"Starting {args.format} conversion and categorization...")
+        output_file = args.output_file or 'singapore_data' + COLUMNAR_FORMATS[args.format]
+        summary = convert_jsonl_to_columnar(args.jsonl_file, output_file, fmt=args.format, workers=workers,
+                                             photos=photos, updates_file=updates_file)
+    if summary is not None:
+        all_unique_types = summary['unique_types']
+        print("---")
+        print(f"Total unique categories found: {len(all_unique_types)}")
+        print("List of Unique Categories:")
+        for i, t in enumerate(all_unique_types):
+            print(f"  {i+1}. {t}")
+        print("---")
@@ -0,0 +1,366 @@
+"""
+Loads the scraped places JSONL straight into the business_info and review tables.
+
+    python load_places.py static/data/singapore_data.jsonl
+    python load_places.py places.jsonl --sqlite places.db --create-tables
+
+Places are filtered and categorized exactly as jsonl_to_csv.py does. A hash
+of each place's rows is kept in a state table, so a reload only rewrites the
+places whose data changed and running the same load twice is a no-op. The
+fields re-fetched by `Maps_scraper.py --refresh` are read from the updates
+file next to the JSONL and applied over each place's scraped record.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import pymysql
+
+from jsonl_to_csv import ConversionError, find_chunks, format_review_time, iter_items, select_places
+from place_refresh import apply_updates, updates_path
+from sqlite_standin import SQLiteConnection
+
+# --- Database Configuration ---
+# Same environment variables as prediction.py.
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_NAME = os.getenv("DB_NAME", "tourism_app")
+
+BUSINESS_TABLE = "business_info"
+REVIEW_TABLE = "review"
+# One row per loaded place: place_id and a hash of the rows written for it.
+STATE_TABLE = "business_info_load_state"
+# Characters of place_id indexed in MySQL. Google place IDs are around 27 characters, so the
+# prefix still tells places apart.
+PLACE_ID_INDEX_PREFIX = 64
+# Places written per transaction.
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "2000"))
+
+BUSINESS_COLUMNS = ['place_id', 'place_name', 'address', 'rating', 'price_level', 'international_phone_number',
+                    'latitude', 'longitude', 'opening_hours', 'open_intervals', 'website', 'category']
+REVIEW_COLUMNS = ['place_id', 'place_name', 'address', 'rating', 'review_text', 'publish_time', 'author_name']
+
+
+def get_connection():
+    """Opens a new connection to the application database."""
+    return pymysql.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+
+def create_tables(conn):
+    """Creates business_info and review as described in database.txt, if they do not exist."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {BUSINESS_TABLE} (place_id TEXT, place_name TEXT, address TEXT, "
+            "rating DOUBLE, price_level DOUBLE, international_phone_number TEXT, latitude DOUBLE, "
+            "longitude DOUBLE, opening_hours TEXT, open_intervals TEXT, website TEXT, category TEXT)"
+        )
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {REVIEW_TABLE} ({review_table_columns(conn)})")
+    conn.commit()
+
+def review_table_columns(conn):
+    """
+    The review table's column definitions. review_id numbers reviews in
+    insertion order, so prediction.py can index just the reviews written
+    since its last refresh. scraped marks the reviews written by this loader;
+    reviews users add on the website keep the default 0 and survive reloads.
+    """
+    # In SQLite an INTEGER PRIMARY KEY is the rowid, assigned on insert
+    review_id = ("review_id INTEGER PRIMARY KEY" if isinstance(conn, SQLiteConnection)
+                 else "review_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY")
+    return (f"{review_id}, place_id TEXT, place_name TEXT, address TEXT, rating BIGINT, review_text TEXT, "
+            "publish_time TEXT, author_name TEXT, scraped TINYINT NOT NULL DEFAULT 0")
+
+def add_open_intervals_column(conn):
+    """Adds open_intervals to a business_info created before the column existed."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT open_intervals FROM {BUSINESS_TABLE} LIMIT 0")
+            cursor.fetchall()
+        return
+    except Exception:  # pymysql and sqlite3 raise unrelated errors for an unknown column
+        conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {BUSINESS_TABLE} ADD COLUMN open_intervals TEXT")
+    conn.commit()
+
+def add_review_id_column(conn):
+    """Adds review_id to a review table created before the column existed, numbering existing rows."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT review_id FROM {REVIEW_TABLE} LIMIT 0")
+            cursor.fetchall()
+        return
+    except Exception:  # pymysql and sqlite3 raise unrelated errors for an unknown column
+        conn.rollback()
+    with conn.cursor() as cursor:
+        if isinstance(conn, SQLiteConnection):
+            # SQLite cannot add a primary key column, so the table is copied
+            columns = ', '.join(REVIEW_COLUMNS + ['scraped'])
+            cursor.execute(f"ALTER TABLE {REVIEW_TABLE} RENAME TO {REVIEW_TABLE}_old")
+            cursor.execute(f"CREATE TABLE {REVIEW_TABLE} ({review_table_columns(conn)})")
+            cursor.execute(f"INSERT INTO {REVIEW_TABLE} ({columns}) SELECT {columns} FROM {REVIEW_TABLE}_old "
+                           "ORDER BY rowid")
+            cursor.execute(f"DROP TABLE {REVIEW_TABLE}_old")
+        else:
+            cursor.execute(f"ALTER TABLE {REVIEW_TABLE} ADD COLUMN "
+                           "review_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST")
+    conn.commit()
+
+def add_scraped_column(conn):
+    """
+    Adds scraped to a review table created before the column existed. The
+    reviews of places already in the load state table were written by this
+    loader and are marked as such; website reviews of those places cannot be
+    told apart from them and are marked too.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT scraped FROM {REVIEW_TABLE} LIMIT 0")
+            cursor.fetchall()
+        return
+    except Exception:  # pymysql and sqlite3 raise unrelated errors for an unknown column
+        conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {REVIEW_TABLE} ADD COLUMN scraped TINYINT NOT NULL DEFAULT 0")
+        cursor.execute(f"UPDATE {REVIEW_TABLE} SET scraped = 1 "
+                       f"WHERE place_id IN (SELECT place_id FROM {STATE_TABLE})")
+    conn.commit()
+
+def add_place_id_indexes(conn):
+    """
+    Indexes place_id in business_info and review, which changed places are
+    deleted from by place_id. MySQL can only index a prefix of a TEXT column.
+    """
+    for table in (BUSINESS_TABLE, REVIEW_TABLE):
+        name = f"idx_{table}_place_id"
+        with conn.cursor() as cursor:
+            if isinstance(conn, SQLiteConnection):
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} (place_id)")
+                continue
+            cursor.execute("SELECT 1 FROM information_schema.statistics "
+                           "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s", (table, name))
+            if not cursor.fetchall():
+                cursor.execute(f"CREATE INDEX {name} ON {table} (place_id({PLACE_ID_INDEX_PREFIX}))")
+    conn.commit()
+
+def create_state_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} "
+            "(place_id VARCHAR(255) PRIMARY KEY, content_hash CHAR(40) NOT NULL)"
+        )
+    conn.commit()
+
+def place_rows(item):
+    """
+    Maps one categorized place to its business_info row and review rows.
+
+    opening_hours is stored as JSON text, alongside its compiled open_intervals.
+    """
+    location = (item.get('geometry') or {}).get('location') or {}
+    opening_hours = item.get('opening_hours')
+    business = (
+        item.get('place_id'),
+        item.get('name'),
+        item.get('formatted_address'),
+        item.get('rating'),
+        item.get('price_level'),
+        item.get('international_phone_number'),
+        location.get('lat'),
+        location.get('lng'),
+        json.dumps(opening_hours, ensure_ascii=False) if opening_hours is not None else None,
+        item.get('open_intervals'),
+        item.get('website'),
+        item.get('category'),
+    )
+    reviews = []
+    if isinstance(item.get('reviews'), list):
+        for review in item['reviews']:
+            reviews.append((
+                business[0],
+                business[1],
+                business[2],
+                review.get('rating'),
+                review.get('text'),
+                format_review_time(review),
+                review.get('author_name'),
+            ))
+    return business, reviews
+
+def content_hash(business, reviews):
+    """Hashes the rows written for a place, to tell whether a reload changes anything."""
+    # The rows hold only strings, numbers and None, so their repr is stable
+    return hashlib.sha1(repr((business, reviews)).encode('utf-8')).hexdigest()
+
+def prepare_place(item):
+    """Returns (place_id, content hash, business row, review rows) for one categorized place."""
+    business, reviews = place_rows(item)
+    return item.get('place_id'), content_hash(business, reviews), business, reviews
+
+def prepare_chunk(task):
+    """Pool worker: parses, filters and prepares every place in one byte range."""
+    jsonl_file, start, end, updates_file = task
+    counts = [0, 0]
+    items = apply_updates(iter_items(jsonl_file, start, end), updates_file)
+    places = [prepare_place(item) for item in select_places(items, set(), counts)]
+    return places, counts
+
+def iter_prepared(jsonl_file, counts, workers=1, updates_file=None):
+    """
+    Yields prepared places in file order, advancing `counts` by places read and
+    kept, with the latest refreshed fields from `updates_file` applied. With
+    `workers` > 1 the file is parsed by a process pool in newline-aligned chunks.
+    """
+    if workers <= 1:
+        for item in select_places(apply_updates(iter_items(jsonl_file), updates_file), set(), counts):
+            yield prepare_place(item)
+        return
+    tasks = [(jsonl_file, start, end, updates_file) for start, end in find_chunks(jsonl_file)]
+    with Pool(workers) as pool:
+        for places, (chunk_read, chunk_kept) in pool.imap(prepare_chunk, tasks):
+            counts[0] += chunk_read
+            counts[1] += chunk_kept
+            yield from places
+
+def load_hashes(conn):
+    """Returns place_id -> content hash for every place already loaded."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT place_id, content_hash FROM {STATE_TABLE}")
+        return dict(cursor.fetchall())
+
+def write_chunk(conn, places, replaced_ids):
+    """
+    Writes one chunk of places in a single transaction.
+
+    Args:
+        places (list): (place_id, hash, business row, review rows) for every new or changed place.
+        replaced_ids (list): The place_ids among them that were loaded before and must be deleted first.
+    """
+    business_rows = [business for _, _, business, _ in places]
+    review_rows = [row for _, _, _, reviews in places for row in reviews]
+    state_rows = [(place_id, digest) for place_id, digest, _, _ in places]
+    try:
+        with conn.cursor() as cursor:
+            if replaced_ids:
+                placeholders = ', '.join(['%s'] * len(replaced_ids))
+                for table in (BUSINESS_TABLE, STATE_TABLE):
+                    cursor.execute(f"DELETE FROM {table} WHERE place_id IN ({placeholders})", replaced_ids)
+                # Only the reviews this loader wrote; reviews added on the website stay
+                cursor.execute(f"DELETE FROM {REVIEW_TABLE} WHERE place_id IN ({placeholders}) AND scraped = 1",
+                               replaced_ids)
+            # pymysql turns executemany INSERTs into multi-row statements
+            cursor.executemany(
+                f"INSERT INTO {BUSINESS_TABLE} ({', '.join(BUSINESS_COLUMNS)}) "
+                f"VALUES ({', '.join(['%s'] * len(BUSINESS_COLUMNS))})",
+                business_rows,
+            )
+            if review_rows:
+                cursor.executemany(
+                    f"INSERT INTO {REVIEW_TABLE} ({', '.join(REVIEW_COLUMNS)}, scraped) "
+                    f"VALUES ({', '.join(['%s'] * len(REVIEW_COLUMNS))}, 1)",
+                    review_rows,
+                )
+            cursor.executemany(f"INSERT INTO {STATE_TABLE} (place_id, content_hash) VALUES (%s, %s)", state_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def load_places(jsonl_file, conn, chunk_size=LOAD_CHUNK_SIZE, workers=1, updates_file=None):
+    """
+    Streams a JSONL file into business_info and review.
+
+    New places are inserted; places whose rows changed since the last load
+    have their business_info, scraped review and state rows replaced (reviews
+    added on the website are kept); unchanged places
+    are skipped. Each chunk of `chunk_size` written places is committed as
+    one transaction, so an interrupted load can simply be re-run. Places that
+    appear more than once in the file are loaded from their first occurrence.
+    The latest refresh of each place in `updates_file`, if given, is applied
+    over it, so a refreshed place is updated like any other changed one.
+    Parsing can be spread over `workers` processes; writes stay on `conn`.
+
+    Returns:
+        dict: Counts of places read, kept, inserted, updated, unchanged and
+        skipped (duplicates or missing place_id), and of reviews written.
+    """
+    create_state_table(conn)
+    add_open_intervals_column(conn)
+    # Before review_id, whose SQLite migration copies the scraped column
+    add_scraped_column(conn)
+    add_review_id_column(conn)
+    add_place_id_indexes(conn)
+    loaded = load_hashes(conn)
+    counts = [0, 0]
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'reviews': 0}
+    seen = set()
+    pending, replaced = [], []
+
+    for place_id, digest, business, reviews in iter_prepared(jsonl_file, counts, workers, updates_file):
+        if not place_id or place_id in seen:
+            summary['skipped'] += 1
+            continue
+        seen.add(place_id)
+
+        previous = loaded.get(place_id)
+        if previous == digest:
+            summary['unchanged'] += 1
+            continue
+        if previous is not None:
+            replaced.append(place_id)
+            summary['updated'] += 1
+        else:
+            summary['inserted'] += 1
+        summary['reviews'] += len(reviews)
+        pending.append((place_id, digest, business, reviews))
+
+        if len(pending) >= chunk_size:
+            write_chunk(conn, pending, replaced)
+            pending, replaced = [], []
+
+    if pending:
+        write_chunk(conn, pending, replaced)
+
+    summary['read'], summary['kept'] = counts
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load scraped places into the business_info and review tables.")
+    parser.add_argument('jsonl_file', nargs='?', default='static/data/singapore_data.jsonl')
+    parser.add_argument('--sqlite', metavar='PATH',
+                        help="Load into this SQLite file instead of the MySQL database from DB_*.")
+    parser.add_argument('--create-tables', action='store_true',
+                        help="Create business_info and review if they do not exist.")
+    parser.add_argument('--chunk-size', type=int, default=LOAD_CHUNK_SIZE, help="Places written per transaction.")
+    parser.add_argument('--workers', type=int, default=1, help="Processes to parse with; 0 uses every CPU core.")
+    parser.add_argument('--updates', metavar='PATH', default=None,
+                        help="Refreshed fields to apply (default: <jsonl_file stem>_updates.jsonl, if it exists).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.jsonl_file):
+        raise SystemExit(f"Error: The file '{args.jsonl_file}' was not found.")
+    updates_file = args.updates or updates_path(args.jsonl_file)
+    if args.updates and not os.path.exists(updates_file):
+        raise SystemExit(f"Error: The file '{updates_file}' was not found.")
+
+    conn = SQLiteConnection(args.sqlite) if args.sqlite else get_connection()
+    try:
+        if args.create_tables:
+            create_tables(conn)
+        started = time.perf_counter()
+        summary = load_places(args.jsonl_file, conn, chunk_size=args.chunk_size,
+                              workers=args.workers or os.cpu_count() or 1,
+                              updates_file=updates_file if os.path.exists(updates_file) else None)
+    except ConversionError as e:
+        raise SystemExit(f"Error: {e}")
+    finally:
+        conn.close()
+
+    print(f"Read {summary['read']} places, kept {summary['kept']} in Singapore "
+          f"({summary['skipped']} duplicates or without place_id skipped).")
+    print(f"Inserted {summary['inserted']}, updated {summary['updated']}, left {summary['unchanged']} unchanged; "
+          f"wrote {summary['reviews']} reviews in {time.perf_counter() - started:.2f}s.")
@@ -0,0 +1,269 @@
+"""
+A local stand-in for the Google Places API, for testing Maps_scraper.py offline.
+
+    python mock_places_server.py --port 8765 --places 5000 --latency 0.05
+    PLACES_API_BASE_URL=http://127.0.0.1:8765 GOOGLE_PLACES_API_KEY=test python Maps_scraper.py
+
+It serves textsearch, details and photo requests over a fixed, seeded set of
+places scattered across Singapore. Text searches return the matching places
+within `radius` of `location`, nearest first, 20 per page and at most 60 per
+query like the real API. Page tokens only become valid after a short delay,
+and a fraction of requests can be made to fail with OVER_QUERY_LIMIT or 503.
+Details honour `fields`, and with --churn-seconds places keep gaining
+ratings, popular ones more often, to exercise Maps_scraper.py --refresh.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+LAT_RANGE = (1.24, 1.46)
+LNG_RANGE = (103.62, 104.00)
+TYPES = ["restaurant", "cafe", "bar", "lodging", "museum", "park", "tourist_attraction", "shopping_mall",
+         "store", "place_of_worship", "gym", "spa", "bakery", "night_club", "art_gallery", "library"]
+# In the order the Places API's weekday_text lists them
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Equirectangular distance in metres, accurate enough at city scale."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6371008.8
+
+def opening_hours(place_id):
+    """Varied, deterministic hours: around the clock, daytime, evenings past midnight (closed Mondays), or none."""
+    kind = int(place_id[5:]) % 4
+    if kind == 0:
+        return {"open_now": True, "periods": [{"open": {"day": 0, "time": "0000"}}],
+                "weekday_text": [f"{day}: Open 24 hours" for day in WEEKDAYS]}
+    if kind == 1:
+        return {"open_now": True,
+                "periods": [{"open": {"day": d, "time": "0900"}, "close": {"day": d, "time": "2100"}} for d in range(7)],
+                "weekday_text": [f"{day}: 9:00 AM – 9:00 PM" for day in WEEKDAYS]}
+    if kind == 2:
+        return {"open_now": False,
+                "periods": [{"open": {"day": d, "time": "1700"}, "close": {"day": (d + 1) % 7, "time": "0100"}}
+                            for d in range(7) if d != 1],
+                "weekday_text": [f"{day}: {'Closed' if day == 'Monday' else '5:00 PM – 1:00 AM'}" for day in WEEKDAYS]}
+    return None
+
+
+class MockPlaces:
+    """The fixed set of places the mock server answers from."""
+
+    def __init__(self, count, seed):
+        rng = random.Random(seed)
+        self.places = []
+        for i in range(count):
+            self.places.append({
+                "place_id": f"mock_{i:06d}",
+                "name": f"Mock Place {i}",
+                "lat": rng.uniform(*LAT_RANGE),
+                "lng": rng.uniform(*LNG_RANGE),
+                "types": rng.sample(TYPES, 2) + ["point_of_interest", "establishment"],
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "photos": rng.randint(0, 4),
+                "reviews": rng.randint(0, 5),
+            })
+        self.by_id = {place["place_id"]: place for place in self.places}
+
+    @staticmethod
+    def matches(place, query):
+        # About a third of all places match any given query term
+        digest = hashlib.md5(f"{place['place_id']}|{query.split(' in ')[0]}".encode()).digest()
+        return digest[0] % 3 == 0
+
+    def search(self, query, lat, lng, radius):
+        hits = []
+        for place in self.places:
+            if self.matches(place, query):
+                distance = distance_m(lat, lng, place["lat"], place["lng"])
+                if distance <= radius:
+                    hits.append((distance, place["place_id"]))
+        hits.sort()
+        return [place_id for _, place_id in hits[:MAX_RESULTS]]
+
+    def summary(self, place):
+        return {
+            "place_id": place["place_id"],
+            "name": place["name"],
+            "geometry": {"location": {"lat": place["lat"], "lng": place["lng"]}},
+            "types": place["types"],
+            "rating": place["rating"],
+        }
+
+    @staticmethod
+    def ratings_gained(place, day):
+        """New ratings a place has received by mock `day`; each day about (reviews + 1) / 24 of places get one."""
+        gained = 0
+        for d in range(1, day + 1):
+            roll = hashlib.md5(f"{place['place_id']}|{d}".encode()).digest()[0]
+            gained += roll < 256 * (place["reviews"] + 1) / 24
+        return gained
+
+    def details(self, place, day=0):
+        result = self.summary(place)
+        gained = self.ratings_gained(place, day) if day else 0
+        result.update({
+            "formatted_address": f"{int(place['place_id'][5:]) % 500 + 1} Mock Street, Singapore",
+            "international_phone_number": "+65 6000 0000",
+            "user_ratings_total": 10 * place["reviews"] + gained,
+            "vicinity": "Singapore",
+            "website": f"https://example.com/{place['place_id']}",
+            "url": f"https://maps.google.com/?cid={place['place_id']}",
+            "opening_hours": opening_hours(place["place_id"]),
+            "photos": [{"photo_reference": f"{place['place_id']}:{i}", "width": 1600, "height": 1200}
+                       for i in range(place["photos"])],
+            "reviews": [{"author_name": f"Reviewer {j}", "rating": 5 - j % 3, "time": 1700000000 + j * 86400,
+                         "relative_time_description": "a month ago", "text": f"Review {j} of {place['name']}."}
+                        for j in range(place["reviews"])],
+        })
+        return result
+
+
+def encode_token(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def decode_token(token):
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+
+class MockPlacesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockPlaces/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload):
+        self.send_body(200, json.dumps(payload).encode())
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server.count(url.path)
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server.rng_random() < server.error_rate:
+            if server.rng_random() < 0.5:
+                return self.send_body(503, b"Service Unavailable", "text/plain")
+            return self.send_json({"status": "OVER_QUERY_LIMIT", "results": []})
+
+        if url.path.endswith("/textsearch/json"):
+            return self.text_search(params)
+        if url.path.endswith("/details/json"):
+            place = server.data.by_id.get(params.get("place_id"))
+            if place is None:
+                return self.send_json({"status": "NOT_FOUND"})
+            result = server.data.details(place, server.day())
+            if params.get("fields"):
+                fields = set(params["fields"].split(","))
+                result = {key: value for key, value in result.items() if key in fields}
+            return self.send_json({"status": "OK", "result": result})
+        if url.path.endswith("/photo"):
+            reference = params.get("photo_reference", "")
+            return self.send_body(200, server.photo_bytes(reference), "image/jpeg")
+        self.send_body(404, b"Not Found", "text/plain")
+
+    def text_search(self, params):
+        server = self.server
+        if "pagetoken" in params:
+            state = decode_token(params["pagetoken"])
+            if time.time() < state["valid_at"]:
+                return self.send_json({"status": "INVALID_REQUEST", "results": []})
+        else:
+            lat, lng = (float(v) for v in params.get("location", "1.35,103.82").split(","))
+            state = {"query": params.get("query", ""), "lat": lat, "lng": lng,
+                     "radius": float(params.get("radius", 50000)), "offset": 0}
+        ids = server.data.search(state["query"], state["lat"], state["lng"], state["radius"])
+        page = ids[state["offset"]:state["offset"] + PAGE_SIZE]
+        payload = {"status": "OK" if ids else "ZERO_RESULTS",
+                   "results": [server.data.summary(server.data.by_id[place_id]) for place_id in page]}
+        if state["offset"] + PAGE_SIZE < len(ids):
+            payload["next_page_token"] = encode_token(
+                dict(state, offset=state["offset"] + PAGE_SIZE, valid_at=time.time() + server.token_delay)
+            )
+        self.send_json(payload)
+
+
+class MockPlacesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, data, latency=0.0, error_rate=0.0, token_delay=0.2, seed=0, churn_seconds=0.0):
+        super().__init__(address, MockPlacesHandler)
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.churn_seconds = churn_seconds
+        self.started = time.time()
+        self.requests = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def rng_random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def day(self):
+        """Mock days elapsed since the server started; one passes every `churn_seconds` (never, if 0)."""
+        if not self.churn_seconds:
+            return 0
+        return int((time.time() - self.started) / self.churn_seconds)
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def photo_bytes(self, reference):
+        """A small, deterministic JPEG-like payload per photo reference."""
+        # Photos of the same place repeat every other index, so identical images do occur
+        place_id, _, index = reference.partition(":")
+        seed = hashlib.sha256(f"{place_id}:{int(index or 0) % 2}".encode()).digest()
+        return b"\xff\xd8\xff\xe0" + seed * 256 + b"\xff\xd9"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Google Places API on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--places", type=int, default=5000, help="Number of places in the mock dataset.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with OVER_QUERY_LIMIT or HTTP 503.")
+    parser.add_argument("--token-delay", type=float, default=0.2,
+                        help="Seconds before a next_page_token becomes valid.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--churn-seconds", type=float, default=0.0,
+                        help="Seconds per mock day, after each of which some places have gained ratings (0: never).")
+    args = parser.parse_args()
+
+    server = MockPlacesServer(("127.0.0.1", args.port), MockPlaces(args.places, args.seed), args.latency,
+                              args.error_rate, args.token_delay, args.seed, args.churn_seconds)
+    print(f"Mock Places API on http://127.0.0.1:{args.port} with {args.places} places.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Requests served: {server.requests}")
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
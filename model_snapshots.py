@@ -0,0 +1,174 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where every process builds its own snapshots
+    fcntl = None
+
+LEADER_LOCK_NAME = "builder.lock"
+METADATA_NAME = "meta.json"
+
+
+class SortedIdIndex:
+    """
+    Maps ids to their positions in an ascending id array by binary search.
+
+    A drop-in for the `{id: position}` dicts the models used to build, but
+    backed by the id array itself, so it costs nothing to create and shares
+    the array's memory when that array is memory-mapped.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+
+    def get(self, key: Any, default: Optional[int] = None) -> Optional[int]:
+        try:
+            position = int(np.searchsorted(self.ids, key))
+        except (TypeError, ValueError):  # A key of a type the ids cannot be compared with
+            return default
+        if position < len(self.ids) and self.ids[position] == key:
+            return position
+        return default
+
+    def __getitem__(self, key: Any) -> int:
+        position = self.get(key)
+        if position is None:
+            raise KeyError(key)
+        return position
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.ids.tolist())
+
+
+class SnapshotDirectory:
+    """
+    Versioned, read-only model snapshots shared by every process on a host.
+
+    Each published version of a snapshot `name` is a directory of raw .npy
+    arrays plus a meta.json, written under a temporary name and renamed into
+    place. The file `<name>.current` names the live version and is itself
+    replaced by an atomic rename, so readers see either the old version or
+    the new one, never a partial write. Readers `load` a version with every
+    array memory-mapped read-only: the pages live once in the OS page cache,
+    however many processes map them, and mapping takes milliseconds.
+
+    One process holds an exclusive lock on builder.lock and is the only one
+    that should build and publish; the lock is released when that process
+    exits, so another process can take over.
+    """
+
+    def __init__(self, path: str, keep_versions: int = 3):
+        self.path = path
+        self.keep_versions = max(1, keep_versions)
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def try_lead(self) -> bool:
+        """Becomes the builder if no other process is; returns whether this process is the builder."""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(os.path.join(self.path, LEADER_LOCK_NAME), "a+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._lock_file = lock_file
+        return True
+
+    def close(self) -> None:
+        """Gives up the builder role."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def current(self, name: str) -> Optional[str]:
+        """Returns the live version of a snapshot, or None if none has been published."""
+        try:
+            with open(os.path.join(self.path, f"{name}.current"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, name: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+        """
+        Writes a new version of a snapshot and makes it the live one.
+
+        Returns:
+            str: The new version.
+        """
+        version = f"{name}-{time.time_ns()}-{os.getpid()}"
+        staging = tempfile.mkdtemp(dir=self.path, prefix=f".{version}.")
+        try:
+            for key, array in arrays.items():
+                if array.dtype == object:
+                    raise ValueError(f"Array '{key}' has dtype object and cannot be memory-mapped.")
+                np.save(os.path.join(staging, f"{key}.npy"), array, allow_pickle=False)
+            with open(os.path.join(staging, METADATA_NAME), "w", encoding="utf-8") as f:
+                json.dump(meta, f, default=str)
+            os.rename(staging, os.path.join(self.path, version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(self.path, f".{name}.current.{os.getpid()}")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.path, f"{name}.current"))
+        self._prune(name, version)
+        return version
+
+    def load(self, name: str, version: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """Maps every array of a published version read-only, and reads its metadata."""
+        directory = os.path.join(self.path, version)
+        with open(os.path.join(directory, METADATA_NAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            entry[:-len(".npy")]: np.load(os.path.join(directory, entry), mmap_mode="r", allow_pickle=False)
+            for entry in os.listdir(directory) if entry.endswith(".npy")
+        }
+        return arrays, meta
+
+    def wait_for(self, name: str, timeout: float, poll_interval: float = 0.1) -> Optional[str]:
+        """
+        Waits for the first version of a snapshot to be published.
+
+        Returns:
+            Optional[str]: The version, or None if this process became the
+            builder or nothing was published within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.current(name)
+            if version is not None:
+                return version
+            if self.try_lead() or time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def _prune(self, name: str, live: str) -> None:
+        """Deletes all but the newest versions. Processes still mapping a deleted version keep reading it."""
+        prefix = f"{name}-"
+        versions = sorted(
+            (entry for entry in os.listdir(self.path) if entry.startswith(prefix) and entry != live),
+            key=lambda entry: int(entry[len(prefix):].split("-")[0]),
+        )
+        for version in versions[:max(0, len(versions) - (self.keep_versions - 1))]:
+            shutil.rmtree(os.path.join(self.path, version), ignore_errors=True)
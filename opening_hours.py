@@ -0,0 +1,147 @@
+"""
+Weekly opening hours compiled into sorted minute intervals.
+
+Places details give `opening_hours.periods` as open/close points with a
+`day` (0 = Sunday) and an "HHMM" `time`, in the place's local time. They are
+compiled once, at conversion time, into the text form
+
+    "540-1260,1980-2700"
+
+of sorted, merged [start, end) intervals in minutes since Sunday 00:00
+Singapore time. A place open around the clock is "0-10080"; a place whose
+hours are unknown has no intervals at all (None), which is different from
+"" (listed hours, never open). `OpeningHoursIndex` answers "which of these
+places are open at T" over many places in one vectorized pass.
+"""
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Singapore has kept UTC+8 without daylight saving since 1982, so a fixed offset is exact.
+SINGAPORE_TZ = timezone(timedelta(hours=8), "Asia/Singapore")
+
+
+def point_minute(point: Dict[str, Any]) -> int:
+    """Minutes since Sunday 00:00 of a Places API open/close point."""
+    time = str(point.get("time") or "0000")
+    return int(point["day"]) % 7 * MINUTES_PER_DAY + int(time[:2]) * 60 + int(time[2:4])
+
+def daily_periods(open_time: str, close_time: str) -> List[Dict[str, Dict[str, Any]]]:
+    """Places API `periods` for a place open open_time-close_time ("HHMM") every day."""
+    overnight = close_time <= open_time
+    return [
+        {"open": {"day": day, "time": open_time}, "close": {"day": (day + overnight) % 7, "time": close_time}}
+        for day in range(7)
+    ]
+
+def compile_periods(opening_hours: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Compiles a Places `opening_hours` object into week-minute interval text.
+
+    Periods that run past Saturday midnight are split at the end of the
+    week, overlapping periods are merged, and malformed ones are skipped.
+
+    Returns:
+        Optional[str]: The intervals, or None if the object lists no periods.
+    """
+    periods = opening_hours.get("periods") if isinstance(opening_hours, dict) else None
+    if not isinstance(periods, list):
+        return None
+
+    intervals = []
+    for period in periods:
+        try:
+            start = point_minute(period["open"])
+            if period.get("close") is None:
+                # The API's way of saying open around the clock: one open point and no close
+                intervals.append((0, MINUTES_PER_WEEK))
+                continue
+            end = point_minute(period["close"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if end > start:
+            intervals.append((start, end))
+        else:
+            intervals.append((start, MINUTES_PER_WEEK))
+            if end > 0:
+                intervals.append((0, end))
+
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return ",".join(f"{start}-{end}" for start, end in merged)
+
+def parse_intervals(text: Optional[str]) -> List[Tuple[int, int]]:
+    """Reads interval text written by `compile_periods`; None and "" give no intervals."""
+    if not text:
+        return []
+    return [tuple(int(bound) for bound in interval.split("-")) for interval in text.split(",")]
+
+def week_minute(moment: Optional[datetime] = None) -> int:
+    """
+    Minutes since Sunday 00:00 Singapore time of `moment` (default: now).
+
+    A naive datetime is taken to already be Singapore local time.
+    """
+    if moment is None:
+        moment = datetime.now(SINGAPORE_TZ)
+    elif moment.tzinfo is not None:
+        moment = moment.astimezone(SINGAPORE_TZ)
+    # datetime counts Monday as 0, the Places API counts Sunday as 0
+    return (moment.weekday() + 1) % 7 * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+class OpeningHoursIndex:
+    """
+    Opening intervals of many places, stored CSR-style.
+
+    Place `i` owns the intervals `starts[offsets[i]:offsets[i + 1]]` /
+    `ends[...]`. `known` marks places whose hours are listed at all.
+    """
+
+    def __init__(self, encoded: Sequence[Optional[str]]):
+        counts = np.array([text.count(",") + 1 if text else 0 for text in encoded], dtype=np.int64)
+        # Parse every place's text in one pass rather than interval by interval
+        text = ",".join(text for text in encoded if text).replace("-", ",")
+        flat = (np.array(text.split(","), dtype=np.int64) if text else np.zeros(0, dtype=np.int64)).reshape(-1, 2)
+        self.known = np.array([text is not None for text in encoded], dtype=bool)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.starts = flat[:, 0].astype(np.int16)
+        self.ends = flat[:, 1].astype(np.int16)
+        self._owners = np.repeat(np.arange(len(encoded)), counts)
+
+    def __len__(self) -> int:
+        return len(self.known)
+
+    def open_at(self, minute: int, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Tests which places are open at a week minute (see `week_minute`).
+
+        Args:
+            positions: Places to test; every place if None.
+
+        Returns:
+            np.ndarray: One bool per tested place. Places with unknown hours are False.
+        """
+        if positions is None:
+            hits = (self.starts <= minute) & (minute < self.ends)
+            is_open = np.zeros(len(self.known), dtype=bool)
+            is_open[self._owners[hits]] = True
+            return is_open
+
+        # Gather only the candidates' intervals: one index per interval, grouped by candidate
+        positions = np.asarray(positions, dtype=np.int64)
+        counts = self.offsets[positions + 1] - self.offsets[positions]
+        owners = np.repeat(np.arange(len(positions)), counts)
+        first = np.repeat(self.offsets[positions] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        intervals = first + np.arange(len(owners))
+        hits = (self.starts[intervals] <= minute) & (minute < self.ends[intervals])
+        is_open = np.zeros(len(positions), dtype=bool)
+        is_open[owners[hits]] = True
+        return is_open
@@ -0,0 +1,221 @@
+"""
+Turns the photos downloaded by Maps_scraper.py into a deduplicated store of
+resized variants.
+
+    python photo_store.py data/singapore_data.jsonl --photos-dir data/photos --workers 4
+
+Every downloaded photo is content-hashed; identical images (the same photo
+listed under several places, or re-downloaded) are stored and processed once.
+Each unique image gets a thumb, card and full size JPEG, and manifest.json in
+the photos directory maps every place_id to its photos' variant paths, for
+`jsonl_to_csv.py --photo-manifest`. Files already hashed and variants already
+rendered are skipped on re-runs.
+
+Resizing needs Pillow (pip install pillow); without it the store and manifest
+are still built, with every variant pointing at the original.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+from jsonl_to_csv import ConversionError, iter_items
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Variant name -> (longest side in pixels, JPEG quality). Images are never upscaled.
+VARIANTS = {
+    "thumb": (160, 70),
+    "card": (480, 78),
+    "full": (1600, 85),
+}
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def object_path(photos_dir, kind, digest):
+    """Path of one stored object: `kind` is "original" or a variant name."""
+    return os.path.join(photos_dir, kind, digest[:2], digest + ".jpg")
+
+def hash_file(path):
+    """Pool worker: returns (path, size, mtime_ns, sha256) of a downloaded photo, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return path, stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+def store_original(path, target):
+    """Adds a downloaded photo to the store, as a hard link where the filesystem allows."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(path, target)
+
+def render_variants(task):
+    """
+    Pool worker: writes the missing variants of one stored image.
+
+    Returns (digest, (width, height), error); the size is None and `error`
+    set if the image could not be decoded.
+    """
+    photos_dir, digest = task
+    original = object_path(photos_dir, "original", digest)
+    try:
+        with Image.open(original) as image:
+            size = image.size
+            image = image.convert("RGB")
+            # Largest first, each variant resized from the one before it, which is much cheaper than from the original
+            for name, (longest, quality) in sorted(VARIANTS.items(), key=lambda variant: -variant[1][0]):
+                image.thumbnail((longest, longest), Image.LANCZOS)
+                target = object_path(photos_dir, name, digest)
+                if os.path.exists(target):
+                    continue
+                variant = image
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                fd, partial = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    variant.save(f, "JPEG", quality=quality, optimize=True)
+                os.replace(partial, target)
+        return digest, size, None
+    except Exception as e:  # Pillow raises a variety of errors for corrupt or unsupported files
+        return digest, None, f"{type(e).__name__}: {e}"
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"photos": {}, "places": {}, "files": {}}
+
+def write_manifest(path, manifest):
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(partial, path)
+
+def process_photos(jsonl_file, photos_dir, workers=1):
+    """
+    Hashes, deduplicates and resizes every photo referenced by the JSONL's
+    `local_image_paths`, and rewrites the manifest.
+
+    Returns:
+        dict: Counts of photo references, files hashed this run, unique
+        images, images rendered this run and images that failed to decode.
+    """
+    os.makedirs(photos_dir, exist_ok=True)
+    manifest_file = os.path.join(photos_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_file)
+    known_files = manifest["files"]
+
+    place_paths = {}
+    for item in iter_items(jsonl_file):
+        paths = item.get("local_image_paths")
+        if item.get("place_id") and isinstance(paths, list):
+            place_paths[item["place_id"]] = paths
+
+    # Hash only files that are new or changed since the last run
+    stale = []
+    for paths in place_paths.values():
+        for path in paths:
+            entry = known_files.get(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+                stale.append(path)
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        hashed = pool.imap_unordered(hash_file, stale, chunksize=64) if pool is not None else map(hash_file, stale)
+        for result in hashed:
+            if result is not None:
+                path, size, mtime_ns, digest = result
+                known_files[path] = [size, mtime_ns, digest]
+                store_original(path, object_path(photos_dir, "original", digest))
+
+        places = {}
+        referenced = set()
+        for place_id, paths in place_paths.items():
+            digests = [known_files[path][2] for path in paths if path in known_files]
+            places[place_id] = digests
+            referenced.update(digests)
+
+        # Images that failed to decode are not retried; delete their manifest entry to force it
+        photos = {digest: info for digest, info in manifest["photos"].items() if digest in referenced}
+        pending = sorted(
+            digest for digest in referenced
+            if digest not in photos or not photos[digest].get("error") and not all(
+                os.path.exists(object_path(photos_dir, name, digest)) for name in VARIANTS)
+        )
+        failed = 0
+        if Image is None:
+            if pending:
+                print("Pillow is not installed; variants point at the original images (pip install pillow).")
+            for digest in pending:
+                photos.setdefault(digest, {"width": None, "height": None, "error": None})
+        else:
+            tasks = [(photos_dir, digest) for digest in pending]
+            rendered = pool.imap_unordered(render_variants, tasks) if pool is not None else map(render_variants, tasks)
+            for digest, size, error in rendered:
+                photos[digest] = {"width": size and size[0], "height": size and size[1], "error": error}
+                failed += error is not None
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    for digest, info in photos.items():
+        for name in VARIANTS:
+            # Images that were not resized are served as they were downloaded
+            variant = object_path(photos_dir, name, digest)
+            info[name] = variant if os.path.exists(variant) else object_path(photos_dir, "original", digest)
+
+    referenced_paths = {path for paths in place_paths.values() for path in paths}
+    manifest = {
+        "variants": {name: longest for name, (longest, _) in VARIANTS.items()},
+        "photos": photos,
+        "places": places,
+        "files": {path: entry for path, entry in known_files.items() if path in referenced_paths},
+    }
+    write_manifest(manifest_file, manifest)
+    return {
+        "references": sum(len(paths) for paths in place_paths.values()),
+        "hashed": len(stale),
+        "unique": len(photos),
+        "rendered": len(pending) if Image is not None else 0,
+        "failed": failed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate and resize the scraped place photos.")
+    parser.add_argument("jsonl_file", nargs="?", default=os.path.join("data", "singapore_data.jsonl"))
+    parser.add_argument("--photos-dir", default=os.path.join("data", "photos"))
+    parser.add_argument("--workers", type=int, default=1, help="Processes to hash and resize with; 0 uses every CPU core.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.jsonl_file):
+        raise SystemExit(f"Error: The file '{args.jsonl_file}' was not found.")
+    started = time.perf_counter()
+    try:
+        summary = process_photos(args.jsonl_file, args.photos_dir, workers=args.workers or os.cpu_count() or 1)
+    except ConversionError as e:
+        raise SystemExit(f"Error: {e}")
+    print(f"{summary['references']} photo references, {summary['unique']} unique images; hashed "
+          f"{summary['hashed']} files and resized {summary['rendered']} images "
+          f"({summary['failed']} could not be decoded) in {time.perf_counter() - started:.2f}s.")
+    print(f"Manifest written to {os.path.join(args.photos_dir, MANIFEST_NAME)}.")
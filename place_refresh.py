@@ -0,0 +1,150 @@
+"""
+Scheduling re-fetches of places that were already scraped.
+
+A place's name, address and location rarely change, but its rating, review
+count, reviews and opening hours do. A refresh requests only those
+`VOLATILE_FIELDS` from Place Details and appends the ones that changed to an
+updates file next to the JSONL (see `updates_path`). load_places.py applies
+the latest update of each place over its originally scraped record.
+
+Which places to refresh within a call budget is decided by `plan_refresh`:
+every place is scored by how much it matters (its number of ratings) times
+the probability that it has changed since it was last fetched, estimated
+from its age and the changes observed on earlier refreshes.
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+from functools import lru_cache
+
+from jsonl_to_csv import complete_length, iter_items
+
+# Place Details fields that change after a place is first scraped; a refresh requests only these.
+VOLATILE_FIELDS = ['rating', 'user_ratings_total', 'reviews', 'opening_hours', 'price_level']
+
+# Prior belief of how often a place changes, PRIOR_CHANGES changes per PRIOR_DAYS days. It dominates
+# the estimate until a place has been watched for a comparable time.
+PRIOR_CHANGES = 1.0
+PRIOR_DAYS = 30.0
+# Age assumed for places collected before fetch times were recorded.
+UNKNOWN_AGE_DAYS = 90.0
+# Places fetched more recently than this are never refreshed.
+MIN_REFRESH_AGE_DAYS = 1.0
+
+SECONDS_PER_DAY = 24 * 3600
+
+# The parts of a review that identify it and its content. The rest, such as
+# `relative_time_description` ("a week ago") and `profile_photo_url`, is
+# rewritten by Google as time passes.
+REVIEW_FIELDS = ['author_name', 'author_url', 'time', 'rating', 'text']
+
+
+def comparable_value(record, field):
+    """
+    A field's value with the parts that change without the place changing
+    removed: `open_now` flips every few hours, reviews carry fields that
+    drift with their age (see `REVIEW_FIELDS`), and the API returns the same
+    reviews in a varying order.
+    """
+    value = record.get(field)
+    if field == 'opening_hours' and isinstance(value, dict):
+        return {key: part for key, part in value.items() if key != 'open_now'}
+    if field == 'reviews' and isinstance(value, list):
+        reviews = [{key: review.get(key) for key in REVIEW_FIELDS} for review in value if isinstance(review, dict)]
+        return sorted(reviews, key=lambda review: (review['time'] or 0, review['author_name'] or ''))
+    return value
+
+def field_hashes(record):
+    """Returns field -> short hash of its comparable value, for every volatile field."""
+    return {
+        field: hashlib.sha1(json.dumps(comparable_value(record, field), sort_keys=True, ensure_ascii=False)
+                            .encode('utf-8')).hexdigest()[:16]
+        for field in VOLATILE_FIELDS
+    }
+
+def changed_fields(previous_hashes, hashes):
+    """The volatile fields whose hash differs from the previous fetch."""
+    return [field for field in VOLATILE_FIELDS if previous_hashes.get(field) != hashes[field]]
+
+def popularity(record):
+    """How much a place matters to users, as its number of ratings."""
+    try:
+        return max(0, int(record.get('user_ratings_total') or 0))
+    except (TypeError, ValueError):
+        return 0
+
+def change_rate(changes, observed_days):
+    """Estimated changes per day of a place that changed `changes` times while watched for `observed_days`."""
+    return (changes + PRIOR_CHANGES) / (observed_days + PRIOR_DAYS)
+
+def refresh_priority(ratings, age_days, rate):
+    """
+    The value of re-fetching a place now: a weight that grows with the log
+    of its number of ratings, times the probability that a place changing
+    `rate` times a day (as a Poisson process) has changed in `age_days`.
+    """
+    return (1.0 + math.log1p(ratings)) * -math.expm1(-rate * age_days)
+
+def plan_refresh(places, budget, now):
+    """
+    Picks the places most worth re-fetching with `budget` Place Details calls.
+
+    Args:
+        places: (place_id, first_fetched_at, fetched_at, popularity, changes, field hashes JSON)
+            rows, as returned by `CheckpointStore.freshness`. Fetch times are epoch seconds,
+            None if unknown.
+        budget: The number of places to pick.
+        now: The current epoch time.
+
+    Returns:
+        list: (priority, place_id, previous field hashes) for the chosen places, highest priority first.
+    """
+    def candidates():
+        for place_id, first_fetched_at, fetched_at, ratings, changes, hashes in places:
+            if fetched_at is None:
+                age_days, observed_days = UNKNOWN_AGE_DAYS, 0.0
+            else:
+                age_days = (now - fetched_at) / SECONDS_PER_DAY
+                observed_days = (fetched_at - (first_fetched_at or fetched_at)) / SECONDS_PER_DAY
+            if age_days < MIN_REFRESH_AGE_DAYS:
+                continue
+            yield refresh_priority(ratings, age_days, change_rate(changes, observed_days)), place_id, hashes
+
+    chosen = heapq.nlargest(max(0, budget), candidates(), key=lambda candidate: candidate[0])
+    return [(priority, place_id, json.loads(hashes) if hashes else {}) for priority, place_id, hashes in chosen]
+
+
+# --- Updates File ---
+
+def updates_path(jsonl_file):
+    """Returns the path of the refresh updates written alongside `jsonl_file`."""
+    stem, extension = os.path.splitext(jsonl_file)
+    return f"{stem}_updates{extension}"
+
+@lru_cache(maxsize=4)
+def load_updates(updates_file, mtime_ns=None, size=None):
+    """
+    Returns place_id -> the volatile fields of its latest refresh, from an
+    updates file. `mtime_ns` and `size` only key the cache, so a file that
+    has grown since is read again. A line still being appended is skipped.
+    """
+    updates = {}
+    for update in iter_items(updates_file, 0, complete_length(updates_file)):
+        place_id = update.get('place_id')
+        if place_id:
+            updates[place_id] = {field: update.get(field) for field in VOLATILE_FIELDS}
+    return updates
+
+def apply_updates(items, updates_file):
+    """Yields `items` with the latest refreshed fields of each place applied over its scraped record."""
+    updates = {}
+    if updates_file is not None and os.path.exists(updates_file):
+        stat = os.stat(updates_file)
+        updates = load_updates(updates_file, stat.st_mtime_ns, stat.st_size)
+    for item in items:
+        update = updates.get(item.get('place_id')) if updates else None
+        if update is not None:
+            item.update(update)
+        yield item
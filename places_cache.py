@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+# Entry header: creation time as a little-endian double, then the (possibly compressed) body.
+HEADER = struct.Struct("<d")
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of Places API responses.
+
+    Entries are keyed by endpoint plus the request parameters, normalized
+    (sorted, API key removed), so the same request always maps to the same
+    file whoever makes it. Each endpoint has its own TTL, JSON bodies are
+    zlib-compressed, and once the cache grows past `max_bytes` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, directory, max_bytes, ttls, compressed=("textsearch", "details")):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.compressed = set(compressed)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def key(endpoint, params):
+        normalized = {name: str(value) for name, value in params.items() if name != "key"}
+        payload = json.dumps([endpoint, normalized], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every entry on disk."""
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, endpoint, params, ignore_ttl=False):
+        """
+        Returns the cached body for a request, or None if it is missing or
+        older than the endpoint's TTL (unless `ignore_ttl`).
+        """
+        path = self._path(self.key(endpoint, params))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        (created,) = HEADER.unpack_from(data)
+        ttl = self.ttls.get(endpoint)
+        if not ignore_ttl and ttl is not None and time.time() - created > ttl:
+            self._count(hit=False)
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        body = data[HEADER.size:]
+        return zlib.decompress(body) if endpoint in self.compressed else body
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, endpoint, params, body):
+        """Stores a response body, evicting old entries if the cache is over its size limit."""
+        path = self._path(self.key(endpoint, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if endpoint in self.compressed:
+            body = zlib.compress(body, 6)
+        data = HEADER.pack(time.time()) + body
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(data) - previous
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache is below 90% of its limit."""
+        with self._lock:
+            target = self.max_bytes * 0.9
+            if self._size <= target:
+                return
+            for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+                if self._size <= target:
+                    break
+
+    def stats(self):
+        return {"entries_bytes": self._size, "hits": self.hits, "misses": self.misses}
@@ -1,170 +1,2283 @@
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import json
 import os
-from fastapi import FastAPI, HTTPException
-import pandas as pd
+import queue
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, redirect_stdout
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
 import pymysql
-from typing import List
+from content_index import ContentIndex, build_place_vectors
+from geo_index import GeoIndex
+from search_index import SearchIndex
+from model_snapshots import SnapshotDirectory, SortedIdIndex
+from opening_hours import OpeningHoursIndex, compile_periods, daily_periods, week_minute
+from result_cache import ResultCache
+from metrics import Counter, Histogram, format_server_timing, render_metrics, request_timings, timed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# FastAPI and pydantic are imported inside create_app(), so the CLI and the
+# worker start without paying for them.
 
 # --- Database Configuration ---
 # Replace with your actual credentials. Use environment variables for security.
 DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 DB_NAME = os.getenv("DB_NAME", "tourism_app")
 DB_TABLE = "user_interactions" # Assuming a table with user_id, place_id
+# Monotonically increasing column (auto-increment id or timestamp) used to pull only new rows.
+DB_WATERMARK_COLUMN = os.getenv("DB_WATERMARK_COLUMN", "id")
+# Seconds between background refreshes of the interaction store; 0 disables the background thread.
+INTERACTION_REFRESH_SECONDS = float(os.getenv("INTERACTION_REFRESH_SECONDS", "60"))
+# Maximum number of pooled database connections held by the service.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Seconds to wait for a free pooled connection before giving up.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Threads that run blocking database and scoring work off the event loop.
+RECOMMENDER_THREADS = int(os.getenv("RECOMMENDER_THREADS", str(os.cpu_count() or 4)))
+
+# --- Recommender Configuration ---
+# "user" for user-user collaborative filtering, "item" for the precomputed item-item index.
+RECOMMENDER_MODE = os.getenv("RECOMMENDER_MODE", "user")
+RECOMMENDER_MODES = ("user", "item")
+# Number of neighbours kept per place in the item-item index.
+ITEM_NEIGHBOURS_K = int(os.getenv("ITEM_NEIGHBOURS_K", "50"))
+# Seconds between background rebuilds of the item-item index; 0 disables the background thread.
+ITEM_INDEX_REFRESH_SECONDS = float(os.getenv("ITEM_INDEX_REFRESH_SECONDS", "300"))
+# Users scored together per sparse matrix product in batch mode (bounds the dense score block).
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "256"))
+# Memory for the dense (users + places) x block arrays of one batch block; blocks shrink below
+# BATCH_CHUNK_SIZE users when there are many users or places.
+BATCH_BLOCK_BYTES = int(os.getenv("BATCH_BLOCK_MB", "64")) * 1024 * 1024
+# Largest number of user_ids accepted by POST /recommendations/batch.
+BATCH_MAX_USERS = int(os.getenv("BATCH_MAX_USERS", "10000"))
+# Table that the offline precompute job writes ranked recommendations into.
+RECOMMENDATIONS_TABLE = "user_recommendations"
+
+# --- Result Cache Configuration ---
+# Ranked /recommendations results kept in memory; 0 disables the cache.
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+# Seconds a cached result is served before it is recomputed, even if the user has no new interactions.
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+# Places ranked and cached per entry, so any top_n up to this is served from the same entry.
+RESULT_CACHE_DEPTH = int(os.getenv("RESULT_CACHE_DEPTH", "50"))
+# max-age of /recommendations responses; after it clients revalidate with If-None-Match.
+RESULT_CACHE_CLIENT_MAX_AGE = int(os.getenv("RESULT_CACHE_CLIENT_MAX_AGE", "30"))
+
+# --- Shared Snapshot Configuration ---
+# Directory for memory-mapped model snapshots shared by every worker process on the host
+# (e.g. `uvicorn prediction:app --workers 8`). One worker builds and publishes the interaction
+# matrix and item index; the others map the published files read-only. Unset keeps each process separate.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+# Published versions kept per snapshot, so a worker still mapping an older one is never cut off.
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("SNAPSHOT_KEEP_VERSIONS", "3"))
+# Seconds between checks for a newly published version by the workers that are not building.
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+# Seconds a starting worker waits for the first published version before building its own.
+SNAPSHOT_WAIT_SECONDS = float(os.getenv("SNAPSHOT_WAIT_SECONDS", "30"))
+
+# --- Place Catalogue Configuration ---
+CATALOGUE_TABLE = "business_info"
+# Seconds between background reloads of the place catalogue; 0 disables the background thread.
+CATALOGUE_REFRESH_SECONDS = float(os.getenv("CATALOGUE_REFRESH_SECONDS", "3600"))
+# Radius used by location filters when a lat/lng is given without radius_m.
+DEFAULT_RADIUS_M = float(os.getenv("DEFAULT_RADIUS_M", "2000"))
+
+# --- Search Configuration ---
+REVIEW_TABLE = "review"
+# Insertion-ordered column used to pull only reviews added since the last refresh. publish_time
+# would miss reviews loaded later with older dates, and ones added in the same second.
+REVIEW_WATERMARK_COLUMN = os.getenv("REVIEW_WATERMARK_COLUMN", "review_id")
+# Seconds between background pulls of new reviews into the search index; 0 disables the background thread.
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "30"))
+# Largest `limit` accepted by /search.
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+
+# --- Content Similarity Configuration ---
+# A content index built offline with `python prediction.py content-index`; if unset, it is built in-process.
+CONTENT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", "")
+# Seconds between checks for a changed catalogue or index file; 0 disables the background thread.
+CONTENT_INDEX_REFRESH_SECONDS = float(os.getenv("CONTENT_INDEX_REFRESH_SECONDS", "300"))
+
+# --- Metrics ---
+STAGE_SECONDS = Histogram(
+    "recommender_stage_seconds", "Time spent in each stage of the recommendation pipeline.", ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "recommender_request_seconds", "End-to-end HTTP request latency.", ["path", "status"]
+)
+COLD_STARTS = Counter("recommender_cold_start_total", "Requests for users with no interactions.")
+FALLBACKS = Counter(
+    "recommender_fallback_total", "Requests answered with fallback places instead of personalised ones.", ["reason"]
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "recommender_result_cache_total", "Recommendation result cache lookups.", ["result"]
+)
+DUMMY_DATA_FALLBACKS = Counter(
+    "recommender_dummy_data_fallback_total", "Loads that fell back to the built-in dummy data.", ["dataset"]
+)
+# Set SERVER_TIMING=always to attach Server-Timing to every response; otherwise a
+# client opts in per request by sending the header "X-Server-Timing: 1".
+SERVER_TIMING = os.getenv("SERVER_TIMING", "opt-in")
 
 # --- Mock Data for Fallback ---
 # Used if the database connection fails or there's not enough data.
 DUMMY_INTERACTIONS = {
     'user_id': [1, 1, 2, 2, 3, 3, 3, 4, 4, 5],
-    'place_id': [101, 102, 101, 103, 102, 103, 104, 104, 105, 101],
+    'place_id': ['101', '102', '101', '103', '102', '103', '104', '104', '105', '101'],
     'interaction_type': ['click', 'save', 'click', 'review', 'click', 'save', 'review', 'click', 'save', 'review']
 }
 # Mock top-rated places for cold-start users
-MOCK_TOP_RATED_PLACES = [101, 103, 105, 201, 202]
+MOCK_TOP_RATED_PLACES = ['101', '103', '105', '201', '202']
+# Mock place catalogue matching the dummy interactions
+DUMMY_PLACES = {
+    'place_id': ['101', '102', '103', '104', '105', '201', '202'],
+    'place_name': ['Gardens by the Bay', 'Maxwell Food Centre', 'National Gallery Singapore', 'Tiong Bahru Bakery',
+                   'Marina Bay Sands', 'Sri Mariamman Temple', 'VivoCity'],
+    'latitude': [1.2816, 1.2803, 1.2903, 1.2845, 1.2834, 1.2827, 1.2644],
+    'longitude': [103.8636, 103.8448, 103.8515, 103.8325, 103.8607, 103.8452, 103.8223],
+    'category': ['Attractions & Activities', 'Food and Beverage', 'Attractions & Activities', 'Food and Beverage',
+                 'Stays & Accommodations', 'Place of Worship', 'Shopping'],
+    'rating': [4.7, 4.4, 4.7, 4.3, 4.6, 4.6, 4.4],
+    'price_level': [None, 1, None, 2, 4, None, 2],
+    'open_intervals': [
+        compile_periods({"periods": daily_periods("0500", "0200")}),
+        compile_periods({"periods": daily_periods("0800", "2200")}),
+        compile_periods({"periods": daily_periods("1000", "1900")}),
+        compile_periods({"periods": daily_periods("0800", "2000")}),
+        compile_periods({"periods": [{"open": {"day": 0, "time": "0000"}}]}),
+        compile_periods({"periods": daily_periods("0600", "1200") + daily_periods("1800", "2100")}),
+        compile_periods({"periods": daily_periods("1000", "2200")}),
+    ],
+}
+
+# Mock reviews of the dummy places, so search works without a database
+DUMMY_REVIEWS = {
+    'place_id': ['101', '101', '102', '102', '103', '104', '105', '201', '202'],
+    'review_text': [
+        'Supertree light show at night is a must, the cloud forest dome is cool too.',
+        'Flower Dome was beautiful, go early to avoid the crowd.',
+        'Tian Tian chicken rice worth the queue lah, also try the char kway teow.',
+        'Hawker centre with cheap and good local food, popiah and fish soup.',
+        'Great museum for Southeast Asian art, the rooftop has a nice view.',
+        'Kouign amann and croissants are excellent, coffee a bit pricey.',
+        'Infinity pool view is amazing, the rooms are expensive though.',
+        'Oldest Hindu temple in Singapore, very colourful gopuram.',
+        'Big mall next to Sentosa with lots of food options.',
+    ],
+}
 
 # --- Helper Functions & Data Pipeline ---
 
-def get_user_item_matrix() -> pd.DataFrame:
+def get_connection(**kwargs) -> pymysql.connections.Connection:
+    """Opens a new connection to the application database."""
+    return pymysql.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        **kwargs
+    )
+
+class PoolTimeoutError(pymysql.MySQLError):
+    """Raised when no pooled connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of pymysql connections.
+
+    At most `size` connections are open at once. Idle connections are pinged
+    (and transparently reconnected) before being handed out, and any open
+    transaction is rolled back when a connection is returned, so the next
+    borrower starts from a fresh read view.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[pymysql.connections.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self.last_error: Optional[str] = None
+
+    def acquire(self) -> pymysql.connections.Connection:
+        """Borrows a connection, opening a new one if the pool is not yet full."""
+        if self._closed:
+            raise PoolTimeoutError("Connection pool is closed.")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return get_connection()
+                except Exception as e:
+                    with self._lock:
+                        self._created -= 1
+                    self.last_error = str(e)
+                    raise
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeoutError(f"No database connection became free within {self.timeout}s.")
+
+        try:
+            conn.ping(reconnect=True)
+        except Exception as e:
+            self._discard(conn)
+            self.last_error = str(e)
+            raise
+        return conn
+
+    def release(self, conn: pymysql.connections.Connection, broken: bool = False) -> None:
+        """Returns a borrowed connection, closing it instead if it is broken or the pool is closed."""
+        if not broken and not self._closed:
+            try:
+                conn.rollback()
+                self._idle.put(conn)
+                return
+            except Exception as e:
+                self.last_error = str(e)
+        self._discard(conn)
+
+    def _discard(self, conn: pymysql.connections.Connection) -> None:
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self) -> Iterator[pymysql.connections.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            self.release(conn, broken=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def check(self) -> bool:
+        """Runs a trivial query on a pooled connection; records the error if it fails."""
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    def close(self) -> None:
+        """Closes every idle connection; borrowed ones are closed as they are returned."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "open": self._created,
+            "idle": idle,
+            "in_use": self._created - idle,
+            "closed": self._closed,
+            "last_error": self.last_error,
+        }
+
+
+# Created by start_service() for the web app and the worker; one-off CLI commands
+# leave it unset and open a single connection each time.
+db_pool: Optional[ConnectionPool] = None
+
+@contextmanager
+def open_connection() -> Iterator[pymysql.connections.Connection]:
+    """Yields a database connection from the pool if one is running, else a fresh one."""
+    pool = db_pool
+    if pool is not None:
+        with pool.connection() as conn:
+            yield conn
+        return
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def as_place_ids(values: Any) -> np.ndarray:
+    """
+    Converts place IDs to the service's single place-ID type, str.
+
+    The catalogue keys places by Google's text place IDs, so interaction rows
+    (whose column may be numeric) are converted before they meet catalogue IDs.
+    """
+    return np.asarray(values).astype(str)
+
+def fetch_interactions(since: Optional[Any] = None) -> Tuple[np.ndarray, np.ndarray, Optional[Any]]:
+    """
+    Fetches user interaction rows from the database.
+
+    Only rows whose watermark column is greater than `since` are returned, so
+    repeated calls can pull just the rows added since the previous fetch.
+
+    Args:
+        since (Optional[Any]): The last watermark seen, or None for a full load.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, Optional[Any]]: The user_ids and place_ids of
+        the new rows, and the watermark of the last row (or None if there were none).
+    """
+    query = f"SELECT {DB_WATERMARK_COLUMN}, user_id, place_id FROM {DB_TABLE}"
+    params = None
+    if since is not None:
+        query += f" WHERE {DB_WATERMARK_COLUMN} > %s"
+        params = (since,)
+    query += f" ORDER BY {DB_WATERMARK_COLUMN}"
+
+    with open_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+    if not rows:
+        return np.array([]), as_place_ids([]), None
+    watermarks, user_ids, place_ids = zip(*rows)
+    return np.array(user_ids), as_place_ids(place_ids), watermarks[-1]
+
+@dataclass(frozen=True)
+class UserItemMatrix:
+    """
+    Binary user-item matrix in compressed sparse row form.
+
+    `matrix` has one row per user and one column per place, both in ascending
+    id order. `item_users` is the transposed copy (places x users) so the users
+    who touched a given place can be read without scanning every row.
+    """
+    matrix: sp.csr_matrix
+    item_users: sp.csr_matrix
+    user_ids: np.ndarray
+    place_ids: np.ndarray
+    user_index: SortedIdIndex
+    norms: np.ndarray
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The raw arrays behind the matrix, for publishing as a shared snapshot."""
+        return {
+            "matrix_indptr": self.matrix.indptr, "matrix_indices": self.matrix.indices,
+            "matrix_data": self.matrix.data, "item_users_indptr": self.item_users.indptr,
+            "item_users_indices": self.item_users.indices, "item_users_data": self.item_users.data,
+            "user_ids": self.user_ids, "place_ids": self.place_ids, "norms": self.norms,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "UserItemMatrix":
+        """Wraps arrays from `to_arrays` (typically memory-mapped) without copying them."""
+        shape = (len(arrays["user_ids"]), len(arrays["place_ids"]))
+        return cls(
+            matrix=sp.csr_matrix((arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]),
+                                 shape=shape, copy=False),
+            item_users=sp.csr_matrix((arrays["item_users_data"], arrays["item_users_indices"],
+                                      arrays["item_users_indptr"]), shape=shape[::-1], copy=False),
+            user_ids=arrays["user_ids"],
+            place_ids=arrays["place_ids"],
+            user_index=SortedIdIndex(arrays["user_ids"]),
+            norms=arrays["norms"],
+        )
+
+def build_user_item_matrix(user_ids: np.ndarray, place_ids: np.ndarray) -> UserItemMatrix:
     """
-    Fetches user interaction data and builds a user-item matrix.
+    Builds a binary sparse user-item matrix from interaction rows.
 
     Rows = users, Columns = places, Values = 1 if interacted, else 0.
-    Falls back to dummy data if the database connection fails.
+    """
+    user_ids, user_codes = np.unique(user_ids, return_inverse=True)
+    place_ids, place_codes = np.unique(place_ids, return_inverse=True)
+    data = np.ones(len(user_codes), dtype=np.float32)
+    matrix = sp.csr_matrix((data, (user_codes.ravel(), place_codes.ravel())), shape=(len(user_ids), len(place_ids)))
+    # Duplicate pairs are summed on construction; clamp back to binary
+    matrix.data[:] = 1.0
+
+    return UserItemMatrix(
+        matrix=matrix,
+        item_users=matrix.T.tocsr(),
+        user_ids=user_ids,
+        place_ids=place_ids,
+        user_index=SortedIdIndex(user_ids),
+        norms=np.sqrt(np.diff(matrix.indptr)).astype(np.float32),
+    )
+
+
+class BackgroundRefresher:
+    """
+    Base class for in-process caches that rebuild themselves on a timer.
+
+    Subclasses implement `refresh()`; `start()` runs it every
+    `refresh_interval` seconds on a daemon thread until `stop()` is called.
+    """
+    thread_name = "background-refresh"
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # The shared snapshot version being served, for stores that publish or map one
+        self.version: Optional[str] = None
+        self.mapped = False
+
+    def refresh(self):
+        raise NotImplementedError
+
+    def next_wait(self) -> float:
+        """Seconds until the next refresh; stores mapping another process's snapshots check more often."""
+        if self.mapped:
+            return min(self.refresh_interval, SNAPSHOT_POLL_SECONDS)
+        return self.refresh_interval
+
+    def start(self) -> None:
+        """Starts the background refresh thread if a positive interval is configured."""
+        if self.refresh_interval <= 0 or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background refresh thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.next_wait()):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Background {self.thread_name} failed: {e}")
+
+
+# --- Shared Snapshots ---
+
+# Set by start_service() when SNAPSHOT_DIR is configured.
+shared_snapshots: Optional[SnapshotDirectory] = None
+
+def follow_shared_snapshot(store: BackgroundRefresher, name: str,
+                           load: Callable[[Dict[str, np.ndarray], Dict[str, Any]], None]) -> bool:
+    """
+    Serves a store from the published snapshot `name` when another process is the builder.
+
+    Maps the live version through `load` if it is newer than the one the
+    store holds. A store with nothing loaded yet waits up to
+    SNAPSHOT_WAIT_SECONDS for the first version to be published.
 
     Returns:
-        pd.DataFrame: The user-item matrix.
+        bool: True if the store is served from the shared snapshot, False if
+        this process should build the data itself.
     """
+    shared = shared_snapshots
+    if shared is None or shared.try_lead():
+        return False
+    version = shared.current(name)
+    if version is None and not store.mapped:
+        version = shared.wait_for(name, SNAPSHOT_WAIT_SECONDS)
+        if version is None:
+            if not shared.is_leader:
+                print(f"No shared {name} snapshot was published in time. Building a local copy.")
+            return False
+    if version is None or version == store.version:
+        return True
     try:
-        # Connect to the database
-        conn = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
+        with timed(STAGE_SECONDS, "map_snapshot"):
+            arrays, meta = shared.load(name, version)
+            load(arrays, meta)
+    except (OSError, ValueError, KeyError) as e:
+        # Usually a version pruned between reading the pointer and mapping it; the next check finds the newer one
+        print(f"Mapping shared {name} snapshot {version} failed: {e}.")
+        return store.mapped
+    store.version = version
+    store.mapped = True
+    return True
+
+def publish_shared_snapshot(store: BackgroundRefresher, name: str, arrays: Dict[str, np.ndarray],
+                            meta: Dict[str, Any]) -> None:
+    """Publishes a freshly built snapshot for the other processes, if this process is the builder."""
+    store.mapped = False
+    shared = shared_snapshots
+    if shared is None or not shared.is_leader:
+        store.version = None
+        return
+    try:
+        with timed(STAGE_SECONDS, "publish_snapshot"):
+            store.version = shared.publish(name, arrays, meta)
+    except (OSError, ValueError) as e:
+        store.version = None
+        print(f"Publishing the {name} snapshot failed: {e}. Other workers keep the previous version.")
+
+
+@dataclass(frozen=True)
+class InteractionSnapshot:
+    """An immutable view of the interaction data that requests read from."""
+    user_item_matrix: UserItemMatrix
+    source: str
+    watermark: Optional[Any]
+    row_count: int
+    built_at: float
+    refresh_duration: float
+
+
+class InteractionStore(BackgroundRefresher):
+    """
+    Long-lived, in-process store of user interactions.
+
+    The store loads the full interaction table once, then pulls only the rows
+    added since its watermark, either from a background thread every
+    `refresh_interval` seconds or on demand via `refresh()`. Each refresh builds
+    a new `InteractionSnapshot` and swaps it in with a single assignment, so a
+    request that grabbed `store.snapshot` keeps a consistent view throughout.
+    """
+
+    thread_name = "interaction-refresh"
+
+    def __init__(self, refresh_interval: float = INTERACTION_REFRESH_SECONDS):
+        super().__init__(refresh_interval)
+        self._snapshot: Optional[InteractionSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> InteractionSnapshot:
+        """Returns the current snapshot, loading it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    def refresh(self, full: bool = False) -> InteractionSnapshot:
+        """
+        Pulls new interaction rows and swaps in a new snapshot if anything changed.
+
+        Falls back to dummy data if the first load fails or finds no rows. Once
+        real data has been loaded, a failed refresh keeps serving the previous
+        snapshot.
+
+        Args:
+            full (bool): Ignore the watermark and reload the whole table.
+
+        Returns:
+            InteractionSnapshot: The snapshot in effect after the refresh.
+        """
+        with self._refresh_lock:
+            if follow_shared_snapshot(self, "interactions", self._map):
+                return self._snapshot
+            started = time.perf_counter()
+            current = self._snapshot
+            # A process that took over building from another starts with a full load
+            incremental = not full and not self.mapped and current is not None and current.source == "database"
+            since = current.watermark if incremental else None
+
+            try:
+                with timed(STAGE_SECONDS, "fetch_interactions"):
+                    user_ids, place_ids, watermark = fetch_interactions(since)
+                if not incremental and len(user_ids) == 0:
+                    raise ValueError("No interaction data found in the database.")
+            except (pymysql.MySQLError, ValueError) as e:
+                self.last_error = str(e)
+                self.last_refresh_at = time.time()
+                if current is None:
+                    print(f"Database connection failed or no data: {e}. Falling back to dummy data.")
+                    DUMMY_DATA_FALLBACKS.inc(dataset="interactions")
+                    user_ids = np.array(DUMMY_INTERACTIONS['user_id'])
+                    place_ids = as_place_ids(DUMMY_INTERACTIONS['place_id'])
+                    self._publish(user_ids, place_ids, "dummy", None, started)
+                else:
+                    print(f"Interaction refresh failed: {e}. Keeping the current snapshot.")
+                return self._snapshot
+
+            self.last_error = None
+            self.last_refresh_at = time.time()
+            if incremental and len(user_ids) == 0:
+                return current
+
+            changed_users = None
+            if incremental:
+                changed_users = np.unique(user_ids)
+                # Merge the new rows with the pairs already held in the current matrix
+                previous = current.user_item_matrix
+                existing = previous.matrix.tocoo()
+                user_ids = np.concatenate([previous.user_ids[existing.row], user_ids])
+                place_ids = np.concatenate([previous.place_ids[existing.col], place_ids])
+            self._publish(user_ids, place_ids, "database", watermark, started, changed_users)
+            return self._snapshot
+
+    def _publish(self, user_ids: np.ndarray, place_ids: np.ndarray, source: str,
+                 watermark: Optional[Any], started: float, changed_users: Optional[np.ndarray] = None) -> None:
+        """
+        Builds a snapshot from the accumulated interaction pairs and swaps it in.
+
+        `changed_users` are the users with new rows since the previous
+        snapshot; their cached recommendations are dropped. None (a full
+        load) drops every cached recommendation.
+        """
+        with timed(STAGE_SECONDS, "build_matrix"):
+            user_item_matrix = build_user_item_matrix(user_ids, place_ids)
+        snapshot = InteractionSnapshot(
+            user_item_matrix=user_item_matrix,
+            source=source,
+            watermark=watermark,
+            row_count=int(user_item_matrix.matrix.nnz),
+            built_at=time.time(),
+            refresh_duration=time.perf_counter() - started,
         )
-        # Query to get all user-place interactions
-        query = f"SELECT DISTINCT user_id, place_id FROM {DB_TABLE}"
-        df = pd.read_sql(query, conn)
-        conn.close()
-        
-        if df.empty:
-            raise ValueError("No interaction data found in the database.")
-
-    except (pymysql.MySQLError, ValueError) as e:
-        print(f"Database connection failed or no data: {e}. Falling back to dummy data.")
-        df = pd.DataFrame(DUMMY_INTERACTIONS)
-
-    # Create the user-item matrix
-    # 1 if interacted, 0 otherwise
-    user_item_matrix = pd.crosstab(df['user_id'], df['place_id'])
-    # Ensure all values are binary
-    user_item_matrix[user_item_matrix > 0] = 1
-    
-    return user_item_matrix
+        self._snapshot = snapshot
+        recommendation_cache.invalidate(None if changed_users is None else changed_users.tolist())
+        arrays = user_item_matrix.to_arrays()
+        if changed_users is not None:
+            arrays["changed_user_ids"] = changed_users
+        publish_shared_snapshot(self, "interactions", arrays, {
+            "source": source, "watermark": watermark, "row_count": snapshot.row_count,
+            "built_at": snapshot.built_at, "refresh_duration": snapshot.refresh_duration,
+            "previous_version": self.version,
+        })
+
+    def _map(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """Swaps in a snapshot published by the builder process."""
+        self._snapshot = InteractionSnapshot(
+            user_item_matrix=UserItemMatrix.from_arrays(arrays),
+            source=meta["source"],
+            watermark=meta["watermark"],
+            row_count=meta["row_count"],
+            built_at=meta["built_at"],
+            refresh_duration=meta["refresh_duration"],
+        )
+        # Only the users changed since the version this process holds can be invalidated selectively
+        changed_users = arrays.get("changed_user_ids")
+        if changed_users is not None and self.version is not None and meta.get("previous_version") == self.version:
+            recommendation_cache.invalidate(changed_users.tolist())
+        else:
+            recommendation_cache.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarises the current snapshot and the most recent refresh."""
+        snapshot = self.snapshot
+        return {
+            "source": snapshot.source,
+            "watermark": snapshot.watermark,
+            "row_count": snapshot.row_count,
+            "users": int(snapshot.user_item_matrix.shape[0]),
+            "places": int(snapshot.user_item_matrix.shape[1]),
+            "snapshot_age_seconds": time.time() - snapshot.built_at,
+            "refresh_duration_seconds": snapshot.refresh_duration,
+            "refresh_interval_seconds": self.refresh_interval,
+            "last_refresh_at": self.last_refresh_at,
+            "last_error": self.last_error,
+            "snapshot_version": self.version,
+            "snapshot_mapped": self.mapped,
+        }
+
+
+interaction_store = InteractionStore()
+
+def get_user_item_matrix() -> UserItemMatrix:
+    """
+    Returns the user-item matrix from the current interaction snapshot.
+
+    Rows = users, Columns = places, Values = 1 if interacted, else 0.
+    The snapshot is loaded on first use and kept fresh by `interaction_store`.
+
+    Returns:
+        UserItemMatrix: The sparse user-item matrix.
+    """
+    return interaction_store.snapshot.user_item_matrix
+
+# --- Place Catalogue & Spatial Index ---
+
+def fetch_places() -> Dict[str, list]:
+    """
+    Fetches every place with coordinates from the catalogue table.
+
+    Returns:
+        Dict[str, list]: Column name -> values, in the same shape as `DUMMY_PLACES`.
+    """
+    columns = ['place_id', 'place_name', 'latitude', 'longitude', 'category', 'rating', 'price_level',
+               'open_intervals']
+    query = (
+        "SELECT {} FROM " + CATALOGUE_TABLE + " "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+    with open_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(query.format(', '.join(columns)))
+            except pymysql.MySQLError as e:
+                if e.args[0] != 1054:  # ER_BAD_FIELD_ERROR: the table predates open_intervals
+                    raise
+                print("Places have no open_intervals column yet; run load_places.py to add it. "
+                      "Treating all opening hours as unknown.")
+                cursor.execute(query.format(', '.join(columns[:-1] + ['NULL AS open_intervals'])))
+            rows = cursor.fetchall()
+    return {column: list(values) for column, values in zip(columns, zip(*rows))} if rows else {}
+
+@dataclass(frozen=True)
+class PlaceCatalogue:
+    """Place attributes as parallel arrays, plus spatial and opening-hours indexes over them."""
+    place_ids: np.ndarray
+    names: np.ndarray
+    categories: np.ndarray
+    ratings: np.ndarray
+    price_levels: np.ndarray
+    place_index: Dict[Any, int]
+    geo: GeoIndex
+    hours: OpeningHoursIndex
+    source: str
+    built_at: float
+
+    def describe(self, positions: np.ndarray, distances: np.ndarray) -> List[Dict[str, Any]]:
+        """Turns catalogue positions into JSON-ready place summaries."""
+        ratings = self.ratings[positions]
+        return [
+            {
+                "place_id": place_id,
+                "name": name,
+                "category": category,
+                "rating": None if np.isnan(rating) else rating,
+                "distance_m": round(distance, 1),
+            }
+            for place_id, name, category, rating, distance in zip(
+                self.place_ids[positions].tolist(), self.names[positions].tolist(),
+                self.categories[positions].tolist(), ratings.tolist(), distances.tolist()
+            )
+        ]
+
+def build_place_catalogue(places: Dict[str, list], source: str) -> PlaceCatalogue:
+    """Builds the catalogue arrays and indexes from fetched place columns."""
+    place_ids = as_place_ids(places['place_id'])
+    categories = np.array([c or 'Others' for c in places['category']], dtype=object)
+    latitudes = np.array(places['latitude'], dtype=np.float64)
+    longitudes = np.array(places['longitude'], dtype=np.float64)
+    return PlaceCatalogue(
+        place_ids=place_ids,
+        names=np.array(places['place_name'], dtype=object),
+        categories=categories,
+        ratings=np.array([np.nan if r is None else r for r in places['rating']], dtype=np.float64),
+        price_levels=np.array([np.nan if p is None else p for p in places['price_level']], dtype=np.float64),
+        place_index={place_id: i for i, place_id in enumerate(place_ids.tolist())},
+        geo=GeoIndex(latitudes, longitudes, categories),
+        hours=OpeningHoursIndex(places.get('open_intervals') or [None] * len(place_ids)),
+        source=source,
+        built_at=time.time(),
+    )
+
+
+class CatalogueStore(BackgroundRefresher):
+    """
+    Holds the current `PlaceCatalogue`, reloading it from the database periodically.
+
+    The catalogue changes far more slowly than interactions, so it is simply
+    reloaded in full and swapped in with a single assignment.
+    """
+    thread_name = "catalogue-refresh"
+
+    def __init__(self, refresh_interval: float = CATALOGUE_REFRESH_SECONDS):
+        super().__init__(refresh_interval)
+        self._catalogue: Optional[PlaceCatalogue] = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def catalogue(self) -> PlaceCatalogue:
+        """Returns the current catalogue, loading it on first use."""
+        catalogue = self._catalogue
+        if catalogue is None:
+            self.refresh()
+            catalogue = self._catalogue
+        return catalogue
+
+    def refresh(self) -> PlaceCatalogue:
+        """Reloads the catalogue. Falls back to dummy places if the first load fails."""
+        with self._refresh_lock:
+            try:
+                with timed(STAGE_SECONDS, "fetch_places"):
+                    places = fetch_places()
+                if not places:
+                    raise ValueError("No places found in the database.")
+                with timed(STAGE_SECONDS, "build_catalogue"):
+                    self._catalogue = build_place_catalogue(places, "database")
+            except (pymysql.MySQLError, ValueError) as e:
+                if self._catalogue is None:
+                    print(f"Place catalogue load failed: {e}. Falling back to dummy places.")
+                    DUMMY_DATA_FALLBACKS.inc(dataset="places")
+                    self._catalogue = build_place_catalogue(DUMMY_PLACES, "dummy")
+                else:
+                    print(f"Place catalogue refresh failed: {e}. Keeping the current catalogue.")
+            return self._catalogue
+
+
+catalogue_store = CatalogueStore()
+
+# --- Full-Text Search ---
+
+def fetch_reviews(since: Optional[Any] = None) -> Tuple[List[Tuple[Any, Optional[str]]], Optional[Any]]:
+    """
+    Fetches review text from the review table, in insertion order.
+
+    A review table without the watermark column (created before load_places.py
+    added review_id) is read in full, with no watermark.
+
+    Args:
+        since (Optional[Any]): Only return reviews whose watermark column is greater than this.
+
+    Returns:
+        Tuple[List[Tuple[Any, Optional[str]]], Optional[Any]]: (place_id, review_text) pairs
+        and the watermark of the last one (or None if there were none).
+    """
+    query = f"SELECT {REVIEW_WATERMARK_COLUMN}, place_id, review_text FROM {REVIEW_TABLE}"
+    params = None
+    if since is not None:
+        query += f" WHERE {REVIEW_WATERMARK_COLUMN} > %s"
+        params = (since,)
+    query += f" ORDER BY {REVIEW_WATERMARK_COLUMN}"
+    with open_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(query, params)
+            except pymysql.MySQLError as e:
+                if e.args[0] != 1054 or since is not None:  # ER_BAD_FIELD_ERROR: the table predates review_id
+                    raise
+                print(f"Reviews have no {REVIEW_WATERMARK_COLUMN} column yet; run load_places.py to add it. "
+                      "New reviews are indexed when the place catalogue is reloaded.")
+                cursor.execute(f"SELECT NULL, place_id, review_text FROM {REVIEW_TABLE}")
+            rows = cursor.fetchall()
+    return [(place_id, text) for _, place_id, text in rows], (rows[-1][0] if rows else None)
+
+def count_reviews(through: Any) -> int:
+    """Counts the reviews whose watermark column is at most `through`."""
+    with open_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {REVIEW_TABLE} WHERE {REVIEW_WATERMARK_COLUMN} <= %s", (through,))
+            return int(cursor.fetchall()[0][0])
+
+@dataclass(frozen=True)
+class SearchSnapshot:
+    """A search index, the catalogue its document positions refer to, and how many reviews it holds."""
+    index: SearchIndex
+    catalogue: PlaceCatalogue
+    source: str
+    built_at: float
+    review_count: int = 0
+
+
+class SearchIndexStore(BackgroundRefresher):
+    """
+    Holds the BM25 index over place names, categories and reviews.
+
+    The index is built in full whenever the place catalogue changes. In
+    between, each refresh pulls only the reviews added since the index's
+    watermark and folds them in with `SearchIndex.with_reviews`, which is
+    cheap enough to run every few seconds. Reviews can only be added that
+    way, so if any indexed review has since been deleted (load_places.py
+    replaces the reviews of a changed place) the index is rebuilt instead.
+    The new snapshot is swapped in with a single assignment.
+    """
+    thread_name = "search-index-refresh"
+
+    def __init__(self, refresh_interval: float = SEARCH_REFRESH_SECONDS):
+        super().__init__(refresh_interval)
+        self._snapshot: Optional[SearchSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> SearchSnapshot:
+        """Returns the current snapshot, building it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    def refresh(self, full: bool = False) -> SearchSnapshot:
+        """
+        Adds new reviews to the index, or rebuilds it if the catalogue changed or reviews were deleted.
+
+        Args:
+            full (bool): Rebuild from every review even if the catalogue is unchanged.
+        """
+        with self._refresh_lock:
+            catalogue = catalogue_store.catalogue
+            current = self._snapshot
+            if full or current is None or current.catalogue is not catalogue:
+                self._snapshot = self._build(catalogue)
+                return self._snapshot
+
+            # Without a watermark (no reviews yet, or no watermark column) new reviews wait for the next build
+            if current.source != "database" or current.index.watermark is None:
+                return current
+            try:
+                with timed(STAGE_SECONDS, "fetch_reviews"):
+                    deleted = count_reviews(current.index.watermark) != current.review_count
+                    if not deleted:
+                        reviews, watermark = fetch_reviews(current.index.watermark)
+            except pymysql.MySQLError as e:
+                self.last_error = str(e)
+                print(f"Search index refresh failed: {e}. Keeping the current index.")
+                return current
+            self.last_error = None
+            if deleted:
+                self._snapshot = self._build(catalogue)
+            elif reviews:
+                with timed(STAGE_SECONDS, "update_search_index"):
+                    index = current.index.with_reviews(reviews, watermark)
+                self._snapshot = SearchSnapshot(index, catalogue, current.source, time.time(),
+                                                current.review_count + len(reviews))
+            return self._snapshot
+
+    def _build(self, catalogue: PlaceCatalogue) -> SearchSnapshot:
+        source = catalogue.source
+        watermark = None
+        try:
+            if source != "database":
+                raise ValueError("The place catalogue is not loaded from the database.")
+            with timed(STAGE_SECONDS, "fetch_reviews"):
+                reviews, watermark = fetch_reviews()
+            self.last_error = None
+        except (pymysql.MySQLError, ValueError) as e:
+            self.last_error = str(e)
+            print(f"Review load failed: {e}. Indexing dummy reviews.")
+            DUMMY_DATA_FALLBACKS.inc(dataset="reviews")
+            reviews = list(zip(DUMMY_REVIEWS['place_id'], DUMMY_REVIEWS['review_text']))
+            source = "dummy"
+        with timed(STAGE_SECONDS, "build_search_index"):
+            index = SearchIndex.build(catalogue.place_ids, catalogue.names, catalogue.categories, reviews, watermark)
+        return SearchSnapshot(index, catalogue, source, time.time(), len(reviews))
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        index = snapshot.index
+        return {
+            "source": snapshot.source,
+            "places": len(index.place_ids),
+            "terms": len(index.main.terms),
+            "postings": index.nnz,
+            "delta_postings": index.delta.nnz if index.delta is not None else 0,
+            "watermark": index.watermark,
+            "snapshot_age_seconds": time.time() - snapshot.built_at,
+            "last_error": self.last_error,
+        }
+
+
+search_store = SearchIndexStore()
+
+def search_places(q: str, category: Optional[str] = None, limit: int = 10,
+                  prefix: bool = True) -> List[Dict[str, Any]]:
+    """
+    Full-text search over place names, categories and reviews, ranked by BM25.
+
+    Returns:
+        List[Dict[str, Any]]: Up to `limit` places, best match first, each with its score.
+    """
+    snapshot = search_store.snapshot
+    catalogue = snapshot.catalogue
+    with timed(STAGE_SECONDS, "search"):
+        positions, scores = snapshot.index.search(q, category=category, limit=limit, prefix=prefix)
+    ratings = catalogue.ratings[positions]
+    return [
+        {
+            "place_id": place_id,
+            "name": name,
+            "category": category,
+            "rating": None if np.isnan(rating) else rating,
+            "score": round(score, 4),
+        }
+        for place_id, name, category, rating, score in zip(
+            catalogue.place_ids[positions].tolist(), catalogue.names[positions].tolist(),
+            catalogue.categories[positions].tolist(), ratings.tolist(), scores.tolist()
+        )
+    ]
+
+# --- Content Similarity ---
+
+def build_content_index(catalogue: PlaceCatalogue, reviews: Iterable[Tuple[Any, Optional[str]]]) -> ContentIndex:
+    """Builds the content index over every catalogued place from its attributes and review text."""
+    place_index = catalogue.place_index
+    with timed(STAGE_SECONDS, "build_content_vectors"):
+        vectors = build_place_vectors(
+            catalogue.categories, catalogue.price_levels, catalogue.ratings,
+            ((place_index[place_id], text) for place_id, text in reviews if place_id in place_index),
+        )
+    with timed(STAGE_SECONDS, "build_content_index"):
+        return ContentIndex.build(catalogue.place_ids, vectors)
+
+@dataclass(frozen=True)
+class ContentSnapshot:
+    """A content index and what it was built from, for deciding when to rebuild."""
+    index: ContentIndex
+    catalogue: Optional[PlaceCatalogue]
+    file_mtime: Optional[float]
+    built_at: float
+
+
+class ContentIndexStore(BackgroundRefresher):
+    """
+    Holds the `ContentIndex` behind content-based "similar places".
+
+    With CONTENT_INDEX_PATH set, the index is built offline and reloaded
+    whenever the file changes. Otherwise it is rebuilt in the background
+    whenever the place catalogue changes; review text is read once per
+    rebuild. Either way the new index is swapped in with a single assignment.
+    """
+    thread_name = "content-index-refresh"
+
+    def __init__(self, refresh_interval: float = CONTENT_INDEX_REFRESH_SECONDS, path: str = CONTENT_INDEX_PATH):
+        super().__init__(refresh_interval)
+        self.path = path
+        self._snapshot: Optional[ContentSnapshot] = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def index(self) -> ContentIndex:
+        """Returns the current index, building it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot.index
+
+    def refresh(self) -> ContentIndex:
+        """Reloads or rebuilds the index if its source has changed since the last build."""
+        with self._refresh_lock:
+            current = self._snapshot
+            if self.path:
+                mtime = os.path.getmtime(self.path)
+                if current is None or current.file_mtime != mtime:
+                    with timed(STAGE_SECONDS, "load_content_index"):
+                        index = ContentIndex.load(self.path)
+                    self._snapshot = ContentSnapshot(index, None, mtime, time.time())
+                return self._snapshot.index
+
+            catalogue = catalogue_store.catalogue
+            if current is None or current.catalogue is not catalogue:
+                self._snapshot = ContentSnapshot(
+                    build_content_index(catalogue, load_reviews(catalogue)), catalogue, None, time.time()
+                )
+            return self._snapshot.index
+
+
+content_index_store = ContentIndexStore()
+
+def load_reviews(catalogue: PlaceCatalogue) -> List[Tuple[Any, Optional[str]]]:
+    """Every review, or the dummy reviews when the catalogue itself is the dummy one or the query fails."""
+    if catalogue.source == "database":
+        try:
+            with timed(STAGE_SECONDS, "fetch_reviews"):
+                return fetch_reviews()[0]
+        except pymysql.MySQLError as e:
+            print(f"Review load failed: {e}. Building content vectors without reviews.")
+            return []
+    return list(zip(DUMMY_REVIEWS['place_id'], DUMMY_REVIEWS['review_text']))
+
+def content_similar_places(place_id: str, top_n: int = 10, allowed: Optional[np.ndarray] = None) -> Optional[List[str]]:
+    """
+    Returns the places whose category, price, rating and reviews are most like `place_id`'s.
+
+    Unlike `similar_places` this needs no interactions, so it covers every catalogued place.
+
+    Returns:
+        Optional[List[str]]: Similar place IDs, or None if the place is not in the content index.
+    """
+    index = content_index_store.index
+    mask = np.isin(index.place_ids, allowed) if allowed is not None else None
+    with timed(STAGE_SECONDS, "content_similarity"):
+        found = index.similar(place_id, top_n, allowed=mask)
+    return None if found is None else found[0].tolist()
+
+def nearby_places(lat: float, lng: float, k: int = 10, radius_m: Optional[float] = None,
+                  category: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Finds the places nearest to a point, optionally limited to a radius and a category.
+
+    Returns:
+        List[Dict[str, Any]]: Up to `k` places, nearest first, each with its distance in metres.
+    """
+    catalogue = catalogue_store.catalogue
+    if radius_m is None:
+        positions, distances = catalogue.geo.nearest(lat, lng, k=k, category=category)
+    else:
+        positions, distances = catalogue.geo.within(lat, lng, radius_m, category=category)
+        positions, distances = positions[:k], distances[:k]
+    return catalogue.describe(positions, distances)
+
+def validate_location(lat: Optional[float], lng: Optional[float], radius_m: Optional[float],
+                      required: bool = False) -> None:
+    """Raises ValueError for an incomplete or out-of-range location filter."""
+    if (lat is None) != (lng is None):
+        raise ValueError("lat and lng must be given together.")
+    if lat is None:
+        if required:
+            raise ValueError("lat and lng are required.")
+        if radius_m is not None:
+            raise ValueError("radius_m requires lat and lng.")
+        return
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError("lat must be within [-90, 90] and lng within [-180, 180].")
+    if radius_m is not None and radius_m <= 0:
+        raise ValueError("radius_m must be positive.")
+
+def open_minute(open_now: bool = False, open_at: Optional[datetime] = None) -> Optional[int]:
+    """
+    Resolves the "open now" / "open at" request parameters to a week minute (see `week_minute`).
+
+    Returns:
+        Optional[int]: The minute, or None if no opening-hours filter was asked for.
+    """
+    if open_at is not None:
+        return week_minute(open_at)
+    return week_minute() if open_now else None
+
+def open_mask(catalogue: PlaceCatalogue, minute: int, positions: Optional[np.ndarray] = None,
+              include_unknown: bool = False) -> np.ndarray:
+    """Which of the catalogue places at `positions` (default: all) are open at `minute`."""
+    is_open = catalogue.hours.open_at(minute, positions)
+    if include_unknown:
+        is_open |= ~(catalogue.hours.known if positions is None else catalogue.hours.known[positions])
+    return is_open
+
+def allowed_places(lat: Optional[float] = None, lng: Optional[float] = None, radius_m: Optional[float] = None,
+                   category: Optional[str] = None, open_at: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Resolves location, category and opening-hours filters to the place IDs that satisfy them.
+
+    Args:
+        open_at (Optional[int]): Only allow places open at this week minute. Places whose
+            hours are unknown are left out.
+
+    Returns:
+        Optional[np.ndarray]: Matching place IDs (nearest first when filtering by location),
+        or None if no filter was given.
+    """
+    if lat is None and category is None and open_at is None:
+        return None
+    catalogue = catalogue_store.catalogue
+    if lat is not None:
+        positions, _ = catalogue.geo.within(lat, lng, radius_m or DEFAULT_RADIUS_M, category=category)
+    elif category is not None:
+        positions = catalogue.geo.categories.get(category, (None, np.array([], dtype=np.int64)))[1]
+    else:
+        return catalogue.place_ids[np.flatnonzero(open_mask(catalogue, open_at))]
+    if open_at is not None:
+        positions = positions[open_mask(catalogue, open_at, positions)]
+    return catalogue.place_ids[positions]
+
+def open_places(place_ids: Optional[List[str]] = None, at: Optional[datetime] = None,
+                include_unknown: bool = False) -> List[str]:
+    """
+    Filters places down to those open at a given time.
+
+    Args:
+        place_ids (Optional[List[str]]): The places to test, in the order to return them;
+            every catalogued place if None. IDs not in the catalogue are dropped.
+        at (Optional[datetime]): The time to test (default: now). Naive times are Singapore time.
+        include_unknown (bool): Also return places whose opening hours are unknown.
+
+    Returns:
+        List[str]: The IDs of the places that are open.
+    """
+    catalogue = catalogue_store.catalogue
+    minute = week_minute(at)
+    if place_ids is None:
+        return catalogue.place_ids[np.flatnonzero(open_mask(catalogue, minute, include_unknown=include_unknown))].tolist()
+    positions = np.array([p for p in (catalogue.place_index.get(place_id) for place_id in place_ids) if p is not None],
+                         dtype=np.int64)
+    is_open = open_mask(catalogue, minute, positions, include_unknown=include_unknown)
+    return catalogue.place_ids[positions[is_open]].tolist()
+
+def fallback_places(top_n: int, allowed: Optional[np.ndarray] = None) -> List[str]:
+    """
+    Places to show when collaborative filtering has nothing to offer.
+
+    Without filters these are the mock top-rated places; with filters they are
+    the best-rated places that pass them.
+    """
+    if allowed is None:
+        return MOCK_TOP_RATED_PLACES[:top_n]
+    catalogue = catalogue_store.catalogue
+    positions = np.array([catalogue.place_index[p] for p in allowed.tolist()], dtype=np.int64)
+    ratings = np.nan_to_num(catalogue.ratings[positions], nan=-1.0)
+    order = np.argsort(-ratings, kind="stable")[:top_n]
+    return catalogue.place_ids[positions[order]].tolist()
+
 
 # --- Machine Learning & Recommendation Logic ---
 
-def recommend_for_user(user_id: int, top_n: int = 5) -> List[int]:
+def top_n_indices(scores: np.ndarray, candidates: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Picks the `top_n` highest-scoring candidates without sorting all of them.
+
+    Ties are broken by ascending candidate index (i.e. ascending place_id),
+    including ties at the cut-off: every candidate scoring above the
+    `top_n`-th score is kept, then the lowest-index candidates scoring
+    exactly that. A prefix of the result is therefore the result for a
+    smaller `top_n`.
+    """
+    if len(candidates) > top_n:
+        candidate_scores = scores[candidates]
+        cutoff = -np.partition(-candidate_scores, top_n - 1)[top_n - 1]
+        above = candidates[candidate_scores > cutoff]
+        tied = np.sort(candidates[candidate_scores == cutoff])[:top_n - len(above)]
+        candidates = np.concatenate([above, tied])
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+def score_candidates(user_item_matrix: UserItemMatrix, row: int) -> np.ndarray:
+    """
+    Scores every place for one user by user-user collaborative filtering.
+
+    Only the target user's cosine similarity row is computed: the users sharing
+    at least one place are found through `item_users`, and the candidate
+    scores are the similarity-weighted sum of those users' rows, computed as a
+    single sparse matrix-vector product. Places the user has already
+    interacted with score 0.
+
+    Returns:
+        np.ndarray: One score per column of the matrix.
+    """
+    matrix = user_item_matrix.matrix
+    seen = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+
+    # 1. Compute the target user's similarity to every other user
+    # For binary rows, cosine = shared places / (|a| * |b|)
+    with timed(STAGE_SECONDS, "similarity"):
+        overlap = np.asarray(user_item_matrix.item_users[seen].sum(axis=0)).ravel()
+        overlap[row] = 0
+        neighbours = np.flatnonzero(overlap)
+        similarity = overlap[neighbours] / (user_item_matrix.norms[neighbours] * user_item_matrix.norms[row])
+
+    # 2. Aggregate candidate scores over the similar users' places
+    with timed(STAGE_SECONDS, "scoring"):
+        scores = matrix[neighbours].T.dot(similarity)
+
+        # 3. Mask out places the user has already seen
+        scores[seen] = 0
+    return scores
+
+@dataclass(frozen=True)
+class ItemNeighbourIndex:
+    """
+    Top-K most similar places for every place, stored as compact arrays.
+
+    Row `i` of `neighbours` holds column positions (into `place_ids`) of the
+    places most similar to `place_ids[i]`, best first, padded with -1.
+    `scores` holds the matching cosine similarities.
+    """
+    place_ids: np.ndarray
+    place_index: SortedIdIndex
+    neighbours: np.ndarray
+    scores: np.ndarray
+    source_built_at: float
+    built_at: float
+    build_duration: float
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "ItemNeighbourIndex":
+        """Wraps a published index (typically memory-mapped) without copying it."""
+        return cls(
+            place_ids=arrays["place_ids"],
+            place_index=SortedIdIndex(arrays["place_ids"]),
+            neighbours=arrays["neighbours"],
+            scores=arrays["scores"],
+            source_built_at=meta["source_built_at"],
+            built_at=meta["built_at"],
+            build_duration=meta["build_duration"],
+        )
+
+def build_item_neighbour_index(user_item_matrix: UserItemMatrix, k: int = ITEM_NEIGHBOURS_K,
+                               block_size: int = 256, source_built_at: float = 0.0) -> ItemNeighbourIndex:
+    """
+    Computes the item-item cosine similarity in blocks of places and keeps the top-K per place.
+
+    Working memory is bounded by `block_size` x number of places, so the full
+    places x places similarity matrix is never materialised.
+    """
+    started = time.perf_counter()
+    item_users = user_item_matrix.item_users
+    n_places = item_users.shape[0]
+    k = max(0, min(k, n_places - 1))
+    norms = np.sqrt(np.diff(item_users.indptr)).astype(np.float32)
+    norms[norms == 0] = 1.0
+
+    neighbours = np.full((n_places, k), -1, dtype=np.int32)
+    scores = np.zeros((n_places, k), dtype=np.float32)
+    item_users_t = item_users.T.tocsr()
+    for start in range(0, n_places if k else 0, block_size):
+        stop = min(start + block_size, n_places)
+        # Co-occurrence counts for this block of places against every place
+        block = item_users[start:stop].dot(item_users_t).toarray().astype(np.float32)
+        block /= norms[start:stop, None] * norms[None, :]
+        block[np.arange(stop - start), np.arange(start, stop)] = 0
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        top[top_scores <= 0] = -1
+        neighbours[start:stop] = top
+        scores[start:stop] = np.maximum(top_scores, 0)
+
+    place_ids = user_item_matrix.place_ids
+    return ItemNeighbourIndex(
+        place_ids=place_ids,
+        place_index=SortedIdIndex(place_ids),
+        neighbours=neighbours,
+        scores=scores,
+        source_built_at=source_built_at,
+        built_at=time.time(),
+        build_duration=time.perf_counter() - started,
+    )
+
+
+class ItemIndexStore(BackgroundRefresher):
+    """
+    Holds the current `ItemNeighbourIndex` and rebuilds it off the request path.
+
+    Rebuilds read the latest interaction snapshot and are skipped when that
+    snapshot has not changed since the last build. The new index replaces the
+    old one with a single assignment.
+    """
+    thread_name = "item-index-rebuild"
+
+    def __init__(self, refresh_interval: float = ITEM_INDEX_REFRESH_SECONDS, k: int = ITEM_NEIGHBOURS_K):
+        super().__init__(refresh_interval)
+        self.k = k
+        self._index: Optional[ItemNeighbourIndex] = None
+        self._rebuild_lock = threading.Lock()
+
+    @property
+    def index(self) -> ItemNeighbourIndex:
+        """Returns the current index, building it on first use."""
+        index = self._index
+        if index is None:
+            self.refresh()
+            index = self._index
+        return index
+
+    def refresh(self) -> ItemNeighbourIndex:
+        """Rebuilds the index if the interaction snapshot has changed since the last build."""
+        with self._rebuild_lock:
+            if follow_shared_snapshot(self, "item_index", self._map):
+                return self._index
+            snapshot = interaction_store.snapshot
+            current = self._index
+            if current is not None and current.source_built_at == snapshot.built_at:
+                return current
+            with timed(STAGE_SECONDS, "build_item_index"):
+                index = build_item_neighbour_index(
+                    snapshot.user_item_matrix, k=self.k, source_built_at=snapshot.built_at
+                )
+            self._index = index
+            publish_shared_snapshot(
+                self, "item_index",
+                {"place_ids": index.place_ids, "neighbours": index.neighbours, "scores": index.scores},
+                {"source_built_at": index.source_built_at, "built_at": index.built_at,
+                 "build_duration": index.build_duration},
+            )
+            return self._index
+
+    def _map(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """Swaps in an index published by the builder process."""
+        self._index = ItemNeighbourIndex.from_arrays(arrays, meta)
+
+
+item_index_store = ItemIndexStore()
+
+def similar_places(place_id: str, top_n: int = 10) -> Optional[List[str]]:
+    """
+    Returns the places most often interacted with alongside `place_id`.
+
+    Returns:
+        Optional[List[str]]: Similar place IDs, or None if the place is unknown.
+    """
+    index = item_index_store.index
+    row = index.place_index.get(place_id)
+    if row is None:
+        return None
+    neighbours = index.neighbours[row, :top_n]
+    return index.place_ids[neighbours[neighbours >= 0]].tolist()
+
+def score_candidates_by_item(user_item_matrix: UserItemMatrix, row: int, index: ItemNeighbourIndex) -> np.ndarray:
+    """
+    Scores every place for one user by merging the neighbour lists of the places they interacted with.
+
+    Returns:
+        np.ndarray: One score per place of the item index.
+    """
+    matrix = user_item_matrix.matrix
+    seen_place_ids = user_item_matrix.place_ids[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]]
+    seen = np.array([index.place_index[p] for p in seen_place_ids.tolist() if p in index.place_index], dtype=np.int64)
+
+    neighbours = index.neighbours[seen].ravel()
+    weights = index.scores[seen].ravel()
+    valid = neighbours >= 0
+    scores = np.bincount(neighbours[valid], weights=weights[valid], minlength=len(index.place_ids))
+    scores[seen] = 0
+    return scores
+
+def recommend_for_user(user_id: int, top_n: int = 5, mode: str = RECOMMENDER_MODE,
+                       allowed: Optional[np.ndarray] = None, seed_place_id: Optional[str] = None) -> List[str]:
     """
     Generates personalized recommendations for a given user.
 
     Args:
         user_id (int): The ID of the user to generate recommendations for.
         top_n (int): The number of recommendations to return.
+        mode (str): "user" for user-user filtering, "item" for the item-item neighbour index.
+        allowed (Optional[np.ndarray]): If given, only these place IDs may be recommended
+            (see `allowed_places`).
+        seed_place_id (Optional[str]): A place the user has just shown interest in (e.g. clicked).
+            Users with no interactions get places like it instead of the top-rated ones.
 
     Returns:
-        List[int]: A list of recommended place IDs.
+        List[str]: A list of recommended place IDs.
     """
     user_item_matrix = get_user_item_matrix()
 
     # --- Cold Start Strategy ---
     # If the user is new or has no interactions, fall back to top-rated places.
-    if user_id not in user_item_matrix.index:
+    row = user_item_matrix.user_index.get(user_id)
+    if row is None and seed_place_id is not None:
+        COLD_STARTS.inc()
+        places = content_similar_places(seed_place_id, top_n, allowed)
+        if places:
+            return places
+        FALLBACKS.inc(reason="cold_start")
+        return fallback_places(top_n, allowed)
+    if row is None:
         print(f"Cold start for user_id: {user_id}. Returning mock top-rated places.")
-        return MOCK_TOP_RATED_PLACES[:top_n]
+        COLD_STARTS.inc()
+        FALLBACKS.inc(reason="cold_start")
+        return fallback_places(top_n, allowed)
 
-    # --- Collaborative Filtering Strategy ---
-    
-    # 1. Compute User-to-User Similarity
-    # We transpose the matrix to calculate similarity between users
-    user_similarity = cosine_similarity(user_item_matrix)
-    user_similarity_df = pd.DataFrame(user_similarity, index=user_item_matrix.index, columns=user_item_matrix.index)
-
-    # 2. Find Similar Users
-    # Get similarity scores for the target user, but exclude the user themselves
-    similar_users = user_similarity_df[user_id].sort_values(ascending=False).drop(user_id)
-    
-    if similar_users.empty:
-        print(f"No similar users found for user_id: {user_id}. Returning mock top-rated places.")
-        return MOCK_TOP_RATED_PLACES[:top_n]
+    # --- Item-Based Strategy ---
+    if mode == "item":
+        index = item_index_store.index
+        with timed(STAGE_SECONDS, "item_scoring"):
+            scores = score_candidates_by_item(user_item_matrix, row, index)
+        place_ids = index.place_ids
+    else:
+        if user_item_matrix.shape[0] < 2:
+            print(f"No similar users found for user_id: {user_id}. Returning mock top-rated places.")
+            FALLBACKS.inc(reason="no_similar_users")
+            return fallback_places(top_n, allowed)
 
-    # 3. Generate Recommendations
-    
-    # Get places the target user has already interacted with
-    user_interacted_items = user_item_matrix.loc[user_id]
-    user_interacted_items = user_interacted_items[user_interacted_items > 0].index.tolist()
-
-    recommendations = {}
-    # Loop through similar users and their items
-    for other_user_id, similarity_score in similar_users.items():
-        if similarity_score <= 0:
-            continue
-        
-        # Get items interacted with by the similar user
-        other_user_items = user_item_matrix.loc[other_user_id]
-        other_user_items = other_user_items[other_user_items > 0].index
-
-        for place_id in other_user_items:
-            # Add to recommendations if the target user hasn't seen it yet
-            if place_id not in user_interacted_items:
-                # Weight the item by the similarity score
-                if place_id not in recommendations:
-                    recommendations[place_id] = 0
-                recommendations[place_id] += similarity_score
-
-    # 4. Sort and Return Top-N Recommendations
-    sorted_recommendations = sorted(recommendations.items(), key=lambda item: item[1], reverse=True)
-    
-    # Extract just the place IDs
-    recommended_place_ids = [place_id for place_id, score in sorted_recommendations]
-
-    return recommended_place_ids[:top_n]
+        # --- Collaborative Filtering Strategy ---
+        scores = score_candidates(user_item_matrix, row)
+        place_ids = user_item_matrix.place_ids
 
+    # Drop places outside the location/category filter
+    if allowed is not None:
+        with timed(STAGE_SECONDS, "filter"):
+            scores[~np.isin(place_ids, allowed)] = 0
 
-# --- FastAPI Microservice ---
+    # Sort and Return Top-N Recommendations
+    with timed(STAGE_SECONDS, "top_n"):
+        candidates = np.flatnonzero(scores > 0)
+        top = top_n_indices(scores, candidates, top_n)
+    return place_ids[top].tolist()
 
-app = FastAPI(
-    title="Tourism Recommendation API",
-    description="Provides personalized place recommendations based on user interactions.",
-    version="1.0.0"
-)
+def score_candidates_batch(user_item_matrix: UserItemMatrix, rows: np.ndarray) -> np.ndarray:
+    """
+    Scores every place for a block of users at once.
+
+    Equivalent to calling `score_candidates` for each row, but the similarity
+    columns and candidate scores for the whole block come from two sparse x
+    dense products, so the cost is one pass over the matrix per block instead
+    of one per user. The products are dense (users x block) and (places x
+    block) float32 arrays; `batch_block_size` bounds their size.
+
+    Returns:
+        np.ndarray: A (len(rows) x places) array of scores.
+    """
+    matrix = user_item_matrix.matrix
+    norms = user_item_matrix.norms
+    block = matrix[rows]
+    columns = np.arange(len(rows))
+
+    # Shared places between every user and each target user (users x block)
+    similarity = matrix.dot(block.T.toarray())
+    similarity[rows, columns] = 0
+    similarity /= norms[:, None] * norms[rows][None, :]
+
+    scores = user_item_matrix.item_users.dot(similarity).T
+    scores[block.nonzero()] = 0
+    return scores
+
+def batch_block_size(user_item_matrix: UserItemMatrix, chunk_size: int = BATCH_CHUNK_SIZE) -> int:
+    """The users per `score_candidates_batch` block that keep its dense arrays within BATCH_BLOCK_BYTES."""
+    n_users, n_places = user_item_matrix.shape
+    bytes_per_user = np.dtype(np.float32).itemsize * (n_users + n_places)
+    return max(1, min(chunk_size, BATCH_BLOCK_BYTES // bytes_per_user))
 
-@app.get("/recommendations", response_model=List[int])
-async def get_recommendations(user_id: int, top_n: int = 5):
+def recommend_for_users(user_ids: List[int], top_n: int = 5, mode: str = RECOMMENDER_MODE,
+                        chunk_size: int = BATCH_CHUNK_SIZE) -> Dict[int, List[str]]:
     """
-    Generates and returns a list of recommended place IDs for a given user.
+    Generates recommendations for many users against a single model snapshot.
 
-    - **user_id**: The unique identifier for the user.
-    - **top_n**: The number of recommendations to return (default: 5).
+    Users without interactions, or for whom no new places can be found, get
+    the mock top-rated places, matching the `/recommendations` endpoint.
+
+    Args:
+        user_ids (List[int]): The users to generate recommendations for.
+        top_n (int): The number of recommendations per user.
+        mode (str): "user" for user-user filtering, "item" for the item-item neighbour index.
+        chunk_size (int): Users scored together per block, at most; see `batch_block_size`.
+
+    Returns:
+        Dict[int, List[str]]: Recommended place IDs keyed by user ID.
+    """
+    user_item_matrix = get_user_item_matrix()
+    index = item_index_store.index if mode == "item" else None
+    fallback = MOCK_TOP_RATED_PLACES[:top_n]
+
+    results = dict.fromkeys(user_ids)
+    known = []
+    for user_id in user_ids:
+        row = user_item_matrix.user_index.get(user_id)
+        if row is None:
+            results[user_id] = fallback
+        else:
+            known.append((user_id, row))
+
+    if index is not None:
+        # Item scores are a cheap merge per user; stacking them would only add a dense block
+        for user_id, row in known:
+            scores = score_candidates_by_item(user_item_matrix, row, index)
+            top = top_n_indices(scores, np.flatnonzero(scores > 0), top_n)
+            results[user_id] = index.place_ids[top].tolist() or fallback
+        return results
+
+    chunk_size = batch_block_size(user_item_matrix, chunk_size)
+    for start in range(0, len(known), chunk_size):
+        chunk = known[start:start + chunk_size]
+        scores = score_candidates_batch(user_item_matrix, np.array([row for _, row in chunk], dtype=np.int64))
+        for (user_id, _), user_scores in zip(chunk, scores):
+            top = top_n_indices(user_scores, np.flatnonzero(user_scores > 0), top_n)
+            results[user_id] = user_item_matrix.place_ids[top].tolist() or fallback
+
+    return results
+
+def precompute_recommendations(top_n: int = 10, mode: str = RECOMMENDER_MODE,
+                               insert_chunk_size: int = 1000) -> int:
     """
-    if user_id <= 0:
-        raise HTTPException(status_code=400, detail="user_id must be a positive integer.")
-    if top_n <= 0:
-        raise HTTPException(status_code=400, detail="top_n must be a positive integer.")
+    Precomputes top-N recommendations for every user with interactions and
+    writes them to `user_recommendations`.
+
+    Each block of users is replaced in its own transaction: their old rows are
+    deleted and the new ones bulk-inserted with multi-row INSERT statements.
+    Once every block is written, rows left from earlier runs (users with no
+    interactions any more) are deleted, so they are not served stale.
 
+    Returns:
+        int: The number of users written.
+    """
+    snapshot = interaction_store.snapshot
+    if snapshot.source != "database":
+        print("Interaction data did not come from the database. Skipping precompute.")
+        return 0
+
+    user_ids = snapshot.user_item_matrix.user_ids.tolist()
+    generated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    insert = (
+        f"INSERT INTO {RECOMMENDATIONS_TABLE} (user_id, position, place_id, generated_at) "
+        "VALUES (%s, %s, %s, %s)"
+    )
+
+    with open_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {RECOMMENDATIONS_TABLE} ("
+                " user_id INT UNSIGNED NOT NULL,"
+                " position SMALLINT UNSIGNED NOT NULL,"
+                " place_id VARCHAR(255) NOT NULL,"
+                " generated_at TIMESTAMP NOT NULL,"
+                " PRIMARY KEY (user_id, position))"
+            )
+            for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+                chunk = user_ids[start:start + BATCH_CHUNK_SIZE]
+                recommendations = recommend_for_users(chunk, top_n=top_n, mode=mode)
+                rows = [
+                    (user_id, position, place_id, generated_at)
+                    for user_id, place_ids in recommendations.items()
+                    for position, place_id in enumerate(place_ids, start=1)
+                ]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"DELETE FROM {RECOMMENDATIONS_TABLE} WHERE user_id IN ({placeholders})", chunk)
+                # pymysql rewrites executemany on INSERT ... VALUES into multi-row statements
+                for offset in range(0, len(rows), insert_chunk_size):
+                    cursor.executemany(insert, rows[offset:offset + insert_chunk_size])
+                conn.commit()
+                print(f"Precomputed recommendations for {min(start + BATCH_CHUNK_SIZE, len(user_ids))}/{len(user_ids)} users.")
+            cursor.execute(f"DELETE FROM {RECOMMENDATIONS_TABLE} WHERE generated_at < %s", (generated_at,))
+            print(f"Deleted {cursor.rowcount} recommendation rows left from earlier runs.")
+            conn.commit()
+
+    return len(user_ids)
+
+def recommend_with_fallback(user_id: int, top_n: int = 5, mode: str = RECOMMENDER_MODE,
+                            lat: Optional[float] = None, lng: Optional[float] = None,
+                            radius_m: Optional[float] = None, category: Optional[str] = None,
+                            seed_place_id: Optional[str] = None, open_at: Optional[int] = None) -> List[str]:
+    """
+    Like `recommend_for_user`, but applies the optional location, category
+    and opening-hours (`open_at`, a week minute) filters and falls back to
+    top-rated places when no new places can be recommended.
+    """
+    with timed(STAGE_SECONDS, "location_filter"):
+        allowed = allowed_places(lat=lat, lng=lng, radius_m=radius_m, category=category, open_at=open_at)
+    recommendations = recommend_for_user(user_id=user_id, top_n=top_n, mode=mode, allowed=allowed,
+                                         seed_place_id=seed_place_id)
+    if not recommendations:
+        # This can happen if the user has seen all items from similar users
+        print(f"No new recommendations for user {user_id}. Returning mock top-rated places.")
+        FALLBACKS.inc(reason="no_candidates")
+        return fallback_places(top_n, allowed)
+    return recommendations
+
+
+# --- Result Cache ---
+
+recommendation_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+
+def cached_recommendations(user_id: int, top_n: int = 5, mode: str = RECOMMENDER_MODE,
+                           lat: Optional[float] = None, lng: Optional[float] = None,
+                           radius_m: Optional[float] = None, category: Optional[str] = None,
+                           seed_place_id: Optional[str] = None, open_at: Optional[int] = None) -> List[str]:
+    """
+    `recommend_with_fallback` behind the result cache.
+
+    A miss ranks RESULT_CACHE_DEPTH places, so later requests for any top_n
+    up to that are served from the same entry. Users with no interactions
+    all get the same answer for the same filters, so they share one entry.
+    Entries of users with interactions are keyed by the interaction snapshot
+    (and in item mode the item index) they were scored with, so a miss that
+    finishes after a refresh swapped in newer data is never served; the
+    entries of users with new interactions are also dropped on refresh.
+    """
+    if not recommendation_cache.enabled:
+        return recommend_with_fallback(user_id=user_id, top_n=top_n, mode=mode, lat=lat, lng=lng,
+                                       radius_m=radius_m, category=category, seed_place_id=seed_place_id,
+                                       open_at=open_at)
+
+    filters = (lat, lng, radius_m, category, seed_place_id, open_at)
+    snapshot = interaction_store.snapshot
+    if user_id in snapshot.user_item_matrix.user_index:
+        model = item_index_store.index.built_at if mode == "item" else None
+        key, owner = (user_id, mode, snapshot.built_at, model) + filters, user_id
+    else:
+        key, owner = ("cold",) + filters, None
+
+    places = recommendation_cache.get(key, top_n)
+    if places is not None:
+        RESULT_CACHE_LOOKUPS.inc(result="hit")
+        return places
+    RESULT_CACHE_LOOKUPS.inc(result="miss")
+    depth = max(top_n, RESULT_CACHE_DEPTH)
+    places = recommend_with_fallback(user_id=user_id, top_n=depth, mode=mode, lat=lat, lng=lng,
+                                     radius_m=radius_m, category=category, seed_place_id=seed_place_id,
+                                     open_at=open_at)
+    recommendation_cache.put(key, places, depth, owner=owner)
+    return places[:top_n]
+
+def result_etag(result: Any) -> str:
+    """A strong ETag for a JSON response body."""
+    body = json.dumps(result, separators=(",", ":"), default=str).encode("utf-8")
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+# --- Service Lifecycle ---
+
+# Runs blocking database and scoring work for the async endpoints.
+compute_executor: Optional[ThreadPoolExecutor] = None
+
+def start_service() -> None:
+    """Opens the connection pool and executor, loads the model and starts background refreshes."""
+    global db_pool, compute_executor, shared_snapshots
+    db_pool = ConnectionPool()
+    if SNAPSHOT_DIR:
+        shared_snapshots = SnapshotDirectory(SNAPSHOT_DIR, keep_versions=SNAPSHOT_KEEP_VERSIONS)
+        shared_snapshots.try_lead()
+    compute_executor = ThreadPoolExecutor(max_workers=RECOMMENDER_THREADS, thread_name_prefix="recommender")
+    interaction_store.refresh()
+    interaction_store.start()
+    item_index_store.refresh()
+    item_index_store.start()
+    catalogue_store.refresh()
+    catalogue_store.start()
+    search_store.refresh()
+    search_store.start()
+    content_index_store.refresh()
+    content_index_store.start()
+
+def stop_service() -> None:
+    """Stops background refreshes and releases the executor and connection pool."""
+    global db_pool, compute_executor, shared_snapshots
+    content_index_store.stop()
+    search_store.stop()
+    catalogue_store.stop()
+    item_index_store.stop()
+    interaction_store.stop()
+    if compute_executor is not None:
+        compute_executor.shutdown(wait=True)
+        compute_executor = None
+    if db_pool is not None:
+        db_pool.close()
+        db_pool = None
+    if shared_snapshots is not None:
+        shared_snapshots.close()
+        shared_snapshots = None
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Runs a blocking call on the compute executor so the event loop stays free."""
+    loop = asyncio.get_running_loop()
+    # Copy the context so stage timings recorded in the executor reach this request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(compute_executor, context.run, partial(func, *args, **kwargs))
+
+def readiness() -> Dict[str, Any]:
+    """Reports whether the database is reachable through the pool and a model snapshot is loaded."""
+    pool = db_pool
+    snapshot = interaction_store._snapshot
+    database_ok = pool is not None and pool.check()
+    return {
+        "ready": database_ok and snapshot is not None,
+        "database": pool.stats() if pool is not None else None,
+        "snapshot_source": snapshot.source if snapshot is not None else None,
+    }
+
+def liveness() -> Dict[str, Any]:
+    """Reports whether the background refresh threads that should be running are alive."""
+    threads = {
+        store.thread_name: store._thread is not None and store._thread.is_alive()
+        for store in (interaction_store, item_index_store, catalogue_store, search_store,
+                      content_index_store)
+        if store.refresh_interval > 0
+    }
+    return {"alive": all(threads.values()), "threads": threads}
+
+
+# --- FastAPI Microservice ---
+
+def create_app():
+    """Builds the FastAPI application. Imported lazily so CLI use skips the web stack."""
+    from fastapi import FastAPI, HTTPException, Query, Request, Response
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from pydantic import BaseModel
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Open the pool and load the model once at startup, then keep it fresh in the background.
+        await asyncio.get_running_loop().run_in_executor(None, start_service)
+        yield
+        await asyncio.get_running_loop().run_in_executor(None, stop_service)
+
+    app = FastAPI(
+        title="Tourism Recommendation API",
+        description="Provides personalized place recommendations based on user interactions.",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        # Collect stage timings only when the client asked for a Server-Timing header
+        want_timing = SERVER_TIMING == "always" or request.headers.get("x-server-timing") == "1"
+        token = request_timings.set([] if want_timing else None)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+            elapsed = time.perf_counter() - started
+            route = request.scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.observe(elapsed, path=path, status=response.status_code)
+            if want_timing:
+                timings = request_timings.get() + [("total", elapsed)]
+                response.headers["Server-Timing"] = format_server_timing(timings)
+            return response
+        finally:
+            request_timings.reset(token)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        """Exposes latency histograms and fallback counters in the Prometheus text format."""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/recommendations", response_model=List[str])
+    async def get_recommendations(request: Request, response: Response, user_id: int, top_n: int = 5,
+                                  mode: str = RECOMMENDER_MODE,
+                                  lat: Optional[float] = None, lng: Optional[float] = None,
+                                  radius_m: Optional[float] = None, category: Optional[str] = None,
+                                  seed_place_id: Optional[str] = None, open_now: bool = False,
+                                  open_at: Optional[datetime] = None):
+        """
+        Generates and returns a list of recommended place IDs for a given user.
+
+        - **user_id**: The unique identifier for the user.
+        - **top_n**: The number of recommendations to return (default: 5).
+        - **mode**: "user" (user-user filtering) or "item" (precomputed item-item index).
+        - **lat**, **lng**, **radius_m**: Only recommend places within this radius (default radius: 2000 m).
+        - **category**: Only recommend places in this category.
+        - **seed_place_id**: A place the user just clicked; users with no interactions get places like it.
+        - **open_now**: Only recommend places open right now (Singapore time).
+        - **open_at**: Only recommend places open at this ISO 8601 time; naive times are Singapore time.
+
+        Responses carry an ETag; a request whose If-None-Match matches gets an empty 304.
+        """
+        if user_id <= 0:
+            raise HTTPException(status_code=400, detail="user_id must be a positive integer.")
+        if top_n <= 0:
+            raise HTTPException(status_code=400, detail="top_n must be a positive integer.")
+        if mode not in RECOMMENDER_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RECOMMENDER_MODES)}.")
+        try:
+            validate_location(lat, lng, radius_m)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            places = await run_blocking(cached_recommendations, user_id=user_id, top_n=top_n, mode=mode,
+                                        lat=lat, lng=lng, radius_m=radius_m, category=category,
+                                        seed_place_id=seed_place_id, open_at=open_minute(open_now, open_at))
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error in recommendation engine.")
+
+        headers = {"ETag": result_etag(places), "Cache-Control": f"private, max-age={RESULT_CACHE_CLIENT_MAX_AGE}"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return places
+
+    @app.get("/recommendations/cache")
+    async def get_recommendation_cache_stats():
+        """
+        Reports the size and hit rate of the recommendation result cache.
+        """
+        return recommendation_cache.stats()
+
+    class BatchRecommendationRequest(BaseModel):
+        user_ids: List[int]
+        top_n: int = 5
+        mode: str = RECOMMENDER_MODE
+
+    @app.post("/recommendations/batch", response_model=Dict[int, List[str]])
+    async def get_batch_recommendations(request: BatchRecommendationRequest):
+        """
+        Generates recommendations for many users in one call, scored against the same model snapshot.
+
+        - **user_ids**: The users to generate recommendations for.
+        - **top_n**: The number of recommendations per user (default: 5).
+        - **mode**: "user" (user-user filtering) or "item" (precomputed item-item index).
+        """
+        if not request.user_ids:
+            raise HTTPException(status_code=400, detail="user_ids must not be empty.")
+        if len(request.user_ids) > BATCH_MAX_USERS:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_USERS} user_ids are accepted per request.")
+        if any(user_id <= 0 for user_id in request.user_ids):
+            raise HTTPException(status_code=400, detail="user_ids must be positive integers.")
+        if request.top_n <= 0:
+            raise HTTPException(status_code=400, detail="top_n must be a positive integer.")
+        if request.mode not in RECOMMENDER_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RECOMMENDER_MODES)}.")
+
+        try:
+            return await run_blocking(recommend_for_users, request.user_ids, top_n=request.top_n, mode=request.mode)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error in recommendation engine.")
+
+    @app.get("/similar-places", response_model=List[str])
+    async def get_similar_places(place_id: str, top_n: int = 10):
+        """
+        Returns places that people who interacted with this place also interacted with.
+
+        - **place_id**: The place to find neighbours for.
+        - **top_n**: The number of similar places to return (default: 10).
+        """
+        if top_n <= 0:
+            raise HTTPException(status_code=400, detail="top_n must be a positive integer.")
+
+        places = await run_blocking(similar_places, place_id=place_id, top_n=top_n)
+        if places is None:
+            raise HTTPException(status_code=404, detail="place_id has no interactions.")
+        return places
+
+    @app.get("/similar-places/content", response_model=List[str])
+    async def get_content_similar_places(place_id: str, top_n: int = 10):
+        """
+        Returns places with a similar category, price, rating and reviews. Works for places without interactions.
+
+        - **place_id**: The place to find look-alikes for.
+        - **top_n**: The number of similar places to return (default: 10).
+        """
+        if top_n <= 0:
+            raise HTTPException(status_code=400, detail="top_n must be a positive integer.")
+
+        places = await run_blocking(content_similar_places, place_id=place_id, top_n=top_n)
+        if places is None:
+            raise HTTPException(status_code=404, detail="place_id is not in the place catalogue.")
+        return places
+
+    @app.get("/places/open", response_model=List[str])
+    async def get_open_places(place_ids: Optional[List[str]] = Query(None), at: Optional[datetime] = None,
+                              include_unknown: bool = False):
+        """
+        Returns which places are open at a given time, in the order they were given.
+
+        - **place_ids**: The places to test (repeat the parameter); every place if omitted.
+        - **at**: The ISO 8601 time to test (default: now); naive times are Singapore time.
+        - **include_unknown**: Also return places whose opening hours are unknown.
+        """
+        return await run_blocking(open_places, place_ids=place_ids, at=at, include_unknown=include_unknown)
+
+    @app.get("/nearby")
+    async def get_nearby(lat: float, lng: float, k: int = 10, radius_m: Optional[float] = None,
+                         category: Optional[str] = None):
+        """
+        Returns the places nearest to a point, nearest first, with their distance in metres.
+
+        - **lat**, **lng**: The point to search from.
+        - **k**: The maximum number of places to return (default: 10).
+        - **radius_m**: Only return places within this radius.
+        - **category**: Only return places in this category.
+        """
+        if k <= 0:
+            raise HTTPException(status_code=400, detail="k must be a positive integer.")
+        try:
+            validate_location(lat, lng, radius_m, required=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return await run_blocking(nearby_places, lat=lat, lng=lng, k=k, radius_m=radius_m, category=category)
+
+    @app.get("/search")
+    async def get_search(q: str = "", category: Optional[str] = None, limit: int = 10, prefix: bool = True):
+        """
+        Searches place names, categories and review text, best match first.
+
+        - **q**: The search text. The last word also matches longer words unless **prefix** is false,
+          so results can be fetched on every keystroke.
+        - **category**: Only return places in this category.
+        - **limit**: The maximum number of places to return (default: 10).
+        """
+        if not 0 < limit <= SEARCH_MAX_LIMIT:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT}.")
+        if not q.strip():
+            return []
+        return await run_blocking(search_places, q=q, category=category, limit=limit, prefix=prefix)
+
+    @app.get("/search/stats")
+    async def get_search_stats():
+        """
+        Reports the size, source and age of the search index.
+        """
+        return await run_blocking(search_store.stats)
+
+    @app.post("/search/refresh")
+    async def refresh_search(full: bool = False):
+        """
+        Pulls new reviews into the search index immediately instead of waiting for the next background refresh.
+
+        - **full**: Rebuild the index from every review.
+        """
+        await run_blocking(search_store.refresh, full=full)
+        return await run_blocking(search_store.stats)
+
+    @app.get("/interactions/stats")
+    async def get_interaction_stats():
+        """
+        Reports the age, size and last refresh duration of the interaction snapshot.
+        """
+        return await run_blocking(interaction_store.stats)
+
+    @app.post("/interactions/refresh")
+    async def refresh_interactions(full: bool = False):
+        """
+        Pulls new interactions immediately instead of waiting for the next background refresh.
+
+        - **full**: Reload the whole table instead of only rows past the watermark.
+        """
+        await run_blocking(interaction_store.refresh, full=full)
+        return await run_blocking(interaction_store.stats)
+
+    @app.get("/health/live")
+    async def get_liveness():
+        """
+        Liveness probe: the event loop is answering and the background refresh threads are running.
+        """
+        status = liveness()
+        return JSONResponse(status, status_code=200 if status["alive"] else 503)
+
+    @app.get("/health/ready")
+    async def get_readiness():
+        """
+        Readiness probe: the database answers through the connection pool and a model snapshot is loaded.
+        """
+        status = await run_blocking(readiness)
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    return app
+
+def __getattr__(name: str):
+    # `uvicorn prediction:app` looks the app up as a module attribute; build it on first access.
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Recommendation Worker ---
+# A long-lived process that answers newline-delimited JSON requests over
+# stdin/stdout or a Unix socket, so callers such as the Express backend can
+# keep one warm model instead of starting Python per request.
+#
+#   request:  {"id": 1, "method": "recommend", "params": {"user_id": 7, "top_n": 5}}
+#   response: {"id": 1, "result": ["101", "103", "105"]}   or   {"id": 1, "error": "..."}
+
+def validate_request(top_n: int, mode: str = RECOMMENDER_MODE) -> None:
+    """Raises ValueError for parameters the HTTP endpoints would reject with a 400."""
+    if not isinstance(top_n, int) or top_n <= 0:
+        raise ValueError("top_n must be a positive integer.")
+    if mode not in RECOMMENDER_MODES:
+        raise ValueError(f"mode must be one of {', '.join(RECOMMENDER_MODES)}.")
+
+def worker_recommend(user_id: Optional[int] = None, top_n: int = 5, mode: str = RECOMMENDER_MODE,
+                     lat: Optional[float] = None, lng: Optional[float] = None,
+                     radius_m: Optional[float] = None, category: Optional[str] = None,
+                     seed_place_id: Optional[str] = None, open_now: bool = False,
+                     open_at: Optional[str] = None) -> List[str]:
+    validate_request(top_n, mode)
+    validate_location(lat, lng, radius_m)
+    minute = open_minute(open_now, datetime.fromisoformat(open_at) if open_at else None)
+    return cached_recommendations(user_id=user_id, top_n=top_n, mode=mode, lat=lat, lng=lng,
+                                  radius_m=radius_m, category=category, seed_place_id=seed_place_id,
+                                  open_at=minute)
+
+def worker_open_places(place_ids: Optional[List[str]] = None, at: Optional[str] = None,
+                       include_unknown: bool = False) -> List[str]:
+    return open_places(place_ids, at=datetime.fromisoformat(at) if at else None, include_unknown=include_unknown)
+
+def worker_nearby(lat: float, lng: float, k: int = 10, radius_m: Optional[float] = None,
+                  category: Optional[str] = None) -> List[Dict[str, Any]]:
+    validate_request(k)
+    validate_location(lat, lng, radius_m, required=True)
+    return nearby_places(lat=lat, lng=lng, k=k, radius_m=radius_m, category=category)
+
+def worker_recommend_batch(user_ids: List[int], top_n: int = 5, mode: str = RECOMMENDER_MODE) -> Dict[int, List[str]]:
+    validate_request(top_n, mode)
+    if len(user_ids) > BATCH_MAX_USERS:
+        raise ValueError(f"At most {BATCH_MAX_USERS} user_ids are accepted per request.")
+    return recommend_for_users(user_ids, top_n=top_n, mode=mode)
+
+def worker_similar_places(place_id: str, top_n: int = 10) -> Optional[List[str]]:
+    validate_request(top_n)
+    return similar_places(place_id=place_id, top_n=top_n)
+
+def worker_content_similar_places(place_id: str, top_n: int = 10) -> Optional[List[str]]:
+    validate_request(top_n)
+    return content_similar_places(place_id=place_id, top_n=top_n)
+
+def worker_search(q: str, category: Optional[str] = None, limit: int = 10,
+                  prefix: bool = True) -> List[Dict[str, Any]]:
+    if not isinstance(limit, int) or not 0 < limit <= SEARCH_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {SEARCH_MAX_LIMIT}.")
+    return search_places(q, category=category, limit=limit, prefix=prefix) if q.strip() else []
+
+def worker_refresh(full: bool = False) -> Dict[str, Any]:
+    interaction_store.refresh(full=full)
+    return interaction_store.stats()
+
+WORKER_METHODS = {
+    "ping": lambda: "pong",
+    "recommend": worker_recommend,
+    "recommend_batch": worker_recommend_batch,
+    "similar_places": worker_similar_places,
+    "content_similar_places": worker_content_similar_places,
+    "nearby": worker_nearby,
+    "open_places": worker_open_places,
+    "search": worker_search,
+    "stats": lambda: interaction_store.stats(),
+    "cache_stats": lambda: recommendation_cache.stats(),
+    "refresh": worker_refresh,
+    "metrics": render_metrics,
+}
+
+def handle_worker_line(line: str) -> str:
+    """Executes one JSON request line and returns the JSON response line."""
+    request_id = None
     try:
-        recommendations = recommend_for_user(user_id=user_id, top_n=top_n)
-        if not recommendations:
-            # This can happen if the user has seen all items from similar users
-            print(f"No new recommendations for user {user_id}. Returning mock top-rated places.")
-            return MOCK_TOP_RATED_PLACES[:top_n]
-        return recommendations
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object.")
+        request_id = request.get("id")
+        handler = WORKER_METHODS.get(request.get("method"))
+        if handler is None:
+            raise ValueError(f"Unknown method: {request.get('method')!r}")
+        response = {"id": request_id, "result": handler(**(request.get("params") or {}))}
     except Exception as e:
-        print(f"An error occurred: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error in recommendation engine.")
+        response = {"id": request_id, "error": str(e)}
+    return json.dumps(response, default=str) + "\n"
+
+def serve_stream(infile, outfile) -> None:
+    """Answers requests line by line until the input is closed."""
+    for line in infile:
+        if line.strip():
+            outfile.write(handle_worker_line(line))
+            outfile.flush()
+
+class WorkerRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.decode("utf-8")
+            if line.strip():
+                self.wfile.write(handle_worker_line(line).encode("utf-8"))
+
+def run_worker(socket_path: Optional[str] = None) -> None:
+    """
+    Loads the model once and serves requests until stdin closes (or forever on a socket).
+
+    Log output is redirected to stderr so stdout carries only responses.
+    """
+    protocol_out = sys.stdout
+    with redirect_stdout(sys.stderr):
+        start_service()
+        try:
+            if socket_path is None:
+                print("Recommendation worker ready on stdin/stdout.")
+                serve_stream(sys.stdin, protocol_out)
+            else:
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
+                with socketserver.ThreadingUnixStreamServer(socket_path, WorkerRequestHandler) as server:
+                    print(f"Recommendation worker ready on {socket_path}.")
+                    server.serve_forever()
+        finally:
+            stop_service()
+
 
 # To run this microservice, use the command:
-# uvicorn prediction:app --reload
\ No newline at end of file
+# uvicorn prediction:app --reload
+# With several workers, share one copy of the model between them:
+# SNAPSHOT_DIR=/dev/shm/recommender uvicorn prediction:app --workers 8
+#
+# Command-line use (database flags default to the DB_* environment variables):
+# python prediction.py recommend --user-id 7 --top-n 5
+# python prediction.py similar --place-id 101
+# python prediction.py precompute --top-n 10
+# python prediction.py content-index --output data/content_index.npz
+# python prediction.py worker [--socket /tmp/recommender.sock]
+
+def configure_database(args: argparse.Namespace) -> None:
+    """Overrides the database settings with any --mysql-* flags that were given."""
+    global DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, DB_TABLE
+    DB_HOST = args.mysql_host or DB_HOST
+    DB_PORT = args.mysql_port or DB_PORT
+    DB_USER = args.mysql_user or DB_USER
+    DB_PASSWORD = args.mysql_password if args.mysql_password is not None else DB_PASSWORD
+    DB_NAME = args.mysql_db or DB_NAME
+    DB_TABLE = args.mysql_table or DB_TABLE
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tourism recommendation engine.")
+    parser.add_argument("--mysql-host", help="Database host (default: $DB_HOST).")
+    parser.add_argument("--mysql-port", type=int, help="Database port (default: $DB_PORT).")
+    parser.add_argument("--mysql-user", help="Database user (default: $DB_USER).")
+    parser.add_argument("--mysql-password", help="Database password (default: $DB_PASSWORD).")
+    parser.add_argument("--mysql-db", help="Database name (default: $DB_NAME).")
+    parser.add_argument("--mysql-table", help=f"Interaction table (default: {DB_TABLE}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    recommend_parser = subparsers.add_parser("recommend", help="Print recommendations for one user as JSON.")
+    recommend_parser.add_argument("--user-id", type=int, required=True, help="User to recommend for.")
+    recommend_parser.add_argument("--top-n", type=int, default=5, help="Number of recommendations.")
+    recommend_parser.add_argument("--mode", choices=RECOMMENDER_MODES, default=RECOMMENDER_MODE,
+                                  help="Recommendation strategy.")
+    recommend_parser.add_argument("--pretty", action="store_true", help="Indent the JSON output.")
+
+    similar_parser = subparsers.add_parser("similar", help="Print places similar to one place as JSON.")
+    similar_parser.add_argument("--place-id", required=True, help="Place to find neighbours for.")
+    similar_parser.add_argument("--top-n", type=int, default=10, help="Number of similar places.")
+    similar_parser.add_argument("--pretty", action="store_true", help="Indent the JSON output.")
+
+    precompute_parser = subparsers.add_parser(
+        "precompute", help="Write top-N recommendations for all users to the user_recommendations table."
+    )
+    precompute_parser.add_argument("--top-n", type=int, default=10, help="Recommendations stored per user.")
+    precompute_parser.add_argument("--mode", choices=RECOMMENDER_MODES, default=RECOMMENDER_MODE,
+                                   help="Recommendation strategy.")
+    precompute_parser.add_argument("--insert-chunk-size", type=int, default=1000,
+                                   help="Rows per multi-row INSERT.")
+
+    content_parser = subparsers.add_parser(
+        "content-index", help="Build the content similarity index offline, for CONTENT_INDEX_PATH."
+    )
+    content_parser.add_argument("--output", required=True, help="File to write the index to (.npz).")
+
+    worker_parser = subparsers.add_parser(
+        "worker", help="Serve newline-delimited JSON requests on stdin/stdout or a Unix socket."
+    )
+    worker_parser.add_argument("--socket", help="Listen on this Unix socket path instead of stdin/stdout.")
+    args = parser.parse_args()
+    configure_database(args)
+
+    if args.command == "recommend":
+        with redirect_stdout(sys.stderr):
+            result = worker_recommend(user_id=args.user_id, top_n=args.top_n, mode=args.mode)
+        print(json.dumps(result, indent=2 if args.pretty else None))
+    elif args.command == "similar":
+        with redirect_stdout(sys.stderr):
+            result = worker_similar_places(place_id=args.place_id, top_n=args.top_n)
+        print(json.dumps(result, indent=2 if args.pretty else None))
+    elif args.command == "precompute":
+        written = precompute_recommendations(top_n=args.top_n, mode=args.mode,
+                                             insert_chunk_size=args.insert_chunk_size)
+        print(f"Precomputed recommendations for {written} users.")
+    elif args.command == "content-index":
+        catalogue = catalogue_store.refresh()
+        started = time.perf_counter()
+        index = build_content_index(catalogue, load_reviews(catalogue))
+        index.save(args.output)
+        print(f"Indexed {len(index.place_ids)} {catalogue.source} places in "
+              f"{time.perf_counter() - started:.2f}s; written to {args.output}.")
+    elif args.command == "worker":
+        run_worker(socket_path=args.socket)
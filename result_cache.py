@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Set
+
+
+class CacheEntry(NamedTuple):
+    items: List[Any]
+    # How many items were asked for when the entry was computed; fewer means the list is complete
+    depth: int
+    owner: Optional[Hashable]
+    expires_at: float
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of ranked result lists with a time-to-live.
+
+    Each entry holds the top `depth` results for its key, so a request for
+    any shorter list is served by slicing it. Entries may belong to an owner
+    (a user), and `invalidate` drops every entry of the given owners at once,
+    e.g. when new interactions for those users arrive. The least recently
+    used entry is evicted once `max_entries` are held.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._by_owner: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, length: int) -> Optional[List[Any]]:
+        """Returns the first `length` cached results for `key`, or None if they are not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= self.clock():
+                self._remove(key)
+                entry = None
+            if entry is None or (length > entry.depth and len(entry.items) >= entry.depth):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.items[:length]
+
+    def put(self, key: Hashable, items: List[Any], depth: int, owner: Optional[Hashable] = None) -> None:
+        """Caches the results computed for `key` when `depth` of them were asked for."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(list(items), depth, owner, self.clock() + self.ttl)
+            if owner is not None:
+                self._by_owner.setdefault(owner, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, owners: Optional[Iterable[Hashable]] = None) -> int:
+        """
+        Drops every entry belonging to `owners`, or every entry if `owners` is None.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        with self._lock:
+            if owners is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._by_owner.clear()
+            else:
+                dropped = 0
+                for owner in owners:
+                    for key in self._by_owner.pop(owner, ()):
+                        del self._entries[key]
+                        dropped += 1
+            self.invalidations += dropped
+            return dropped
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        if entry.owner is not None:
+            keys = self._by_owner.get(entry.owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_owner[entry.owner]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
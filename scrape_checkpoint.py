@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+import time
+
+
+class CheckpointStore:
+    """
+    Crash-safe record of scraper progress, kept in SQLite in WAL mode.
+
+    It holds the place_ids already written to the JSONL (and the JSONL's
+    length once they were), places that were claimed but not yet written, and for every query either its completion
+    (and whether its search cell was split) or the next_page_token (and page
+    number) to resume from. For refreshes (see place_refresh.py) it also
+    keeps when each place was last fetched, hashes of its volatile fields
+    then, and a history of the fields each refresh found changed. Every update is a small transaction, so a crash
+    loses at most the work in flight, and opening the store does not depend
+    on how much has been collected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS places (place_id TEXT PRIMARY KEY) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS pending_places (place_id TEXT PRIMARY KEY, name TEXT) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, completed INTEGER NOT NULL DEFAULT 0, "
+            "next_page_token TEXT, page INTEGER, updated_at REAL, split INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;"
+            # first_fetched_at..fetched_at is the span over which `changes` were observed
+            "CREATE TABLE IF NOT EXISTS place_freshness (place_id TEXT PRIMARY KEY, first_fetched_at REAL, "
+            "fetched_at REAL, popularity INTEGER NOT NULL DEFAULT 0, checks INTEGER NOT NULL DEFAULT 0, "
+            "changes INTEGER NOT NULL DEFAULT 0, field_hashes TEXT) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS place_changes (place_id TEXT NOT NULL, checked_at REAL NOT NULL, "
+            "fields TEXT NOT NULL, PRIMARY KEY (place_id, checked_at)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID;"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(queries)")]
+        if "split" not in columns:
+            self._conn.execute("ALTER TABLE queries ADD COLUMN split INTEGER NOT NULL DEFAULT 0")
+
+    def _transaction(self, statements):
+        """Runs (sql, rows) pairs as one transaction; rows is a list for executemany."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def is_empty(self):
+        return not self._query("SELECT 1 FROM places LIMIT 1") and not self._query("SELECT 1 FROM queries LIMIT 1")
+
+    def seen(self, place_id):
+        """True if the place is already written or was claimed by an interrupted run."""
+        return bool(self._query(
+            "SELECT 1 FROM places WHERE place_id = ? UNION ALL SELECT 1 FROM pending_places WHERE place_id = ?",
+            (place_id, place_id),
+        ))
+
+    def count_places(self):
+        return self._query("SELECT COUNT(*) FROM places")[0][0]
+
+    def completed_queries(self):
+        """
+        Returns query -> whether its search cell was split, for every completed
+        query and every split one, whose details may still have been in flight.
+        """
+        return dict(self._query("SELECT query, split FROM queries WHERE completed = 1 OR split = 1"))
+
+    def page_states(self):
+        """Returns query -> (next_page_token, page) for every query interrupted mid-pagination."""
+        rows = self._query("SELECT query, next_page_token, page FROM queries "
+                           "WHERE completed = 0 AND next_page_token IS NOT NULL")
+        return {query: (token, page) for query, token, page in rows}
+
+    def pending_places(self):
+        """Returns (place_id, name) for places claimed but never written."""
+        return self._query("SELECT place_id, name FROM pending_places")
+
+    def save_page(self, query, places, next_page_token, page):
+        """
+        Records one search page: the (place_id, name) pairs it claimed and the
+        token of the page after it (None once the query has no more pages).
+        """
+        self._transaction([
+            ("INSERT OR IGNORE INTO pending_places (place_id, name) VALUES (?, ?)", places),
+            ("INSERT INTO queries (query, next_page_token, page, updated_at) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT(query) DO UPDATE SET next_page_token = excluded.next_page_token, "
+             "page = excluded.page, updated_at = excluded.updated_at",
+             [(query, next_page_token, page, time.time())]),
+        ])
+
+    def output_length(self, path):
+        """The length of the output file `path` when its last written places were recorded, or None."""
+        rows = self._query("SELECT length FROM outputs WHERE path = ?", (path,))
+        return rows[0][0] if rows else None
+
+    def finish_places(self, written, dropped, fetched=(), output=None):
+        """
+        Marks places as written to the JSONL, or drops claims whose details could not be fetched.
+        `fetched` holds (place_id, fetched_at, popularity, field hashes JSON) for the written places,
+        and `output` the (path, length) of the JSONL with their lines in it.
+        """
+        self._transaction([
+            ("INSERT OR REPLACE INTO outputs (path, length) VALUES (?, ?)", [output] if output else []),
+            ("INSERT OR IGNORE INTO places (place_id) VALUES (?)", [(place_id,) for place_id in written]),
+            ("DELETE FROM pending_places WHERE place_id = ?", [(place_id,) for place_id in written + dropped]),
+            ("INSERT OR IGNORE INTO place_freshness (place_id, first_fetched_at, fetched_at, popularity, "
+             "field_hashes) VALUES (?, ?, ?, ?, ?)",
+             [(place_id, fetched_at, fetched_at, ratings, hashes)
+              for place_id, fetched_at, ratings, hashes in fetched]),
+        ])
+
+    def count_unscheduled(self):
+        """Counts written places with no freshness record, i.e. collected before freshness was tracked."""
+        return self._query("SELECT COUNT(*) FROM places WHERE place_id NOT IN "
+                           "(SELECT place_id FROM place_freshness)")[0][0]
+
+    def seed_freshness(self, places):
+        """Adds freshness records of unknown fetch time for (place_id, popularity, field hashes JSON) rows."""
+        self._transaction([
+            ("INSERT OR IGNORE INTO place_freshness (place_id, popularity, field_hashes) "
+             "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM places WHERE place_id = ?)",
+             [(place_id, ratings, hashes, place_id) for place_id, ratings, hashes in places]),
+        ])
+
+    def freshness(self):
+        """
+        Returns (place_id, first_fetched_at, fetched_at, popularity, changes, field hashes JSON)
+        for every written place with a freshness record.
+        """
+        return self._query("SELECT f.place_id, f.first_fetched_at, f.fetched_at, f.popularity, f.changes, "
+                           "f.field_hashes FROM place_freshness f JOIN places p ON p.place_id = f.place_id")
+
+    def record_checks(self, checks, output=None):
+        """
+        Records refreshes as (place_id, checked_at, popularity, field hashes JSON, changed fields),
+        and `output` as the (path, length) of the updates file with their updates in it.
+
+        A place whose previous fetch time is unknown starts its observed span
+        at this check, and what changed before it is logged but not counted.
+        A failed fetch has None popularity and hashes: only its check time is
+        recorded, and the previous values are kept to compare against.
+        """
+        self._transaction([
+            ("INSERT OR REPLACE INTO outputs (path, length) VALUES (?, ?)", [output] if output else []),
+            ("UPDATE place_freshness SET checks = checks + (fetched_at IS NOT NULL), "
+             "changes = changes + (fetched_at IS NOT NULL AND ?), "
+             "first_fetched_at = COALESCE(first_fetched_at, ?), fetched_at = ?, "
+             "popularity = COALESCE(?, popularity), field_hashes = COALESCE(?, field_hashes) "
+             "WHERE place_id = ?",
+             [(bool(changed), checked_at, checked_at, ratings, hashes, place_id)
+              for place_id, checked_at, ratings, hashes, changed in checks]),
+            ("INSERT OR REPLACE INTO place_changes (place_id, checked_at, fields) VALUES (?, ?, ?)",
+             [(place_id, checked_at, ",".join(changed))
+              for place_id, checked_at, _, _, changed in checks if changed]),
+        ])
+
+    def mark_split(self, query):
+        """Records that a query's search cell was split, as soon as its search has finished."""
+        self._transaction([
+            ("INSERT INTO queries (query, split, updated_at) VALUES (?, 1, ?) "
+             "ON CONFLICT(query) DO UPDATE SET split = 1, next_page_token = NULL, page = NULL, "
+             "updated_at = excluded.updated_at",
+             [(query, time.time())]),
+        ])
+
+    def complete_queries(self, queries):
+        """Marks (query, split) pairs as completed. A split recorded by `mark_split` is kept."""
+        self._transaction([
+            ("INSERT INTO queries (query, completed, split, updated_at) VALUES (?, 1, ?, ?) "
+             "ON CONFLICT(query) DO UPDATE SET completed = 1, split = MAX(split, excluded.split), "
+             "next_page_token = NULL, page = NULL, updated_at = excluded.updated_at",
+             [(query, int(split), time.time()) for query, split in queries]),
+        ])
+
+    def import_legacy(self, place_ids, queries):
+        """Seeds an empty store from the old processed_ids/processed_queries state."""
+        self._transaction([
+            ("INSERT OR IGNORE INTO places (place_id) VALUES (?)", [(place_id,) for place_id in place_ids]),
+        ])
+        self.complete_queries([(query, False) for query in queries])
+
+    def close(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
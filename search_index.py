@@ -0,0 +1,341 @@
+import re
+import unicodedata
+from functools import lru_cache
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# BM25 term-frequency saturation and document-length normalisation.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Each token of a field counts this many times towards a place's term frequency.
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+REVIEW_WEIGHT = 1.0
+
+# The last query token also matches indexed terms it is a prefix of; only the
+# most common of those are searched.
+MAX_PREFIX_EXPANSIONS = 32
+
+# The delta segment is merged into the main one once it holds this fraction of its postings.
+DELTA_MERGE_RATIO = 0.1
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have i if in is it its me my of on or our so than that the their
+them then there they this to too us very was we were what when which who will with you your
+lah leh lor loh meh sia hor ah also just got really quite
+""".split())
+
+# Romanisations of the same hawker dish words, mapped to one spelling
+SPELLING_VARIANTS = {
+    "kuay": "kway", "kuey": "kway", "kueh": "kway", "kuih": "kway", "kwey": "kway",
+    "tiao": "teow", "tiaw": "teow",
+    "bah": "bak",
+    "mian": "mee", "mein": "mee",
+    "chye": "chai", "chay": "chai",
+    "parata": "prata",
+    "sate": "satay",
+    "gorang": "goreng",
+    "caffe": "cafe",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def normalize(text: str) -> str:
+    """Lowercases and strips accents, and drops possessive 's, so "Café's" becomes "cafe"."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return re.sub(r"['’]s\b|['’]", "", text)
+
+def stem(token: str) -> str:
+    """Folds plurals onto the singular: noodles -> noodle, dishes -> dish, curries -> curry."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+@lru_cache(maxsize=1 << 16)
+def term(token: str) -> str:
+    return stem(SPELLING_VARIANTS.get(token, token))
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Splits text into index terms.
+
+    Words are normalised, romanisation variants folded (kuey/kueh -> kway),
+    plurals stemmed, and stopwords (including Singlish particles such as lah
+    and leh) dropped. Hyphenated words are indexed both as their parts and
+    joined, so "char-kway-teow" and "charkwayteow" both match.
+    """
+    if not text:
+        return []
+    terms = []
+    for word in WORD_PATTERN.findall(normalize(text)):
+        parts = word.split("-")
+        for part in parts:
+            if part not in STOPWORDS and (len(part) > 1 or part.isdigit()):
+                terms.append(term(part))
+        if len(parts) > 1:
+            terms.append(term("".join(parts)))
+    return terms
+
+
+class PostingsSegment:
+    """
+    An immutable inverted index over document positions.
+
+    `terms` is sorted; the postings of `terms[i]` are the document positions
+    `docs[offsets[i]:offsets[i + 1]]` (ascending) with their weighted term
+    frequencies in `tfs` at the same indices.
+    """
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+
+    @property
+    def nnz(self) -> int:
+        return len(self.docs)
+
+    @classmethod
+    def from_postings(cls, terms: np.ndarray, term_positions: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                      n_docs: int) -> "PostingsSegment":
+        """
+        Builds a segment from unsorted (term, doc, weight) postings, where
+        `term_positions` index into the sorted `terms`. Repeated (term, doc)
+        pairs are summed.
+        """
+        keys = term_positions.astype(np.int64) * max(n_docs, 1) + docs
+        keys, inverse = np.unique(keys, return_inverse=True)
+        tfs = np.bincount(inverse.ravel(), weights=weights, minlength=len(keys)).astype(np.float32)
+        term_of = keys // max(n_docs, 1)
+        offsets = np.searchsorted(term_of, np.arange(len(terms) + 1))
+        return cls(terms, offsets, (keys % max(n_docs, 1)).astype(np.int32), tfs)
+
+    @classmethod
+    def merge(cls, segments: Sequence["PostingsSegment"], n_docs: int) -> "PostingsSegment":
+        """Combines segments into one, summing the frequencies of postings they share."""
+        terms = np.unique(np.concatenate([segment.terms for segment in segments]))
+        positions, docs, tfs = [], [], []
+        for segment in segments:
+            remap = np.searchsorted(terms, segment.terms)
+            positions.append(np.repeat(remap, np.diff(segment.offsets)))
+            docs.append(segment.docs)
+            tfs.append(segment.tfs)
+        return cls.from_postings(terms, np.concatenate(positions), np.concatenate(docs), np.concatenate(tfs), n_docs)
+
+    def find(self, term: str) -> int:
+        """Returns the position of `term` in `terms`, or -1."""
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def postings(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def prefixed(self, prefix: str) -> np.ndarray:
+        """Returns the positions of every term starting with `prefix`."""
+        start = np.searchsorted(self.terms, prefix)
+        end = np.searchsorted(self.terms, prefix + "\uffff")
+        return np.arange(start, end)
+
+
+class TermCollector:
+    """Accumulates weighted postings for a batch of documents before they become a segment."""
+
+    def __init__(self, n_docs: int):
+        self.n_docs = n_docs
+        self.vocabulary: Dict[str, int] = {}
+        self.term_ids: List[int] = []
+        self.docs: List[int] = []
+        self.weights: List[float] = []
+        self.lengths = np.zeros(n_docs, dtype=np.float32)
+
+    def add(self, doc: int, text: Optional[str], weight: float) -> None:
+        terms = tokenize(text)
+        vocabulary = self.vocabulary
+        for token in terms:
+            self.term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+        self.docs.extend([doc] * len(terms))
+        self.weights.extend([weight] * len(terms))
+        self.lengths[doc] += weight * len(terms)
+
+    def segment(self) -> PostingsSegment:
+        terms = np.array(sorted(self.vocabulary), dtype=str)
+        remap = np.empty(len(terms), dtype=np.int64)
+        remap[[self.vocabulary[t] for t in terms.tolist()]] = np.arange(len(terms))
+        term_positions = remap[np.array(self.term_ids, dtype=np.int64)]
+        return PostingsSegment.from_postings(terms, term_positions, np.array(self.docs, dtype=np.int64),
+                                             np.array(self.weights, dtype=np.float64), self.n_docs)
+
+
+class SearchIndex:
+    """
+    BM25 full-text index over places: their names, categories and review text.
+
+    Documents are positions into the place arrays the index was built from
+    (the place catalogue). Postings live in two array-backed segments: a
+    large main segment built once, and a small delta segment that absorbs
+    reviews added since. `with_reviews` returns a new index that shares the
+    main segment, and the delta is folded into the main segment once it grows
+    past `DELTA_MERGE_RATIO` of it, so incremental updates stay cheap and an
+    index in use by a request never changes underneath it.
+    """
+
+    def __init__(self, place_ids: np.ndarray, categories: np.ndarray, main: PostingsSegment,
+                 delta: Optional[PostingsSegment], lengths: np.ndarray, watermark: Optional[Any] = None):
+        self.place_ids = place_ids
+        self.categories = categories
+        self.place_index = {place_id: i for i, place_id in enumerate(place_ids.tolist())}
+        self.main = main
+        self.delta = delta
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        self.watermark = watermark
+        self._category_masks: Dict[Any, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, place_ids: Sequence[Any], names: Sequence[Optional[str]], categories: Sequence[Any],
+              reviews: Iterable[Tuple[Any, Optional[str]]], watermark: Optional[Any] = None) -> "SearchIndex":
+        """
+        Indexes places and their reviews.
+
+        Args:
+            reviews: (place_id, review text) pairs; reviews of unknown places are skipped.
+            watermark: Marks the newest review indexed, for incremental updates.
+        """
+        place_ids = np.asarray(place_ids)
+        categories = np.asarray(categories, dtype=object)
+        place_index = {place_id: i for i, place_id in enumerate(place_ids.tolist())}
+        collector = TermCollector(len(place_ids))
+        for doc, (name, category) in enumerate(zip(names, categories.tolist())):
+            collector.add(doc, name, NAME_WEIGHT)
+            collector.add(doc, category, CATEGORY_WEIGHT)
+        for place_id, text in reviews:
+            doc = place_index.get(place_id)
+            if doc is not None:
+                collector.add(doc, text, REVIEW_WEIGHT)
+        return cls(place_ids, categories, collector.segment(), None, collector.lengths, watermark)
+
+    def with_reviews(self, reviews: Iterable[Tuple[Any, Optional[str]]],
+                     watermark: Optional[Any] = None) -> "SearchIndex":
+        """Returns a new index that also covers `reviews`; reviews of unknown places are skipped."""
+        n_docs = len(self.place_ids)
+        collector = TermCollector(n_docs)
+        for place_id, text in reviews:
+            doc = self.place_index.get(place_id)
+            if doc is not None:
+                collector.add(doc, text, REVIEW_WEIGHT)
+        if not collector.term_ids:
+            return self
+        added = collector.segment()
+        delta = added if self.delta is None else PostingsSegment.merge([self.delta, added], n_docs)
+        main = self.main
+        if delta.nnz > DELTA_MERGE_RATIO * max(main.nnz, 1):
+            main, delta = PostingsSegment.merge([main, delta], n_docs), None
+        return SearchIndex(self.place_ids, self.categories, main, delta, self.lengths + collector.lengths,
+                           watermark if watermark is not None else self.watermark)
+
+    @property
+    def nnz(self) -> int:
+        return self.main.nnz + (self.delta.nnz if self.delta is not None else 0)
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """The postings of one term across both segments, one entry per document."""
+        parts = []
+        for segment in (self.main, self.delta):
+            if segment is not None:
+                i = segment.find(term)
+                if i >= 0:
+                    parts.append(segment.postings(i))
+        if not parts:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        docs = np.concatenate([docs for docs, _ in parts])
+        docs, inverse = np.unique(docs, return_inverse=True)
+        tfs = np.bincount(inverse.ravel(), weights=np.concatenate([tfs for _, tfs in parts]), minlength=len(docs))
+        return docs, tfs.astype(np.float32)
+
+    def _expand(self, prefix: str) -> List[str]:
+        """The most common indexed terms starting with `prefix`."""
+        candidates = []
+        for segment in (self.main, self.delta):
+            if segment is not None:
+                positions = segment.prefixed(prefix)
+                frequencies = np.diff(segment.offsets)[positions]
+                if len(positions) > MAX_PREFIX_EXPANSIONS:
+                    keep = np.argpartition(-frequencies, MAX_PREFIX_EXPANSIONS - 1)[:MAX_PREFIX_EXPANSIONS]
+                    positions, frequencies = positions[keep], frequencies[keep]
+                candidates.extend(zip(frequencies.tolist(), segment.terms[positions].tolist()))
+        candidates.sort(reverse=True)
+        return list(dict.fromkeys(term for _, term in candidates))[:MAX_PREFIX_EXPANSIONS]
+
+    def _bm25(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the documents containing `term` and their BM25 score for it."""
+        docs, tfs = self._postings(term)
+        if len(docs) == 0:
+            return docs, tfs
+        n_docs = len(self.place_ids)
+        idf = np.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / self.average_length)
+        return docs, (idf * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32)
+
+    def _category_mask(self, category: Any) -> np.ndarray:
+        mask = self._category_masks.get(category)
+        if mask is None:
+            mask = self._category_masks[category] = self.categories == category
+        return mask
+
+    def search(self, query: str, category: Optional[Any] = None, limit: int = 10,
+               prefix: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ranks places against a free-text query.
+
+        With `prefix`, the last word also matches longer terms (so "lak"
+        finds laksa), as when searching on every keystroke. Places matching
+        every word rank above places matching only some.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Positions of the best places and their scores, best first.
+        """
+        words = [word for word in WORD_PATTERN.findall(normalize(query)) if word not in STOPWORDS]
+        n_docs = len(self.place_ids)
+        if not words or n_docs == 0 or limit <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int16)
+        for i, word in enumerate(words):
+            terms = list(dict.fromkeys(tokenize(word) or [term(word)]))
+            expand = prefix and i == len(words) - 1 and not query[-1:].isspace()
+            if expand:
+                terms = list(dict.fromkeys(terms + self._expand(SPELLING_VARIANTS.get(word, word))))
+            best = np.zeros(n_docs, dtype=np.float32)
+            for t in terms:
+                docs, term_scores = self._bm25(t)
+                # A word's score is its best-matching term, so expansions do not add up
+                best[docs] = np.maximum(best[docs], term_scores)
+            scores += best
+            matched += best > 0
+
+        candidates = np.flatnonzero(matched)
+        if category is not None:
+            candidates = candidates[self._category_mask(category)[candidates]]
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        # Rank by words matched first, then by score
+        ranking = matched[candidates].astype(np.float64) * 1e6 + scores[candidates]
+        if len(candidates) > limit:
+            keep = np.argpartition(-ranking, limit - 1)[:limit]
+            candidates, ranking = candidates[keep], ranking[keep]
+        order = np.argsort(-ranking, kind="stable")
+        candidates = candidates[order]
+        return candidates.astype(np.int64), scores[candidates]
@@ -0,0 +1,61 @@
+"""
+A pymysql-shaped wrapper over sqlite3, so code written against MySQL can run
+against a local SQLite file for benchmarks and tests without a server.
+"""
+import sqlite3
+
+
+class SQLiteCursor:
+    """Cursor wrapper that accepts pymysql's %s placeholders and `with` usage."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, query: str, params=None):
+        return self._cursor.execute(query.replace("%s", "?"), params or ())
+
+    def executemany(self, query: str, rows):
+        return self._cursor.executemany(query.replace("%s", "?"), rows)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class SQLiteConnection:
+    """
+    A pymysql-shaped connection over a local SQLite file.
+
+    Only the calls prediction.py and load_places.py make are supported, which
+    is enough to run their loads without a MySQL server.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def ping(self, reconnect: bool = True) -> None:
+        pass
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,62 @@
+import json
+
+from load_places import create_tables, load_places
+from sqlite_standin import SQLiteConnection
+
+
+def place(rating, review_text):
+    return {
+        'place_id': 'A', 'name': 'Gardens by the Bay', 'formatted_address': '18 Marina Gardens Dr, Singapore 018953',
+        'rating': rating, 'types': ['park'], 'geometry': {'location': {'lat': 1.2816, 'lng': 103.8636}},
+        'reviews': [{'author_name': 'Scraped', 'rating': 5, 'text': review_text, 'time': 1700000000}],
+    }
+
+
+def write_jsonl(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item) + '\n')
+
+
+def reviews(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT author_name, review_text FROM review ORDER BY review_id")
+        return cursor.fetchall()
+
+
+def test_reload_keeps_website_reviews(tmp_path):
+    jsonl = tmp_path / 'places.jsonl'
+    conn = SQLiteConnection(str(tmp_path / 'places.db'))
+    create_tables(conn)
+    write_jsonl(jsonl, [place(4.5, 'Lovely')])
+    load_places(str(jsonl), conn)
+    # As backend/src/routes/reviews.js inserts them
+    with conn.cursor() as cursor:
+        cursor.execute("INSERT INTO review (place_id, place_name, address, rating, review_text, publish_time, "
+                       "author_name) VALUES ('A', 'Gardens by the Bay', NULL, 4, 'Great', '2024-01-01 10:00:00', 'Web')")
+    conn.commit()
+
+    write_jsonl(jsonl, [place(4.6, 'Lovely at night')])
+    summary = load_places(str(jsonl), conn)
+
+    assert summary['updated'] == 1
+    assert reviews(conn) == [('Web', 'Great'), ('Scraped', 'Lovely at night')]
+    conn.close()
+
+
+def test_migration_marks_loaded_reviews(tmp_path):
+    jsonl = tmp_path / 'places.jsonl'
+    conn = SQLiteConnection(str(tmp_path / 'places.db'))
+    create_tables(conn)
+    write_jsonl(jsonl, [place(4.5, 'Lovely')])
+    load_places(str(jsonl), conn)
+    # A review table from before the scraped column
+    with conn.cursor() as cursor:
+        cursor.execute("ALTER TABLE review DROP COLUMN scraped")
+    conn.commit()
+
+    write_jsonl(jsonl, [place(4.6, 'Lovely at night')])
+    load_places(str(jsonl), conn)
+
+    assert reviews(conn) == [('Scraped', 'Lovely at night')]
+    conn.close()
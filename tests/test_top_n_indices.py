@@ -0,0 +1,28 @@
+import numpy as np
+
+from prediction import top_n_indices
+
+
+def full_sort(scores, candidates, top_n):
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:top_n]
+
+
+def test_matches_full_sort_with_ties():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(1, 60))
+        # Few distinct values so ties fall across the cut-off
+        scores = rng.integers(0, 4, size=n).astype(np.float64)
+        candidates = np.flatnonzero(rng.random(n) < 0.8)
+        top_n = int(rng.integers(1, n + 2))
+        np.testing.assert_array_equal(top_n_indices(scores, candidates, top_n),
+                                      full_sort(scores, candidates, top_n))
+
+
+def test_prefix_of_deeper_result():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        scores = rng.integers(0, 3, size=200).astype(np.float64)
+        candidates = np.flatnonzero(scores > 0)
+        np.testing.assert_array_equal(top_n_indices(scores, candidates, 50)[:5],
+                                      top_n_indices(scores, candidates, 5))